@@ -0,0 +1,192 @@
+"""
+End-to-end crawl benchmark against a local fake cache server.
+
+    python -m benchmarks.crawl --pages 2000 --threads 8 2>/dev/null
+
+Generates a synthetic web graph, serves it through FakeCacheServer and runs
+the real Crawler over it from a temporary directory, without the spacetime
+registration. Reports pages/sec, p50/p99 latencies of Frontier.get_tbd_url,
+Frontier.add_url and scraper.scraper, and peak RSS. With --parse-processes
+the pages are parsed in child processes, so the scraper line shows the parse
+time each child measured and sent back with its analysis instead. Crawler logs go to
+stderr and to Logs/ inside the temporary directory.
+
+Note that extract_next_links resolves every link against the page's own
+host, so the crawl stays on the seed host; keep --politeness at 0 unless
+that is what you want to measure.
+"""
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+from pathlib import Path
+
+from benchmarks.fake_cache_server import SyntheticWeb, FakeCacheServer
+from benchmarks.timing import LatencyRecorder, peak_rss_mb, process_peak_rss_mb
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def build_config(args, web, server):
+    from utils.config import Config
+
+    cparser = ConfigParser()
+    cparser.read(args.config_file)
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(web.seed_urls)
+    cparser["CRAWLER"]["POLITENESS"] = str(args.politeness)
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.shelve"
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(args.threads)
+    cparser["LOCAL PROPERTIES"]["PARSEPROCESSES"] = str(args.parse_processes)
+    cparser["LOCAL PROPERTIES"]["ENGINE"] = args.engine
+    for override in args.set:
+        key, _, value = override.partition("=")
+        section, _, option = key.rpartition(".")
+        cparser[section][option] = value
+    config = Config(cparser)
+    config.cache_server = server.address
+    return config
+
+
+def run(args):
+    web = SyntheticWeb(
+        pages=args.pages, page_words=args.page_words, fanout=args.fanout,
+        dup_rate=args.dup_rate, trap_rate=args.trap_rate, hosts=args.hosts,
+        seed=args.seed)
+    server = FakeCacheServer(web, latency=args.server_latency).start()
+
+    workdir = tempfile.mkdtemp(prefix="crawler-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        config = build_config(args, web, server)
+
+        import scraper
+        from crawler import Crawler
+
+        crawler = Crawler(config, True)
+        frontier = crawler.frontier
+
+        get_tbd_url = LatencyRecorder("get_tbd_url")
+        add_url = LatencyRecorder("add_url")
+        scrape = LatencyRecorder("scraper")
+        frontier.get_tbd_url = get_tbd_url.wrap(frontier.get_tbd_url)
+        frontier.add_url = add_url.wrap(frontier.add_url)
+        if config.parse_processes > 0:
+            # scraper.scraper never runs; the children time their parse
+            record_page = scraper.record_page
+            def timed_record_page(url, analysis):
+                scrape.add(analysis["parse_seconds"])
+                return record_page(url, analysis)
+            scraper.record_page = timed_record_page
+        else:
+            scraper.scraper = scrape.wrap(scraper.scraper)
+
+        # pages/sec is measured up to the last completed page, not including
+        # the idle time workers spend before deciding the crawl is over
+        last_completion = [0.0]
+        mark_url_complete = frontier.mark_url_complete
+        def timed_mark_url_complete(url):
+            mark_url_complete(url)
+            last_completion[0] = time.perf_counter()
+        frontier.mark_url_complete = timed_mark_url_complete
+
+        start = time.perf_counter()
+        crawler.start_async()
+        pipeline_rss = []
+        if crawler.pipeline is not None:
+            # the parse processes are the forkserver's children, not ours,
+            # so their peak is read from /proc before the pool shuts down
+            pipeline = crawler.pipeline
+            shutdown = pipeline.shutdown
+            def measured_shutdown():
+                pipeline_rss.append(process_peak_rss_mb(list(pipeline.executor._processes)))
+                shutdown()
+            pipeline.shutdown = measured_shutdown
+        crawler.join()
+        elapsed = max(last_completion[0] - start, 1e-9)
+
+        status = frontier.get_status()
+        rss, children_rss = peak_rss_mb()
+        if pipeline_rss and pipeline_rss[0] is not None:
+            children_rss = max(children_rss, pipeline_rss[0])
+        return {
+            "pages": args.pages,
+            "engine": config.fetch_engine,
+            "threads": config.threads_count,
+            "parse_processes": config.parse_processes,
+            "completed": status["completed"],
+            "discovered": status["total_discovered"],
+            "server_requests": server.requests,
+            "seconds": elapsed,
+            "pages_per_sec": status["completed"] / elapsed,
+            "get_tbd_url": get_tbd_url.summary(),
+            "add_url": add_url.summary(),
+            "scraper": scrape.summary(),
+            "peak_rss_mb": rss,
+            "peak_children_rss_mb": children_rss,
+        }
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        if args.keep:
+            print(f"Kept working directory {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(report):
+    print(f"engine={report['engine']} threads={report['threads']} "
+          f"parse_processes={report['parse_processes']}")
+    print(f"completed {report['completed']} of {report['discovered']} discovered urls "
+          f"in {report['seconds']:.2f}s ({report['pages_per_sec']:.1f} pages/sec)")
+    for name in ("get_tbd_url", "add_url", "scraper"):
+        s = report[name]
+        if name == "scraper" and report["parse_processes"]:
+            name = "parse (children)"
+        print(f"{name:<16} calls={s['calls']:<8} p50={s['p50_ms']:.3f}ms "
+              f"p99={s['p99_ms']:.3f}ms max={s['max_ms']:.3f}ms")
+    print(f"peak rss {report['peak_rss_mb']:.1f} MB "
+          f"(parse processes {report['peak_children_rss_mb']:.1f} MB)")
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--page-words", type=int, default=400)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--dup-rate", type=float, default=0.05)
+    parser.add_argument("--trap-rate", type=float, default=0.05)
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=121)
+    parser.add_argument("--server-latency", type=float, default=0.0,
+                        help="seconds of delay the fake server adds per request")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--engine", choices=("threaded", "async"), default="threaded")
+    parser.add_argument("--parse-processes", type=int, default=0)
+    parser.add_argument("--politeness", type=float, default=0.0)
+    parser.add_argument("--config_file", type=str, default=str(REPO_ROOT / "config.ini"))
+    parser.add_argument("--set", action="append", default=[], metavar="SECTION.OPTION=VALUE",
+                        help="override any config.ini option")
+    parser.add_argument("--json", type=str, help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the temporary working directory")
+    args = parser.parse_args(argv)
+    args.config_file = os.path.abspath(args.config_file)
+
+    # the crawler prints setup and per-page notes; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
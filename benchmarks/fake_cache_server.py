@@ -0,0 +1,165 @@
+import cbor
+import pickle
+import random
+import threading
+import time
+import zlib
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+
+class SyntheticWeb(object):
+    """
+    Deterministic generated web graph served by FakeCacheServer.
+
+    Page i lives at https://h{i % hosts}.ics.uci.edu/page/{i} and links to
+    `fanout` other pages. A dup_rate share of pages repeat the body of an
+    earlier page (half exactly, half with a few words changed), and a
+    trap_rate share of pages also link into calendar and deep pagination
+    traps that is_valid should reject. Everything is derived from the url
+    and the seed, so two runs see the same graph.
+    """
+    def __init__(self, pages=2000, page_words=400, fanout=8, dup_rate=0.05,
+                 trap_rate=0.05, hosts=50, vocabulary=5000, seed=121):
+        self.pages = pages
+        self.page_words = page_words
+        self.fanout = fanout
+        self.dup_rate = dup_rate
+        self.trap_rate = trap_rate
+        self.hosts = hosts
+        self.seed = seed
+        rng = random.Random(seed)
+        self.vocabulary = [
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+            for _ in range(vocabulary)]
+        # zipf-like word frequencies, like real text
+        self.weights = [1 / (rank + 1) for rank in range(vocabulary)]
+
+    def url(self, page_id):
+        return f"https://h{page_id % self.hosts}.ics.uci.edu/page/{page_id}"
+
+    @property
+    def seed_urls(self):
+        return [self.url(0)]
+
+    def page_id(self, url):
+        path = urlparse(url).path
+        if not path.startswith("/page/"):
+            return None
+        try:
+            page_id = int(path[len("/page/"):])
+        except ValueError:
+            return None
+        return page_id if 0 <= page_id < self.pages else None
+
+    def _body_words(self, page_id):
+        rng = random.Random(self.seed * 1000003 + page_id)
+        return rng.choices(self.vocabulary, weights=self.weights, k=self.page_words)
+
+    def html(self, page_id):
+        rng = random.Random(self.seed * 7919 + page_id)
+        words = None
+        if page_id > 0 and rng.random() < self.dup_rate:
+            words = self._body_words(rng.randrange(page_id))
+            if rng.random() < 0.5:
+                for i in rng.sample(range(len(words)), max(1, len(words) // 50)):
+                    words[i] = rng.choice(self.vocabulary)
+        if words is None:
+            words = self._body_words(page_id)
+
+        links = [self.url(rng.randrange(self.pages)) for _ in range(self.fanout)]
+        if rng.random() < self.trap_rate:
+            host = f"h{page_id % self.hosts}.ics.uci.edu"
+            links.append(f"https://{host}/calendar/{2000 + page_id % 25}-{1 + page_id % 12:02d}")
+            links.append(f"https://{host}/events?page={6 + page_id}")
+        paragraphs = " ".join(
+            f"<p>{' '.join(words[i:i + 50])}</p>" for i in range(0, len(words), 50))
+        anchors = " ".join(f'<a href="{link}">link</a>' for link in links)
+        return (
+            f"<html><head><title>Page {page_id}</title>"
+            f"<script>var x = {page_id};</script></head>"
+            f"<body>{paragraphs}<div>{anchors}</div></body></html>")
+
+    def response(self, url):
+        """ The dict the real cache server would CBOR-encode for url. """
+        page_id = self.page_id(url)
+        raw = requests.Response()
+        raw.url = url
+        if page_id is None:
+            raw.status_code = 404
+            raw._content = b"Not Found"
+        else:
+            raw.status_code = 200
+            raw._content = self.html(page_id).encode("utf-8")
+        raw.headers["Content-Type"] = "text/html; charset=utf-8"
+        raw.headers["Content-Length"] = str(len(raw._content))
+        return {"url": url, "status": raw.status_code, "response": pickle.dumps(raw)}
+
+
+class FakeCacheServer(object):
+    """
+    Local stand-in for the spacetime cache server. Answers
+    GET /?q=<url>&u=<user agent> with a CBOR body, like the real one, over
+    keep-alive HTTP/1.1. `latency` adds a fixed delay (seconds) per request.
+    """
+    def __init__(self, web, host="127.0.0.1", port=0, latency=0.0):
+        self.web = web
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.cache = dict()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                if "q" not in query or "u" not in query:
+                    self.send_error(400)
+                    return
+                body = server.encode(query["q"][0])
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/cbor")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def encode(self, url):
+        with self.lock:
+            self.requests += 1
+            body = self.cache.get(url)
+        if body is None:
+            # pages are generated once and kept compressed, so the server
+            # itself does not dominate the measurements
+            body = cbor.dumps(self.web.response(url))
+            with self.lock:
+                self.cache[url] = zlib.compress(body, 1)
+            return body
+        return zlib.decompress(body)
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="FakeCacheServer", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,115 @@
+"""
+Micro-benchmarks for the scraper hot paths.
+
+    python -m benchmarks.micro
+
+Times is_valid (cold and cached), is_near_duplicate against an index of
+--indexed pages, and extract_next_links, on synthetic inputs from
+SyntheticWeb. Results are per-call microseconds.
+"""
+import json
+import os
+import tempfile
+import time
+
+from argparse import ArgumentParser
+
+from benchmarks.fake_cache_server import SyntheticWeb
+from benchmarks.timing import percentile
+
+
+def measure(func, inputs, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "calls": len(samples),
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+    }
+
+
+def sample_urls(web, count):
+    urls = []
+    for i in range(count):
+        host = f"h{i % web.hosts}.ics.uci.edu"
+        kind = i % 10
+        if kind == 0:
+            urls.append(f"https://{host}/calendar/20{i % 25:02d}-{1 + i % 12:02d}-{1 + i % 28:02d}")
+        elif kind == 1:
+            urls.append(f"https://{host}/events?page={i}")
+        elif kind == 2:
+            urls.append(f"https://{host}/files/report{i}.pdf")
+        elif kind == 3:
+            urls.append(f"https://www.example.com/page/{i}")
+        else:
+            urls.append(f"https://{host}/people/{i}/index.html?lang=en")
+    return urls
+
+
+def run(args):
+    import scraper
+    from utils.response import Response
+
+    web = SyntheticWeb(pages=args.indexed + args.samples, page_words=args.page_words,
+                       fanout=args.fanout, seed=args.seed)
+    results = dict()
+
+    urls = sample_urls(web, args.samples)
+    scraper._is_valid.cache_clear()
+    results["is_valid (cold)"] = measure(scraper.is_valid, urls)
+    results["is_valid (cached)"] = measure(scraper.is_valid, urls, repeat=3)
+
+    pages = [(web.url(i), web.html(i)) for i in range(args.indexed + args.samples)]
+    for url, html in pages[:args.indexed]:
+        scraper.is_near_duplicate(url, scraper.ParsedPage(url, html).text)
+    texts = [(url, scraper.ParsedPage(url, html).text) for url, html in pages[args.indexed:]]
+    results[f"is_near_duplicate ({args.indexed} indexed, {scraper.NEAR_DUPLICATE_METHOD})"] = \
+        measure(lambda item: scraper.is_near_duplicate(*item), texts)
+
+    responses = [Response(web.response(url)) for url, _ in pages[args.indexed:]]
+    results["extract_next_links"] = measure(
+        lambda resp: scraper.extract_next_links(resp.url, resp), responses)
+    return results
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--indexed", type=int, default=2000,
+                        help="pages stored in the near-duplicate index before timing")
+    parser.add_argument("--page-words", type=int, default=400)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=121)
+    parser.add_argument("--method", choices=("minhash", "jaccard"), default="minhash",
+                        help="near-duplicate method to time")
+    parser.add_argument("--json", type=str, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    import scraper
+    scraper.NEAR_DUPLICATE_METHOD = args.method
+
+    # is_near_duplicate appends fingerprints that are saved relative to cwd
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="crawler-micro-") as workdir:
+        os.chdir(workdir)
+        try:
+            results = run(args)
+        finally:
+            os.chdir(cwd)
+
+    for name, r in results.items():
+        print(f"{name:<45} calls={r['calls']:<7} mean={r['mean_us']:.1f}us "
+              f"p50={r['p50_us']:.1f}us p99={r['p99_us']:.1f}us")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
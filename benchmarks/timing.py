@@ -0,0 +1,80 @@
+import functools
+import resource
+import sys
+import time
+
+from threading import Lock
+
+
+class LatencyRecorder(object):
+    """ Thread-safe collection of call durations, in seconds. """
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.lock = Lock()
+
+    def add(self, seconds):
+        """ Record a duration measured elsewhere, e.g. in another process. """
+        with self.lock:
+            self.samples.append(seconds)
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.samples.append(elapsed)
+        return timed
+
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+        return {
+            "calls": len(samples),
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+            "max_ms": (samples[-1] if samples else 0.0) * 1000,
+        }
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and its waited-for children, in
+    MB. Processes started through a forkserver are not our children; see
+    process_peak_rss_mb for those.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return usage / scale, children / scale
+
+
+def process_peak_rss_mb(pids):
+    """
+    Largest peak resident set size among running processes, in MB, read
+    from /proc; None where /proc is not available.
+    """
+    peak = None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        mb = int(line.split()[1]) / 1024
+                        peak = mb if peak is None else max(peak, mb)
+                        break
+        except OSError:
+            continue
+    return peak
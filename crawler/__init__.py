@@ -1,26 +1,64 @@
-from utils import get_logger
+from utils import get_logger, configure_logging
+from utils.metrics import metrics, dump as dump_metrics, MetricsServer
 from crawler.frontier import Frontier
 from crawler.worker import Worker
-from pathlib import Path
+from crawler.async_worker import AsyncWorker
+from crawler.pipeline import ParsePipeline
+from crawler.report import CrawlReport
+from utils.history import CrawlHistory
+from utils.linkgraph import LinkGraph
 import time
 import threading
-from scraper import save_dup_state, save_state_file, max_words_page, global_word_counter
+from scraper import save_dup_state, save_state_file, word_stats
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
+        configure_logging(config.log_rate)
         self.logger = get_logger("CRAWLER")
-        self.frontier = frontier_factory(config, restart)
+        self.link_graph = None
+        if config.link_graph:
+            self.link_graph = LinkGraph(config.link_graph, restart=restart)
+        if frontier_factory is Frontier:
+            # the default frontier ranks urls by their in-links, among other things
+            self.frontier = frontier_factory(config, restart, link_graph=self.link_graph)
+        else:
+            self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
+        self.pipeline = None
+        self.metrics_server = None
+        self.report = None
+        self.history = None
+        if config.history_file:
+            self.history = CrawlHistory(
+                config.history_file, config.history_batch_size, restart=restart)
 
     def start_async(self):
-        self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier)
-            for worker_id in range(self.config.threads_count)]
+        worker_kwargs = dict(history=self.history, link_graph=self.link_graph)
+        if self.config.parse_processes > 0:
+            self.pipeline = ParsePipeline(
+                self.config, self.frontier, self.history, self.link_graph)
+            worker_kwargs["pipeline"] = self.pipeline
+        if self.config.fetch_engine == "async" and self.worker_factory is Worker:
+            # a single event loop thread keeps many downloads in flight
+            self.workers = [AsyncWorker(0, self.config, self.frontier, **worker_kwargs)]
+        else:
+            self.workers = [
+                self.worker_factory(worker_id, self.config, self.frontier, **worker_kwargs)
+                for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
 
+        metrics.gauge("active_workers", lambda: sum(1 for w in self.workers if w.is_alive()))
+        metrics.gauge("frontier_queue", lambda: self.frontier.tbd_count)
+        metrics.gauge("frontier_discovered", lambda: self.frontier.discovered)
+        metrics.gauge("frontier_completed", lambda: self.frontier.completed)
+        if self.config.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.config.metrics_port).start()
+            host, port = self.metrics_server.address
+            self.logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
         # Loop for printing status in logger file and text file    
         def print_status_loop():
             interval = 120 # seconds # todo: make this configurable
@@ -34,6 +72,19 @@ class Crawler(object):
                     "Status: discovered=%d  queue=%d  completed=%d",
                     st["total_discovered"], st["queue_size"], st["completed"]
                 )
+                busiest = sorted(
+                    self.frontier.host_rates().items(),
+                    key=lambda item: item[1]["requests"], reverse=True)[:5]
+                for host, rate in busiest:
+                    self.logger.info(
+                        "Status: host %s requests=%d errors=%d timeouts=%d "
+                        "delay=%.2fs latency=%.3fs rate=%.2f/s",
+                        host, rate["requests"], rate["errors"], rate["timeouts"],
+                        rate["delay"], rate["latency"], rate["rate"])
+                if self.workers and hasattr(self.workers[0], "connection_stats"):
+                    self.logger.info(
+                        "Status: cache server connections %s",
+                        self.workers[0].connection_stats())
                 if alive == 0:
                     break
                 time.sleep(interval)
@@ -44,43 +95,16 @@ class Crawler(object):
         )
         self.status_thread.start()
 
-        # Loop for printing status in text file
+        # Loop for printing status in text file; the report is kept up to
+        # date incrementally, so writing it is cheap and never locks the frontier
+        self.report = CrawlReport(self.frontier, word_stats, "crawl_stats.txt")
         def update_status_file():
-            interval = 120
-            outfile = Path("crawl_stats.txt")
             while True:
-                with self.frontier.Lock:
-                    unique_url_count = len(self.frontier.unique_urls)
-                    subdomains = {
-                        sd: len(urls)
-                        for sd, urls in self.frontier.subdomains.items()
-                    }
-                from scraper import max_words_page, global_word_counter
-                longest_url, max_words = max_words_page
-                top50: list[tuple[str,int]] = global_word_counter.most_common(50)
-
-                lines = []
-                lines.append(f"UNIQUE URLS (count): {unique_url_count}\n")
-                lines.append("SUBDOMAINS (alphabetical)\n")
-                for sd in sorted(subdomains):
-                    lines.append(f"{sd}, {subdomains[sd]}")
-                lines.append("")
-                lines.append("LONGEST PAGE:")
-                if longest_url:
-                    lines.append(f"URL : {longest_url}")
-                    lines.append(f"Word Count : {max_words}")
-                else:
-                    lines.append("N/A")
-                lines.append("")
-                lines.append("TOP-50 WORDS:")
-                for w, f in top50:
-                    lines.append(f"{w:} {f}")
-                lines.append("")
-
-                outfile.write_text("\n".join(lines), encoding="utf-8")
-                if not any(w.is_alive() for w in self.workers):
+                done = not any(w.is_alive() for w in self.workers)
+                self.report.write()
+                if done:
                     break
-                time.sleep(interval)
+                time.sleep(self.config.report_interval)
         self.print_thread = threading.Thread(
             target=update_status_file,
             name="PrintThread",
@@ -92,11 +116,25 @@ class Crawler(object):
         def periodic_save():
             while True:
                 time.sleep(120)
-                save_state_file(self.frontier, max_words_page, global_word_counter)
+                save_state_file()
                 save_dup_state()
+                self.frontier.snapshot()
+                if self.history is not None:
+                    self.history.flush()
+                if self.link_graph is not None:
+                    self.link_graph.flush()
 
         threading.Thread(target=periodic_save, daemon=True).start()
 
+        # Loop for dumping metrics
+        def periodic_metrics_dump():
+            while True:
+                time.sleep(self.config.metrics_interval)
+                dump_metrics(self.config.metrics_file)
+
+        if self.config.metrics_file:
+            threading.Thread(target=periodic_metrics_dump, name="MetricsThread", daemon=True).start()
+
     def start(self):
         self.start_async()
         self.join()
@@ -104,3 +142,13 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        if self.pipeline is not None:
+            self.pipeline.shutdown()
+        if self.report is not None:
+            self.report.write()
+        if self.history is not None:
+            self.history.close()
+        if self.link_graph is not None:
+            self.link_graph.close()
+        if self.config.metrics_file:
+            dump_metrics(self.config.metrics_file)
@@ -0,0 +1,126 @@
+import asyncio
+import random
+import time
+
+from crawler.worker import Worker
+from utils.async_download import AsyncCacheClient, download_async
+from utils.metrics import metrics
+import scraper
+
+# Idle fetch tasks never wait less than IDLE_WAIT_FLOOR seconds for a
+# cooling down host, plus up to IDLE_WAIT_JITTER, so a zero politeness
+# delay does not turn the wait into a busy loop.
+IDLE_WAIT_FLOOR = 0.005
+IDLE_WAIT_JITTER = 0.002
+
+
+class AsyncWorker(Worker):
+    """
+    Alternative to a pool of threaded Workers: one thread running an asyncio
+    event loop with config.async_concurrency fetch tasks, so hundreds of
+    downloads can be in flight at once. Per-host politeness is still
+    enforced by Frontier.get_tbd_url; checking and scraping a response runs
+    on the loop's default thread pool so it does not stall other fetches.
+
+    Idle tasks wait on a condition instead of polling the frontier. A
+    finished fetch wakes one of them, since its links may be ready, and
+    every task that gets a url wakes the next one, so wakeups follow the
+    work available. Only one idle task sleeps until the next host's
+    access time; the others wait to be woken.
+    """
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        self.client = None
+        if self.config.cache_server is not None:
+            # there is no cache server in replay mode
+            host, port = self.config.cache_server
+            self.client = AsyncCacheClient(host, port, self.config.async_concurrency)
+        self.fetching = 0
+        self.wakeup = asyncio.Condition()
+        # access time the timer task is waiting for, if any
+        self.timer_at = None
+        try:
+            await asyncio.gather(*(
+                self._fetch_loop(self.client)
+                for _ in range(self.config.async_concurrency)))
+        finally:
+            if self.client is not None:
+                await self.client.close()
+
+    def connection_stats(self):
+        client = getattr(self, "client", None)
+        return client.stats() if client else {"requests": 0, "new_connections": 0, "reused": 0}
+
+    async def _wake_one(self):
+        async with self.wakeup:
+            self.wakeup.notify()
+
+    async def _idle(self, wake_at=None):
+        """
+        Wait until another task wakes this one, or until wake_at if no
+        other task is already waiting for that time or an earlier one.
+        """
+        async with self.wakeup:
+            timeout = None
+            if wake_at is not None and (self.timer_at is None or wake_at < self.timer_at):
+                self.timer_at = wake_at
+                timeout = (max(IDLE_WAIT_FLOOR, wake_at - time.time())
+                           + random.uniform(0, IDLE_WAIT_JITTER))
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if timeout is not None and self.timer_at == wake_at:
+                    self.timer_at = None
+
+    async def _fetch_loop(self, client):
+        loop = asyncio.get_running_loop()
+        retry_delay = self.config.retry_delay
+        idle_rounds = 0
+        while True:
+            tbd_url, next_access_time = self.frontier.get_tbd_url()
+            if not tbd_url:
+                if next_access_time:
+                    await self._idle(next_access_time)
+                    continue
+                if self.fetching:
+                    # a fetch in flight can add more urls; it wakes a task when done
+                    await self._idle()
+                    continue
+                if self.pipeline is not None and self.pipeline.busy():
+                    # pages still being analyzed can add more urls
+                    await self._idle(time.time() + retry_delay / 10)
+                    continue
+                idle_rounds += 1
+                if idle_rounds > 3:
+                    self.logger.info("No URLs to download. Exiting.")
+                    # the tasks still waiting come to the same conclusion
+                    async with self.wakeup:
+                        self.wakeup.notify_all()
+                    return
+                await asyncio.sleep(retry_delay)
+                continue
+            idle_rounds = 0
+            # there may be more urls ready than the tasks already awake
+            await self._wake_one()
+
+            if not scraper.is_valid(tbd_url):
+                self.logger.info(f"Skipping invalid URL {tbd_url}. Marking as complete.")
+                self.frontier.mark_url_complete(tbd_url)
+                continue
+
+            self.fetching += 1
+            try:
+                start = time.perf_counter()
+                resp = await download_async(tbd_url, self.config, client, self.logger)
+                latency = time.perf_counter() - start
+                metrics.observe("download", latency)
+                self.logger.info(f"Latency {latency:.3f}s | {tbd_url} | status {resp.status}")
+                self.frontier.record_fetch(tbd_url, latency, resp)
+                await loop.run_in_executor(None, self.handle_response, tbd_url, resp, latency)
+            finally:
+                self.fetching -= 1
+                await self._wake_one()
@@ -1,272 +1,831 @@
-import os
-import shelve
-import time
-
-from threading import Thread, RLock
-from queue import Queue, Empty
-
-from utils import get_logger, get_urlhash, normalize
-import scraper
-from scraper import is_valid, EXACT_DUP_FILE, NEAR_DUP_FILE, STATE_FILE
-
-#adding extra libs
-from collections import defaultdict
-from urllib.parse import urlparse, urldefrag
-import heapq
-from collections import deque
-
-class Frontier(object):
-    def __init__(self, config, restart):
-        self.logger = get_logger("FRONTIER")
-        self.config = config
-        self.to_be_downloaded = []
-        self.domain_queues  = defaultdict(deque)
-        self.domain_next    = defaultdict(float)
-        self.ready_heap     = []
-
-        ## adding more needed attributes
-        self.Lock = RLock()
-        self.domain_last_access = {}
-        self.subdomains = defaultdict(set)
-        self.unique_urls = set()
-        self.discovered = 0
-        self.completed = 0
-        
-        if not os.path.exists(self.config.save_file) and not restart:
-            # Save file does not exist, but request to load save.
-            self.logger.info(
-                f"Did not find save file {self.config.save_file}, "
-                f"starting from seed.")
-            if os.path.exists(EXACT_DUP_FILE):
-                os.remove(EXACT_DUP_FILE)
-            if os.path.exists(NEAR_DUP_FILE):
-                os.remove(NEAR_DUP_FILE)
-            if os.path.exists(STATE_FILE):
-                os.remove(STATE_FILE)
-        elif os.path.exists(self.config.save_file) and restart:
-            # Save file does exists, but request to start from seed.
-            self.logger.info(
-                f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
-            if os.path.exists(EXACT_DUP_FILE):
-                os.remove(EXACT_DUP_FILE)
-            if os.path.exists(NEAR_DUP_FILE):
-                os.remove(NEAR_DUP_FILE)
-            if os.path.exists(STATE_FILE):
-                os.remove(STATE_FILE)
-        # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
-        scraper.seen_hashes = scraper.load_dup_state(EXACT_DUP_FILE, set())
-        scraper.seen_shingles = scraper.load_dup_state(NEAR_DUP_FILE, {})
-        scraper.load_state_file(self)
-        if restart:
-            for url in self.config.seed_urls:
-                self.add_url(url)
-        else:
-            # Set the frontier state with contents of save file.
-            if len(self.save) == 0:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
-            self._parse_save_file()
-
-
-
-
-    def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
-        tbd_count = 0
-
-        for url, completed in self.save.values():
-            self.discovered += 1
-            if completed:
-                self.completed += 1
-                continue
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                #building the unique urls set
-                self.unique_urls.add(url)
-                tbd_count += 1
-            
-        self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
-
-    def get_tbd_url(self):
-        """
-        Get the next URL to be downloaded from the frontier.
-        """
-          
-        # with self.lock:
-        #     while self.ready_heap:
-        #         # pop the next domain to be downloaded
-        #         next_t, domain = heapq.heappop(self.ready_heap)
-        #         now = time.time()
-
-        #         if next_t > now:
-        #             # If the next time is in the future, push it back and return None
-        #             heapq.heappush(self.ready_heap, (next_t, domain))
-        #             self.logger.info(f"Waiting for {domain} to be ready.")
-        #             return None                      
-
-        #         dq = self.domain_queues[domain]
-        #         # if the queue is empty, continue to the next domain
-        #         if not dq:       
-        #             continue
-               
-        #         url = dq.popleft()
-
-        #         # set the next time to be downloaded for this domain
-        #         # and push it back to the heap
-        #         self.domain_next[domain] = now + self.politeness
-        #         if dq: 
-        #             heapq.heappush(self.ready_heap,
-        #                            (self.domain_next[domain], domain))
-        #         return url
-        #     return None
-        
-        # make sure only one thread at a time for the thread-safe purpose
-        with self.Lock:
-            smallest_next_access_time = time.time() + self.config.time_delay
-            for i, url in enumerate(self.to_be_downloaded):
-                domain = urlparse(url).netloc 
-                last_access = self.domain_last_access.get(domain, 0) 
-                crawl_delay = self.config.time_delay
-                now = time.time()
-                smallest_next_access_time = min(smallest_next_access_time, last_access + crawl_delay)
-                # Respect the crawl delay
-                if now - last_access >= crawl_delay:
-                    self.domain_last_access[domain] = now
-                    return self.to_be_downloaded.pop(i), None
-            if self.to_be_downloaded: # if there are still urls in the queue but not ready to be downloaded yet
-                self.logger.info(f"Waiting for {smallest_next_access_time - time.time()} seconds to download the next URL.")
-                return None, smallest_next_access_time
-            else: # if there are no urls in the queue, return None
-                self.logger.info("No URLs to download.")
-                return None, None
-        
-
-    def add_url(self, url):
-
-        # make sure only one thread at a time for the thread-safe purpose
-        with self.Lock:
-            url = normalize(url)
-            
-            # check if the url is valid
-            if not is_valid(url):
-                return
-            
-            # get rid of the fragment and starting here using fragment_clean version urls
-            unfrag_url, _ = urldefrag(url)
-
-            urlhash = get_urlhash(unfrag_url)
-            if urlhash in self.save:
-                self.logger.info(f"URL already in the frontier or completed: {url}")
-                return
-            
-            if urlhash not in self.save:
-                self.logger.info(f"Adding URL to frontier: {unfrag_url}") 
-                self.save[urlhash] = (unfrag_url, False)
-                self.save.sync()
-
-                self.to_be_downloaded.append(unfrag_url)
-
-                self.discovered +=1 # discovered means that the url is added to the frontier
-
-                #building up the unique URLs set
-                self.unique_urls.add(unfrag_url)
-                parsed_unfrag = urlparse(unfrag_url)
-                hostname = parsed_unfrag.hostname
-                # Check which subdomain the URL is belonging to
-                if hostname and self.check_subdomain(unfrag_url):
-                    self.subdomains[hostname].add(unfrag_url)
-                    
-
-    def mark_url_complete(self, url):
-
-        # make sure only one thread at a time for the thread-safe purpose
-        with self.Lock:
-            urlhash = get_urlhash(url)
-            if urlhash not in self.save:
-                # This should not happen.
-                self.logger.error(
-                    f"Completed url {url}, but have not seen it before.")
-            self.logger.info(f"Marking URL as complete: {url}")
-            self.completed += 1
-            self.save[urlhash] = (url, True)
-            self.save.sync()
-            if not self.to_be_downloaded:
-                self.logger.info("Frontier is empty.")
-
-
-
-    # checking if the url is following the instruction of
-    #*.ics.uci.edu/*
-    #*.cs.uci.edu/*
-    #*.informatics.uci.edu/*
-    #*.stat.uci.edu/*
-    #today.uci.edu/department/information_computer_sciences/*
-    def check_subdomain(self, url):
-        try:
-            parsed_url = urlparse(url)
-            hostname = parsed_url.hostname
-            path = parsed_url.path
-
-            if hostname is None:
-                return False
-
-            assigned_domains = (
-                ".ics.uci.edu",
-                ".cs.uci.edu",
-                ".informatics.uci.edu",
-                ".stat.uci.edu"
-            )
-
-            if any(hostname.endswith(domain) for domain in assigned_domains):
-                return True
-
-            if hostname == ("today.uci.edu") and path.startswith("/department/information_computer_sciences"):
-                return True
-
-            return False
-
-        except Exception as e:
-            self.logger.error(f"Error on {url}: {e}")
-            return False
-
-
-    def get_status(self):
-        """
-        Return a dict of the information of the frontier.
-        """
-        with self.Lock:
-            return {
-                "total_discovered": self.discovered,
-                "queue_size": len(self.to_be_downloaded),
-                "completed": self.completed,
-            }
-
-
-
-    # 1.How many unique pages did you find?
-    # Uniqueness for the purposes of this assignment is ONLY established by the URL,
-    # but discarding the fragment part.
-    def print_unique_urls(self):
-        self.logger.info(f"There are total of {len(self.unique_urls)} unique pages")
-
-
-
-    # 4. How many subdomains did you find in the uci.edu domain?
-    def print_subdomains(self):
-        self.logger.info("The following are the subdomains:")
-        for subdomain in sorted(self.subdomains):
-            self.logger.info(f"{subdomain}", len(self.subdomains[subdomain]))
-
-    def sync(self):
-        with self.Lock:
-            self.save.sync()
-            
-    def queue_size(self):
-        with self.Lock:
-            return len(self.to_be_downloaded)
-
+import dbm
+import glob
+import itertools
+import os
+import random
+import shelve
+import time
+import zlib
+
+from threading import Thread, Lock, RLock
+from queue import Queue, Empty
+
+from utils import get_logger, get_urlfingerprint, normalize
+from utils.bloom import PartitionedBloomFilter
+from utils.metrics import metrics, TimedLock
+from crawler.persistence import WriteBehindStore, ResumeLog
+from crawler.politeness import HostRate, classify, ERROR, TIMEOUT
+from crawler.priority import make_policy, RETRY_PRIORITY
+from crawler.report import SubdomainIndex
+import scraper
+from scraper import is_valid
+
+#adding extra libs
+from collections import defaultdict, Counter
+from urllib.parse import urlparse, urldefrag
+import heapq
+
+# Save file records are keyed by the 8-byte url fingerprint; the value is
+# b"1" (completed) or b"0" (pending) followed by the utf-8 url.
+def encode_record(url, completed):
+    return (b"1" if completed else b"0") + url.encode("utf-8")
+
+def decode_record(value):
+    if value[:1] not in (b"0", b"1"):
+        raise ValueError(f"Unrecognized save file record {value[:20]!r}.")
+    return value[1:].decode("utf-8"), value[:1] == b"1"
+
+def min_depth(a, b):
+    """ The smaller of two depths, either of which may be unknown (None). """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+class FrontierShard(object):
+    """
+    One partition of the frontier. Every domain hashes to exactly one
+    shard, which owns that domain's politeness schedule and its counters,
+    all guarded by the shard's own lock.
+    Threads working on domains in different shards never wait on each
+    other.
+
+        domain_queues -> min-heap of (priority, seq, url, depth) of the urls
+                         waiting for each domain; seq keeps equal
+                         priorities in FIFO order
+        queued        -> (priority, depth) of every waiting url; heap
+                         entries whose priority does not match are stale
+                         and skipped
+        domain_next   -> earliest time each domain may be accessed again
+        wait_heap     -> min-heap of (next access time, domain) of the
+                         domains still waiting out their delay
+        ready_heap    -> min-heap of (score, seq, domain) of the domains that
+                         may be accessed now, scored by their best url; every
+                         domain with waiting urls is in one of the two heaps
+        in_progress   -> depth of the urls handed out and not completed yet;
+                         snapshots count them as pending so a crash does not
+                         lose them
+        hosts         -> adaptive delay and rate of each fetched domain
+        retry_heap    -> min-heap of (retry time, url, depth) for downloads
+                         that failed transiently; see Frontier.retry_url
+        attempts      -> failed download attempts of each url being retried
+
+    The order urls leave in is up to the policy, a
+    crawler.priority.PriorityPolicy; pushing and popping a url is
+    O(log n) whatever it is. seq is shared by all the shards, so ready
+    heap heads of different shards compare in FIFO order too.
+    """
+    def __init__(self, policy, seq=None, index=0):
+        # records how long threads wait for the shard, in a histogram of
+        # its own so shards share no lock there either
+        self.lock = TimedLock(RLock(), f"frontier_lock_wait.{index}")
+        self.policy = policy
+        self.domain_queues = defaultdict(list)
+        self.queued = dict()
+        self.seq = seq if seq is not None else itertools.count()
+        self.domain_next = defaultdict(float)
+        self.wait_heap = []
+        self.ready_heap = []
+        self.in_progress = dict()
+        self.hosts = dict()
+        self.retry_heap = []
+        self.attempts = dict()
+        # number of discovered urls per assigned subdomain
+        self.subdomains = Counter()
+        self.tbd_count = 0
+        self.discovered = 0
+        self.completed = 0
+
+    def enqueue(self, url, domain, priority, depth=None):
+        """
+        Queue a url for its domain, or move it up if it is already waiting
+        with a worse priority; returns whether it did either. A domain
+        whose queue was empty is scheduled in the wait heap. Caller must
+        hold self.lock.
+        """
+        current = self.queued.get(url)
+        if current is not None and current[0] <= priority:
+            return False
+        heap = self.domain_queues[domain]
+        if not heap:
+            heapq.heappush(self.wait_heap, (self.domain_next[domain], domain))
+        heapq.heappush(heap, (priority, next(self.seq), url, depth))
+        self.queued[url] = (priority, depth)
+        if current is None:
+            self.tbd_count += 1
+        return True
+
+    def rescore(self, url, domain, priority, depth=None):
+        """
+        Move a waiting url up if priority beats its current one. The url
+        keeps the smaller of its two depths. Caller must hold self.lock.
+        """
+        current = self.queued.get(url)
+        if current is None:
+            return False
+        return self.enqueue(url, domain, priority, min_depth(current[1], depth))
+
+    def _top(self, domain):
+        """ Best live entry of domain's queue, dropping stale ones. Caller must hold self.lock. """
+        heap = self.domain_queues.get(domain)
+        queued = self.queued
+        while heap and queued.get(heap[0][2], (None,))[0] != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _make_ready(self, domain):
+        """ Rank a domain that may be accessed now by its best url. Caller must hold self.lock. """
+        top = self._top(domain)
+        if top is None:
+            self.domain_queues.pop(domain, None)
+            return
+        priority, seq = top[0], top[1]
+        heapq.heappush(
+            self.ready_heap, (priority + self.policy.host_priority(domain), seq, domain))
+
+    def _release_retries(self, now):
+        """ Move retries that are due back into their domain queues. Caller must hold self.lock. """
+        retry_heap = self.retry_heap
+        while retry_heap and retry_heap[0][0] <= now:
+            _, url, depth = heapq.heappop(retry_heap)
+            self.enqueue(url, urlparse(url).netloc, RETRY_PRIORITY, depth)
+
+    def _ready_head(self, now):
+        """
+        Best entry of the ready heap after ranking the domains that have
+        waited out their delay and dropping stale entries, or None.
+        Caller must hold self.lock.
+        """
+        self._release_retries(now)
+        wait_heap, ready_heap = self.wait_heap, self.ready_heap
+        while wait_heap and wait_heap[0][0] <= now:
+            next_t, domain = wait_heap[0]
+            if next_t < self.domain_next[domain]:
+                # the domain backed off after it was scheduled
+                heapq.heapreplace(wait_heap, (self.domain_next[domain], domain))
+                continue
+            heapq.heappop(wait_heap)
+            self._make_ready(domain)
+
+        while ready_heap:
+            _, seq, domain = ready_heap[0]
+            if self.domain_next[domain] > now:
+                # the domain backed off while it was ready
+                heapq.heappop(ready_heap)
+                heapq.heappush(wait_heap, (self.domain_next[domain], domain))
+                continue
+            top = self._top(domain)
+            if top is None or top[1] != seq:
+                # its best url changed since it was ranked
+                heapq.heappop(ready_heap)
+                self._make_ready(domain)
+                continue
+            return ready_heap[0]
+        return None
+
+    def _next_time(self):
+        """ Earliest time a domain or retry is due. Caller must hold self.lock. """
+        next_t = self.wait_heap[0][0] if self.wait_heap else None
+        if self.retry_heap and (next_t is None or self.retry_heap[0][0] < next_t):
+            next_t = self.retry_heap[0][0]
+        return next_t
+
+    def peek_ready(self, now):
+        """
+        ((score, seq), None) of the url pop_ready would return now,
+        (None, next_access_time) if every domain here is still cooling
+        down, or (None, None) if the shard is empty.
+        """
+        with self.lock:
+            head = self._ready_head(now)
+            if head is None:
+                return None, self._next_time()
+            return head[:2], None
+
+    def pop_ready(self, now, base_delay):
+        """
+        Return (url, None) with the best url of the domains that have
+        waited out their delay, (None, next_access_time) if every domain
+        here is still cooling down, or (None, None) if the shard is empty.
+        """
+        with self.lock:
+            head = self._ready_head(now)
+            if head is None:
+                return None, self._next_time()
+
+            _, _, domain = heapq.heappop(self.ready_heap)
+            heap = self.domain_queues[domain]
+            _, _, url, depth = heapq.heappop(heap)
+            del self.queued[url]
+            self.tbd_count -= 1
+            self.in_progress[url] = depth
+
+            # set the next time to be downloaded for this domain
+            # and schedule it again if it still has urls
+            host = self.hosts.get(domain)
+            self.domain_next[domain] = now + (host.delay if host else base_delay)
+            if self._top(domain) is not None:
+                heapq.heappush(self.wait_heap, (self.domain_next[domain], domain))
+            else:
+                del self.domain_queues[domain]
+            return url, None
+
+    def state(self):
+        """ Copy of the shard for a snapshot. Caller must hold self.lock. """
+        queued = self.queued
+        queues = {
+            domain: [entry for entry in heap if queued.get(entry[2], (None,))[0] == entry[0]]
+            for domain, heap in self.domain_queues.items()}
+        # urls being downloaded or waiting for a retry go first after a resume
+        pending = itertools.chain(
+            self.in_progress.items(), ((url, depth) for _, url, depth in self.retry_heap))
+        for url, depth in pending:
+            queues.setdefault(urlparse(url).netloc, []).append((RETRY_PRIORITY, -1, url, depth))
+        return {
+            "discovered": self.discovered,
+            "completed": self.completed,
+            "subdomains": dict(self.subdomains),
+            "domain_next": dict(self.domain_next),
+            "queues": queues,
+        }
+
+    def load_state(self, state):
+        """
+        Restore a snapshot taken by state(); returns its url queues, as
+        lists of (priority, seq, url, depth) entries, or of urls for a
+        snapshot written before urls had priorities.
+        """
+        self.discovered = state["discovered"]
+        self.completed = state["completed"]
+        self.subdomains = Counter(state["subdomains"])
+        self.domain_next.update(state["domain_next"])
+        return state["queues"]
+
+
+class Frontier(object):
+    def __init__(self, config, restart, link_graph=None):
+        self.logger = get_logger("FRONTIER")
+        self.config = config
+        # urls in a snapshot taken under the same rules were checked when
+        # they were queued; after the rules change they are checked again
+        self.url_rules = scraper.url_rules_version()
+        # orders the urls of every shard; see crawler.priority
+        self.policy = make_policy(config.priority_policy, config, link_graph)
+        # the frontier is partitioned by domain hash; see FrontierShard
+        seq = itertools.count()
+        self.shards = [
+            FrontierShard(self.policy, seq, index) for index in range(self.config.frontier_shards)]
+        # in-memory filter in front of the save file for "already seen"
+        # checks. It is partitioned by fingerprint, not by domain, so hosts
+        # holding most of the urls do not overfill one part of it. A url's
+        # check and add happen under its shard's lock.
+        self.seen = PartitionedBloomFilter(
+            self.config.seen_capacity, self.config.frontier_shards)
+        # alphabetical list of the subdomains the shards count, for the report
+        self.subdomain_index = SubdomainIndex()
+        self.resume = ResumeLog(
+            f"{self.config.save_file}.resume",
+            flush_interval=self.config.save_interval)
+        # one snapshot at a time, so their log generations do not interleave
+        self.snapshot_lock = Lock()
+        save_found = self._save_files() or self.resume.exists()
+
+        if not save_found and not restart:
+            # Save file does not exist, but request to load save.
+            self.logger.info(
+                f"Did not find save file {self.config.save_file}, "
+                f"starting from seed.")
+            scraper.remove_dup_state()
+            scraper.remove_state_file()
+        elif restart:
+            # Request to start from seed: drop the save file if there is one
+            # and the duplicate detection state in any case.
+            if save_found:
+                self.logger.info(
+                    f"Found save file {self.config.save_file}, deleting it.")
+            for path in self._save_files():
+                os.remove(path)
+            self.resume.remove()
+            scraper.remove_dup_state()
+            scraper.remove_state_file()
+        elif self._save_files():
+            self._migrate_save_file()
+        # Load existing save file, or create one if it does not exist.
+        self.save = WriteBehindStore(
+            self.config.save_file,
+            batch_size=self.config.save_batch_size,
+            flush_interval=self.config.save_interval)
+        scraper.load_dup_state()
+        scraper.NEAR_DUPLICATE_METHOD = self.config.near_dup_method
+        scraper.load_state_file()
+        if restart:
+            for url in self.config.seed_urls:
+                self.add_url(url)
+        else:
+            start = time.perf_counter()
+            source = self._load_resume_state()
+            if source is None and len(self.save) == 0:
+                source = "seed"
+                for url in self.config.seed_urls:
+                    self.add_url(url)
+            elif source is None:
+                # save file from before resume logs existed: scan it once
+                # and snapshot, so the next start is fast
+                source = "save file scan"
+                self._parse_save_file()
+                self.snapshot()
+            for shard in self.shards:
+                for hostname in shard.subdomains:
+                    self.subdomain_index.add(hostname, shard)
+            self.startup_seconds = time.perf_counter() - start
+            self.logger.info(
+                f"Frontier resumed from {source} in {self.startup_seconds:.3f}s: "
+                f"{self.tbd_count} urls to be downloaded, "
+                f"{self.discovered} discovered, {self.completed} completed.")
+
+    def _shard_index(self, domain):
+        return zlib.crc32(domain.encode("utf-8")) % len(self.shards)
+
+    def _shard(self, domain):
+        return self.shards[self._shard_index(domain)]
+
+    # Aggregates over the shards. They read each shard's counters without
+    # taking its lock, so they never stall the workers; a value may be a
+    # few updates behind, which is fine for progress reporting.
+    @property
+    def tbd_count(self):
+        # urls waiting for a retry are still to be downloaded
+        return sum(shard.tbd_count + len(shard.retry_heap) for shard in self.shards)
+
+    @property
+    def discovered(self):
+        return sum(shard.discovered for shard in self.shards)
+
+    @property
+    def completed(self):
+        return sum(shard.completed for shard in self.shards)
+
+    @property
+    def subdomains(self):
+        subdomains = Counter()
+        for shard in self.shards:
+            subdomains.update(dict(shard.subdomains))
+        return subdomains
+
+    def subdomain_counts(self):
+        """ (subdomain, discovered urls) pairs in alphabetical order, without sorting. """
+        return self.subdomain_index.counts()
+
+    def _save_files(self):
+        """ Files of the save dbm; the suffixes depend on the dbm backend. """
+        base = self.config.save_file
+        return [
+            path for path in (base, f"{base}.db", f"{base}.dat", f"{base}.dir",
+                              f"{base}.bak", f"{base}.pag")
+            if os.path.exists(path)]
+
+    def _load_resume_state(self):
+        """
+        Restore the frontier from the last snapshot plus the event log
+        written after it. Returns what it resumed from, or None if there
+        is nothing to resume from.
+        """
+        if not self.resume.exists():
+            return None
+        state, events = self.resume.load()
+        queues = dict()
+        if state is not None:
+            if len(state["shards"]) != len(self.shards):
+                # the shard counters cannot be split differently
+                self.logger.info(
+                    f"Frontier snapshot has {len(state['shards'])} shards, "
+                    f"not {len(self.shards)}; rebuilding from the save file.")
+                return None
+            if "seen" not in state:
+                self.logger.info(
+                    "Frontier snapshot has a seen filter per shard; "
+                    "rebuilding from the save file.")
+                return None
+            self.seen = state["seen"]
+            for shard, shard_state in zip(self.shards, state["shards"]):
+                queues.update(shard.load_state(shard_state))
+        # queued urls passed is_valid when they were added; only check them
+        # again if the rules changed since the snapshot
+        recheck = state is None or state.get("url_rules") != self.url_rules
+        if recheck and state is not None:
+            self.logger.info("The url rules changed since the snapshot; checking queued urls again.")
+
+        # the snapshot's shards were copied one at a time: in its own
+        # generation, a shard's events before its mark are already in the
+        # copy. Snapshots from before the marks copied every shard at once.
+        marked = state is not None and state.get("shard_marks", False)
+        copied = set()
+
+        # replay: added urls join their domain queue; completed ones are
+        # dropped from the queues afterwards in a single pass
+        replayed = 0
+        done = set()
+        for generation, kind, url in events:
+            if kind == b"S":
+                if marked and generation == state["generation"]:
+                    copied.add(int(url))
+                continue
+            domain = urlparse(url).netloc
+            index = self._shard_index(domain)
+            if marked and generation == state["generation"] and index not in copied:
+                continue
+            replayed += 1
+            shard = self.shards[index]
+            if kind == b"A":
+                self.seen.add(get_urlfingerprint(url))
+                shard.discovered += 1
+                hostname = urlparse(url).hostname
+                if hostname and self.check_subdomain(url):
+                    shard.subdomains[hostname] += 1
+                queues.setdefault(domain, []).append(url)
+            elif kind == b"C":
+                shard.completed += 1
+                done.add(url)
+
+        for domain, entries in queues.items():
+            shard = self._shard(domain)
+            # snapshot entries keep their priority and order; logged urls,
+            # and those of snapshots from before priorities, are scored now
+            scored = sorted(entry for entry in entries if isinstance(entry, tuple))
+            for priority, _, url, depth in scored:
+                if url not in done and (not recheck or is_valid(url)):
+                    shard.enqueue(url, domain, priority, depth)
+            for url in entries:
+                if isinstance(url, str) and url not in done and (not recheck or is_valid(url)):
+                    shard.enqueue(url, domain, self.policy.priority(url, None))
+        source = "snapshot" if state is not None else "resume log"
+        return f"{source} + {replayed} logged events"
+
+    def snapshot(self):
+        """
+        Write the frontier state to the resume snapshot. A new log
+        generation is started first, then the shards are copied one at a
+        time, each under its own lock; the mark logged with each copy tells
+        a resume which of that shard's events the copy already holds. The
+        seen filter is copied after the shards without any shard lock, and
+        pickling and writing happen last.
+        """
+        start = time.perf_counter()
+        with self.snapshot_lock:
+            generation = self.resume.rotate()
+            shards = []
+            for index, shard in enumerate(self.shards):
+                with shard.lock:
+                    shards.append(shard.state())
+                    self.resume.mark_copied(index)
+            state = {
+                "shards": shards,
+                # may hold urls added after their shard was copied; their
+                # events are replayed, which adds them again
+                "seen": self.seen.copy(),
+                "url_rules": self.url_rules,
+                "shard_marks": True,
+            }
+            self.resume.write_snapshot(generation, state)
+        elapsed = time.perf_counter() - start
+        metrics.observe("frontier_snapshot", elapsed)
+        self.logger.info(f"Wrote frontier snapshot in {elapsed:.3f}s.")
+
+    def _migrate_save_file(self):
+        """
+        Rewrite a save file from before url fingerprints, a shelve of
+        url hash -> (url, completed), as fingerprint -> record. Does
+        nothing if the file is in the current format.
+        """
+        save_file = self.config.save_file
+        with dbm.open(save_file, "r") as db:
+            key = db.firstkey() if hasattr(db, "firstkey") else next(iter(db.keys()), None)
+            if key is None or db[key][:1] in (b"0", b"1"):
+                return
+        start = time.perf_counter()
+        # the new file is written next to the old one and only replaces it
+        # once complete
+        migrated = f"{save_file}.migrating"
+        count = 0
+        with shelve.open(save_file, "r") as old, dbm.open(migrated, "n") as new:
+            for url, completed in old.values():
+                new[get_urlfingerprint(url)] = encode_record(url, completed)
+                count += 1
+        for path in self._save_files():
+            os.remove(path)
+        for path in glob.glob(glob.escape(migrated) + "*"):
+            os.replace(path, save_file + path[len(migrated):])
+        self.logger.info(
+            f"Migrated {count} urls of save file {save_file} to url "
+            f"fingerprints in {time.perf_counter() - start:.3f}s.")
+
+    def _parse_save_file(self):
+        ''' This function can be overridden for alternate saving techniques. '''
+        total_count = len(self.save)
+        tbd_count = 0
+
+        for fingerprint, record in self.save.items():
+            try:
+                url, completed = decode_record(record)
+            except ValueError as e:
+                self.logger.warning(f"Skipping save file record: {e}")
+                continue
+            domain = urlparse(url).netloc
+            shard = self._shard(domain)
+            self.seen.add(fingerprint)
+            shard.discovered += 1
+            hostname = urlparse(url).hostname
+            if hostname and self.check_subdomain(url):
+                shard.subdomains[hostname] += 1
+            if completed:
+                shard.completed += 1
+                continue
+            if not completed and is_valid(url):
+                shard.enqueue(url, domain, self.policy.priority(url, None))
+                tbd_count += 1
+            
+        self.logger.info(
+            f"Found {tbd_count} urls to be downloaded from {total_count} "
+            f"total urls discovered.")
+
+    def get_tbd_url(self):
+        """
+        Get the next URL to be downloaded from the frontier.
+        Returns (url, None) when a domain is ready, (None, next_access_time)
+        when every queued domain is still cooling down, and (None, None)
+        when the frontier is empty.
+        """
+        now = time.time()
+        while True:
+            # find the shard holding the best ready url; only one shard is
+            # locked at a time
+            best, best_shard, next_t = None, None, None
+            for shard in self.shards:
+                if not shard.wait_heap and not shard.ready_heap and not shard.retry_heap:
+                    continue
+                head, shard_next_t = shard.peek_ready(now)
+                if head is not None:
+                    if best is None or head < best:
+                        best, best_shard = head, shard
+                elif shard_next_t is not None and (next_t is None or shard_next_t < next_t):
+                    next_t = shard_next_t
+            if best_shard is None:
+                break
+            url, _ = best_shard.pop_ready(now, self.config.time_delay)
+            if url is not None:
+                return url, None
+            # another thread took it between the peek and the pop
+
+        if next_t is None:
+            self.logger.info("No URLs to download.")
+        else:
+            self.logger.info(f"Waiting for {next_t - now} seconds to download the next URL.")
+        return None, next_t
+
+    def add_url(self, url, parent=None):
+        """
+        Queue url unless it was seen before. parent is the page it was
+        found on, None for a seed; the priority policy ranks the url by
+        its distance from a seed among other things.
+        """
+        start = time.perf_counter()
+        url = normalize(url)
+            
+        # check if the url is valid
+        with metrics.timer("is_valid"):
+            valid = is_valid(url)
+        if not valid:
+            metrics.observe("add_url", time.perf_counter() - start)
+            return
+            
+        # get rid of the fragment and starting here using fragment_clean version urls
+        unfrag_url, _ = urldefrag(url)
+        parsed_unfrag = urlparse(unfrag_url)
+        domain = parsed_unfrag.netloc
+        fingerprint = get_urlfingerprint(unfrag_url)
+        shard = self._shard(domain)
+        # Check which subdomain the URL is belonging to
+        hostname = parsed_unfrag.hostname
+        if not (hostname and self.check_subdomain(unfrag_url)):
+            hostname = None
+        new_subdomain = False
+        # scored outside the lock; the policy may consult the link graph
+        depth = 0 if parent is None else self._child_depth(parent)
+        if self.policy.dynamic:
+            # a url found again keeps its smallest depth; a single dict
+            # read, safe without the lock
+            queued = shard.queued.get(unfrag_url)
+            if queued is not None:
+                depth = min_depth(queued[1], depth)
+        priority = self.policy.priority(unfrag_url, depth)
+        rescored = False
+
+        # make sure only one thread at a time updates this shard
+        with shard.lock:
+            # the bloom filter answers most "not seen" lookups in memory;
+            # only its positives are confirmed against the save file
+            if fingerprint in self.seen and fingerprint in self.save:
+                added = False
+                if self.policy.dynamic:
+                    # found again: still waiting urls may have moved up
+                    rescored = shard.rescore(unfrag_url, domain, priority, depth)
+            else:
+                added = True
+                self.seen.add(fingerprint)
+                self.save[fingerprint] = encode_record(unfrag_url, False)
+                self.resume.append(b"A", unfrag_url)
+
+                shard.enqueue(unfrag_url, domain, priority, depth)
+
+                # discovered means that the url is added to the frontier;
+                # every discovered url is unique
+                shard.discovered += 1
+
+                if hostname:
+                    shard.subdomains[hostname] += 1
+                    new_subdomain = shard.subdomains[hostname] == 1
+
+        if new_subdomain:
+            self.subdomain_index.add(hostname, shard)
+        metrics.observe("add_url", time.perf_counter() - start)
+        metrics.incr("urls_added" if added else "urls_already_seen")
+        if rescored:
+            metrics.incr("urls_rescored")
+        if added:
+            self.logger.info(f"Adding URL to frontier: {unfrag_url}")
+        else:
+            self.logger.info(f"URL already in the frontier or completed: {url}")
+
+    def _child_depth(self, parent):
+        """ Depth of the urls found on parent, None if parent's depth is unknown. """
+        # a single dict read, safe without the parent shard's lock
+        depth = self._shard(urlparse(parent).netloc).in_progress.get(parent)
+        return None if depth is None else depth + 1
+
+    def record_verdict(self, url, verdict):
+        """ Tell the priority policy what became of a processed page (see utils.history.VERDICTS). """
+        self.policy.record(url, verdict)
+
+    def record_fetch(self, url, latency, resp):
+        """
+        Feed a finished download back into its domain's rate control. The
+        domain's next access is pushed to at least its new delay from now.
+        """
+        domain = urlparse(url).netloc
+        shard = self._shard(domain)
+        outcome = classify(resp)
+        now = time.time()
+        with shard.lock:
+            host = shard.hosts.get(domain)
+            if host is None:
+                host = shard.hosts[domain] = HostRate(self.config.time_delay)
+            trips = host.trips
+            delay = host.record(now, latency, outcome, self.config)
+            next_access = max(now + delay, host.paused_until)
+            if next_access > shard.domain_next[domain]:
+                shard.domain_next[domain] = next_access
+        if host.trips > trips:
+            self.logger.warning(
+                f"Pausing {domain} for {host.paused_until - now:.0f}s after "
+                f"{host.failures} failed downloads in a row.")
+        elif outcome in (ERROR, TIMEOUT):
+            self.logger.info(f"Backing off {domain} to {delay:.2f}s after a {outcome}.")
+
+    def retry_url(self, url):
+        """
+        Schedule another download of url after a transient failure, with
+        exponential backoff and jitter: RETRYDELAY * 2^(attempt - 1) seconds,
+        scaled by a random factor in [0.5, 1.5). Returns False once the url
+        has failed MAXRETRIES times; the caller should then give up on it.
+        """
+        shard = self._shard(urlparse(url).netloc)
+        with shard.lock:
+            attempt = shard.attempts.get(url, 0) + 1
+            if attempt > self.config.max_retries:
+                shard.attempts.pop(url, None)
+                return False
+            shard.attempts[url] = attempt
+            delay = self.config.retry_delay * 2 ** (attempt - 1) * (0.5 + random.random())
+            depth = shard.in_progress.pop(url, None)
+            heapq.heappush(shard.retry_heap, (time.time() + delay, url, depth))
+        metrics.incr("download_retries")
+        self.logger.info(f"Retrying {url} in {delay:.1f}s (attempt {attempt + 1}).")
+        return True
+
+    def host_rates(self):
+        """ Delay, request counts, latency and achieved rate of every fetched domain. """
+        rates = dict()
+        for shard in self.shards:
+            with shard.lock:
+                for domain, host in shard.hosts.items():
+                    rates[domain] = host.stats()
+        return rates
+
+    def mark_url_complete(self, url):
+        fingerprint = get_urlfingerprint(url)
+        shard = self._shard(urlparse(url).netloc)
+
+        # make sure only one thread at a time updates this shard
+        with shard.lock:
+            seen = fingerprint in self.seen
+            shard.completed += 1
+            shard.in_progress.pop(url, None)
+            shard.attempts.pop(url, None)
+            self.save[fingerprint] = encode_record(url, True)
+            self.resume.append(b"C", url)
+
+        if not seen:
+            # This should not happen.
+            self.logger.error(
+                f"Completed url {url}, but have not seen it before.")
+        self.logger.info(f"Marking URL as complete: {url}")
+        if not self.tbd_count:
+            self.logger.info("Frontier is empty.")
+
+
+
+    # checking if the url is following the instruction of
+    #*.ics.uci.edu/*
+    #*.cs.uci.edu/*
+    #*.informatics.uci.edu/*
+    #*.stat.uci.edu/*
+    #today.uci.edu/department/information_computer_sciences/*
+    def check_subdomain(self, url):
+        try:
+            parsed_url = urlparse(url)
+            hostname = parsed_url.hostname
+            path = parsed_url.path
+
+            if hostname is None:
+                return False
+
+            assigned_domains = (
+                ".ics.uci.edu",
+                ".cs.uci.edu",
+                ".informatics.uci.edu",
+                ".stat.uci.edu"
+            )
+
+            if any(hostname.endswith(domain) for domain in assigned_domains):
+                return True
+
+            if hostname == ("today.uci.edu") and path.startswith("/department/information_computer_sciences"):
+                return True
+
+            return False
+
+        except Exception as e:
+            self.logger.error(f"Error on {url}: {e}")
+            return False
+
+
+    def get_status(self):
+        """
+        Return a dict of the information of the frontier, summed over the
+        shards without locking them.
+        """
+        return {
+            "total_discovered": self.discovered,
+            "queue_size": self.tbd_count,
+            "completed": self.completed,
+        }
+
+
+
+    # 1.How many unique pages did you find?
+    # Uniqueness for the purposes of this assignment is ONLY established by the URL,
+    # but discarding the fragment part.
+    def print_unique_urls(self):
+        self.logger.info(f"There are total of {self.discovered} unique pages")
+
+
+
+    # 4. How many subdomains did you find in the uci.edu domain?
+    def print_subdomains(self):
+        self.logger.info("The following are the subdomains:")
+        for subdomain, count in self.subdomain_counts():
+            self.logger.info(f"{subdomain}, {count}")
+
+    def sync(self):
+        """ Force every buffered frontier write to disk. """
+        self.save.flush()
+        self.resume.flush()
+
+    def close(self):
+        """ Snapshot the frontier, then flush and close the save file. """
+        self.snapshot()
+        self.resume.close()
+        self.save.close()
+
+    def abandon(self):
+        """
+        Stop the way a killed crawler does: writes not flushed yet are
+        lost and no snapshot is taken. Safe to call after close().
+        """
+        self.resume.abandon()
+        self.save.abandon()
+            
+    def queue_size(self):
+        return self.tbd_count
+
@@ -0,0 +1,286 @@
+import dbm
+import glob
+import os
+import pickle
+import time
+
+from threading import Thread, Lock, Condition
+
+from utils import get_logger
+from utils.metrics import metrics
+
+
+# entries a flush writes per hold of the dbm lock; readers wait at most
+# this many writes for it
+FLUSH_CHUNK = 64
+
+
+class WriteBehindStore(object):
+    """
+    Write-behind wrapper around a dbm file with bytes keys and values.
+
+    Writes land in an in-memory buffer and are committed to the dbm in
+    batches by a background flusher, either when the buffer reaches
+    batch_size entries or every flush_interval seconds, whichever comes
+    first. Reads check the buffer before the dbm, so callers always see
+    their own writes, and never wait on the dbm for an entry still being
+    flushed. A crash loses at most the entries written since the last
+    flush.
+    """
+    def __init__(self, filename, batch_size=500, flush_interval=5.0):
+        self.logger = get_logger("PERSISTENCE", "FRONTIER")
+        self.db = dbm.open(filename, "c")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # pending -> entries written since the last flush started
+        # flushing -> entries currently being committed by the flusher
+        self.pending = {}
+        self.flushing = {}
+        self.buffer_lock = Lock()
+        # db_lock guards single dbm operations; flush_lock lets one flush
+        # (or close) at a time write to the dbm
+        self.db_lock = Lock()
+        self.flush_lock = Lock()
+        self.flush_needed = Condition(self.buffer_lock)
+        self.closed = False
+
+        self.flusher = Thread(
+            target=self._flush_loop, name="StoreFlusher", daemon=True)
+        self.flusher.start()
+
+    def __setitem__(self, key, value):
+        with self.buffer_lock:
+            self.pending[key] = value
+            if len(self.pending) >= self.batch_size:
+                self.flush_needed.notify()
+
+    def __getitem__(self, key):
+        with self.buffer_lock:
+            if key in self.pending:
+                return self.pending[key]
+            if key in self.flushing:
+                return self.flushing[key]
+        with self.db_lock:
+            return self.db[key]
+
+    def __contains__(self, key):
+        with self.buffer_lock:
+            if key in self.pending or key in self.flushing:
+                return True
+        with self.db_lock:
+            return key in self.db
+
+    def __len__(self):
+        self.flush()
+        with self.db_lock:
+            return len(self.db)
+
+    def items(self):
+        """ Flush, then yield every (key, value) pair in the dbm. """
+        self.flush()
+        with self.db_lock:
+            keys = list(self.db.keys())
+        for key in keys:
+            with self.db_lock:
+                value = self.db[key]
+            yield key, value
+
+    def flush(self):
+        """ Synchronously commit every buffered entry to disk. """
+        with self.flush_lock:
+            with self.buffer_lock:
+                if not self.pending or self.db is None:
+                    return
+                self.flushing, self.pending = self.pending, {}
+                batch = list(self.flushing.items())
+            start = time.perf_counter()
+            # the entries stay readable from self.flushing meanwhile, and
+            # readers of other keys only wait for one chunk at a time
+            for i in range(0, len(batch), FLUSH_CHUNK):
+                with self.db_lock:
+                    for key, value in batch[i:i + FLUSH_CHUNK]:
+                        self.db[key] = value
+            # not every dbm backend (e.g. dbm.ndbm) has sync(). It only
+            # writes out what is already in the dbm, so reads may go on
+            # during it; flush_lock keeps writes and close() out.
+            if hasattr(self.db, "sync"):
+                self.db.sync()
+            with self.buffer_lock:
+                self.flushing = {}
+        elapsed = time.perf_counter() - start
+        metrics.observe("save_flush", elapsed)
+        metrics.incr("save_flushed_entries", len(batch))
+        self.logger.info(
+            f"Flushed {len(batch)} frontier entries in {elapsed:.3f}s.")
+
+    def _flush_loop(self):
+        while True:
+            with self.buffer_lock:
+                if len(self.pending) < self.batch_size and not self.closed:
+                    self.flush_needed.wait(self.flush_interval)
+                if self.closed:
+                    return
+            self.flush()
+
+    def close(self):
+        with self.buffer_lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.flush_needed.notify()
+        self.flush()
+        with self.flush_lock, self.db_lock:
+            self.db.close()
+            self.db = None
+
+    def abandon(self):
+        """
+        Stop the way a killed process does: entries not flushed yet are
+        lost. The dbm is closed, so the file can be opened again.
+        """
+        with self.buffer_lock:
+            self.closed = True
+            self.pending = {}
+            self.flush_needed.notify()
+        with self.flush_lock, self.db_lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+class ResumeLog(object):
+    """
+    Snapshot plus append-only event log, so the frontier can resume without
+    scanning the whole save file.
+
+    <base>.snapshot holds the pickled frontier state and the generation it
+    was taken at; <base>.log.<n> holds the "A"(dded) and "C"(ompleted) url
+    events of generation n, one per line. rotate() starts a new generation
+    when a snapshot starts capturing state, and the snapshot logs an
+    "S"(hard copied) mark as it copies each shard, so resuming is: load the
+    snapshot, then replay the logs of that generation and later, skipping
+    a shard's events that come before its mark. Events are buffered and
+    appended every flush_interval seconds.
+    """
+    def __init__(self, base, flush_interval=5.0):
+        self.logger = get_logger("PERSISTENCE", "FRONTIER")
+        self.base = base
+        self.snapshot_path = f"{base}.snapshot"
+        self.flush_interval = flush_interval
+        self.generation = 0
+        self.pending = []
+        self.lock = Lock()
+        self.write_lock = Lock()
+        self.closed = False
+        self.flusher = Thread(
+            target=self._flush_loop, name="ResumeLogFlusher", daemon=True)
+        self.flusher.start()
+
+    def _log_path(self, generation):
+        return f"{self.base}.log.{generation}"
+
+    def _log_generations(self):
+        prefix = f"{self.base}.log."
+        generations = []
+        for path in glob.glob(glob.escape(prefix) + "*"):
+            suffix = path[len(prefix):]
+            if suffix.isdigit():
+                generations.append(int(suffix))
+        return sorted(generations)
+
+    def exists(self):
+        return os.path.exists(self.snapshot_path) or bool(self._log_generations())
+
+    def remove(self):
+        for generation in self._log_generations():
+            os.remove(self._log_path(generation))
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+
+    def load(self):
+        """
+        Return (snapshot state or None, iterator of (generation, kind, url)
+        events to replay on top of it; the url of an "S" mark is the shard
+        number). Appends continue in the newest generation.
+        """
+        state = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+        first = state["generation"] if state else 0
+        generations = [g for g in self._log_generations() if g >= first]
+        self.generation = max(generations + [first])
+        return state, self._events(generations)
+
+    def _events(self, generations):
+        for generation in generations:
+            with open(self._log_path(generation), "rb") as f:
+                for line in f:
+                    # a torn last line from a crash has no newline
+                    if not line.endswith(b"\n"):
+                        break
+                    yield generation, line[:1], line[1:-1].decode("utf-8")
+
+    def append(self, kind, url):
+        """ Buffer one event; kind is b"A" (added) or b"C" (completed). """
+        with self.lock:
+            self.pending.append(kind + url.encode("utf-8") + b"\n")
+
+    def mark_copied(self, shard):
+        """
+        Log that shard number `shard` was copied for the snapshot of the
+        current generation. Call with the shard's lock held: the shard's
+        events before the mark are in the copy, those after it are not.
+        """
+        self.append(b"S", str(shard))
+
+    def _write(self, rotate=False):
+        with self.write_lock:
+            with self.lock:
+                pending, self.pending = self.pending, []
+                generation = self.generation
+                if rotate:
+                    self.generation += 1
+            if pending:
+                with metrics.timer("resume_flush"):
+                    with open(self._log_path(generation), "ab") as f:
+                        f.write(b"".join(pending))
+            return self.generation
+
+    def flush(self):
+        self._write()
+
+    def rotate(self):
+        """
+        Start a new log generation and return it. Call before the state that
+        will go into the next snapshot is captured, so every event of an
+        older generation is in the snapshot.
+        """
+        return self._write(rotate=True)
+
+    def write_snapshot(self, generation, state):
+        """ Atomically replace the snapshot and drop the logs it covers. """
+        state = dict(state, generation=generation)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.snapshot_path)
+        for old in self._log_generations():
+            if old < generation:
+                os.remove(self._log_path(old))
+
+    def _flush_loop(self):
+        while not self.closed:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        self.closed = True
+        self.flush()
+
+    def abandon(self):
+        """ Stop the way a killed process does: events not flushed yet are lost. """
+        self.closed = True
+        with self.lock:
+            self.pending = []
@@ -0,0 +1,142 @@
+import multiprocessing
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from queue import Queue
+from threading import Thread, Semaphore, Lock
+from urllib.parse import urlparse
+
+from utils import get_logger
+from utils.metrics import metrics
+import scraper
+
+
+def _parse_context():
+    """
+    Start method of the parse processes. The pool is created while the
+    crawler's threads (logging, metrics, workers, save flushes) run, and a
+    forked child could inherit a lock one of them holds; a forkserver or
+    spawned child starts from a clean interpreter instead.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def _init_parse_process(near_dup_method):
+    """ Pool initializer: the scraper settings a freshly started process lacks. """
+    scraper.NEAR_DUPLICATE_METHOD = near_dup_method
+
+
+class ParsePipeline(object):
+    """
+    Moves page analysis out of the worker threads and past the GIL.
+
+        fetcher threads --(raw content)--> process pool --(analysis)--> recorder thread
+
+    Workers only download and submit; a ProcessPoolExecutor parses,
+    tokenizes and fingerprints each page with scraper.analyze_content; a
+    single recorder thread folds the results into the global statistics
+    and duplicate indexes, and feeds the links back to the frontier.
+    At most `queue_size` pages are in flight at once; submit() blocks the
+    fetcher when the pipeline is full, which keeps memory bounded.
+    """
+    def __init__(self, config, frontier, history=None, link_graph=None):
+        self.logger = get_logger("PIPELINE")
+        self.config = config
+        self.frontier = frontier
+        # optional utils.history.CrawlHistory that gets a row per page
+        self.history = history
+        # optional utils.linkgraph.LinkGraph that gets every page's links
+        self.link_graph = link_graph
+        self.executor = ProcessPoolExecutor(
+            max_workers=config.parse_processes, mp_context=_parse_context(),
+            initializer=_init_parse_process, initargs=(scraper.NEAR_DUPLICATE_METHOD,))
+        self.slots = Semaphore(config.parse_queue_size)
+        self.results = Queue()
+        self.in_flight = 0
+        self.in_flight_lock = Lock()
+        # set once the pool refused a page, so the fallback is logged once
+        self.pool_failed = False
+        self.recorder = Thread(target=self._record_loop, name="PipelineRecorder", daemon=True)
+        self.recorder.start()
+
+    def submit(self, url, resp, latency=None):
+        """ Queue a downloaded page for analysis. Blocks while the pipeline is full. """
+        self.slots.acquire()
+        with self.in_flight_lock:
+            self.in_flight += 1
+        try:
+            future = self._analyze(url, resp)
+            # the response itself is not kept, only what the history needs
+            fetch = (resp.status, latency, resp.pickled_size)
+            self.results.put((url, fetch, future))
+        except BaseException:
+            # the recorder never sees this page, so it cannot give the slot back
+            with self.in_flight_lock:
+                self.in_flight -= 1
+            self.slots.release()
+            raise
+
+    def _analyze(self, url, resp):
+        """
+        Future of the page's analysis. Once the pool cannot take pages any
+        more (BrokenProcessPool after a parse process died), the page is
+        analyzed in the calling thread instead, so the crawl goes on.
+        """
+        args = (url, resp.url, resp.raw_response.content, scraper.NEAR_DUPLICATE_METHOD)
+        try:
+            return self.executor.submit(scraper.analyze_content, *args)
+        except Exception as e:
+            if not self.pool_failed:
+                self.pool_failed = True
+                self.logger.error(f"Parse pool refused {url} ({e!r}), analyzing pages in the workers.")
+        future = Future()
+        try:
+            future.set_result(scraper.analyze_content(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def busy(self):
+        """ True while submitted pages have not been recorded yet. """
+        with self.in_flight_lock:
+            return self.in_flight > 0
+
+    def _record_loop(self):
+        while True:
+            url, fetch, future = self.results.get()
+            if url is None:
+                break
+            row = {"verdict": "failed", "word_count": 0, "outlinks": 0}
+            try:
+                analysis = future.result()
+                if analysis is None:
+                    row["verdict"] = "low_information"
+                    self.logger.info(f"Skipping {url} because content is of low information.")
+                else:
+                    scraped_urls = scraper.record_page(url, analysis)
+                    row["verdict"] = analysis.get("verdict", "scraped")
+                    row["word_count"] = analysis["word_count"]
+                    row["outlinks"] = len(analysis.get("links", ()))
+                    # links go into the graph first, so the frontier sees their in-links
+                    if self.link_graph is not None and analysis.get("links"):
+                        self.link_graph.add_page(url, analysis["links"])
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(scraped_url, parent=url)
+                    metrics.incr("pages_scraped")
+            except Exception as e:
+                self.logger.error(f"Failed to analyze {url}: {e}")
+            self.frontier.record_verdict(url, row["verdict"])
+            if self.history is not None:
+                status, latency, size = fetch
+                self.history.append(
+                    url, urlparse(url).hostname, status, latency, size, verdict=row["verdict"],
+                    word_count=row["word_count"], outlinks=row["outlinks"])
+            self.frontier.mark_url_complete(url)
+            with self.in_flight_lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    def shutdown(self):
+        """ Record every page still in flight, then stop the pool. """
+        self.results.put((None, None, None))
+        self.recorder.join()
+        self.executor.shutdown()
@@ -0,0 +1,121 @@
+import math
+
+# fetch outcomes, see classify()
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+REFUSED = "refused"
+
+# cache server statuses that may succeed on a retry: 601 (the download from
+# the host failed) and 602 (the cache server itself failed). The other 6xx
+# codes are refusals that never change: bad scheme, domain out of spec, file
+# extension, unparsable url, content too big, denied by robots.txt, ...
+TRANSIENT_CACHE_STATUSES = frozenset((601, 602))
+
+# weight of the newest sample in the latency and interval averages
+EWMA_WEIGHT = 0.3
+
+
+def classify(resp):
+    """
+    Outcome of a fetch as far as the host's load is concerned: no answer
+    at all (timeout or connection failure), an overload / server error
+    (429, 5xx, and the cache server's transient 6xx failures), a refusal
+    by the cache server that no retry will change (the other 6xx codes),
+    or anything else.
+    """
+    if resp is None or resp.status is None:
+        return TIMEOUT
+    if resp.status >= 600:
+        return ERROR if resp.status in TRANSIENT_CACHE_STATUSES else REFUSED
+    if resp.status == 429 or resp.status >= 500:
+        return ERROR
+    return OK
+
+
+class HostRate(object):
+    """
+    Adaptive crawl delay of one host.
+
+    The delay never drops below config.time_delay (POLITENESS) or rises
+    above config.max_time_delay (MAXPOLITENESS). Timeouts and errors
+    double it; successful fetches bring it back down towards
+    config.latency_factor times the host's average latency, so a slow
+    host is asked less often than a fast one. The achieved request rate
+    is tracked from the interval between fetches.
+
+    It is also the host's circuit breaker: after config.breaker_failures
+    timeouts or errors in a row the host is paused (paused_until) for
+    config.breaker_cooldown seconds, doubled each time the first fetch
+    after a pause fails again. One success closes the breaker.
+    """
+    __slots__ = ("delay", "latency", "interval", "last", "requests", "errors", "timeouts",
+                 "failures", "trips", "paused_until")
+
+    def __init__(self, base_delay):
+        self.delay = base_delay
+        self.latency = None
+        self.interval = None
+        self.last = None
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.trips = 0
+        self.paused_until = 0.0
+
+    def record(self, now, latency, outcome, config):
+        """ Fold one finished fetch into the host's state; returns the new delay. """
+        self.requests += 1
+        if outcome == REFUSED:
+            # the cache server answered without asking the host: nothing
+            # is learned about its load, and the breaker is left alone
+            return self.delay
+        if self.last is not None:
+            self.interval = _ewma(self.interval, now - self.last)
+        self.last = now
+        self.latency = _ewma(self.latency, latency)
+
+        if outcome == OK:
+            target = max(config.time_delay, config.latency_factor * self.latency)
+            # back off fast, recover gradually
+            self.delay = max(target, self.delay * 0.75)
+            self.failures = 0
+            self.trips = 0
+        else:
+            if outcome == TIMEOUT:
+                self.timeouts += 1
+            else:
+                self.errors += 1
+            self.delay = max(config.time_delay, self.delay * 2, latency)
+            self.failures += 1
+            # once tripped, the failure count stays above the threshold, so
+            # the first fetch after the pause trips it again if it fails
+            if self.failures >= config.breaker_failures and now >= self.paused_until:
+                self.paused_until = now + config.breaker_cooldown * 2 ** self.trips
+                self.trips += 1
+        self.delay = min(self.delay, config.max_time_delay)
+        return self.delay
+
+    def rate(self):
+        """ Achieved requests per second, from the recent fetch intervals. """
+        if not self.interval:
+            return 0.0
+        return 1.0 / self.interval
+
+    def stats(self):
+        return {
+            "delay": self.delay,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency": self.latency if self.latency is not None else math.nan,
+            "rate": self.rate(),
+            "paused_until": self.paused_until,
+        }
+
+
+def _ewma(average, sample):
+    if average is None:
+        return sample
+    return average + EWMA_WEIGHT * (sample - average)
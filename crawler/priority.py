@@ -0,0 +1,134 @@
+import importlib
+import re
+
+from threading import Lock
+from urllib.parse import urlparse
+
+# priority of urls put back after a failed download; they go first
+RETRY_PRIORITY = float("-inf")
+
+# verdicts of processed pages that added nothing to the crawl; see
+# utils.history.VERDICTS. Retries are not counted either way.
+WASTED_VERDICTS = frozenset(
+    ("exact_duplicate", "near_duplicate", "low_information", "skipped", "failed"))
+
+
+class PriorityPolicy(object):
+    """
+    Decides which urls leave the frontier first. Lower priorities are
+    downloaded first, equal ones in the order they were queued. Per-host
+    politeness is unaffected: the frontier only ranks the hosts that may
+    be accessed now, each by its best url.
+
+        priority(url, depth) -> priority of url when it is queued; depth is
+                                its distance in links from a seed, None if
+                                unknown (e.g. queued before a resume)
+        host_priority(domain) -> added to the priority of a host's best url
+                                each time the host becomes ready
+        record(url, verdict)  -> verdict of every processed page
+        dynamic               -> whether priority() of a waiting url can drop
+                                as the crawl goes on; if so, the frontier
+                                scores a url again each time it is found
+
+    The methods are called from many threads, with no frontier lock held
+    except around host_priority().
+    """
+    dynamic = False
+
+    def __init__(self, config, link_graph=None):
+        self.config = config
+        self.link_graph = link_graph
+
+    def priority(self, url, depth):
+        return 0.0
+
+    def host_priority(self, domain):
+        return 0.0
+
+    def record(self, url, verdict):
+        pass
+
+
+class FifoPolicy(PriorityPolicy):
+    """ Every url is equal: each host's urls go in discovery order. """
+
+
+class BestFirstPolicy(PriorityPolicy):
+    """
+    Ranks urls by how likely their download is to give a new page with
+    content on it:
+
+        DEPTH_WEIGHT * links from a seed
+      + PATH_WEIGHT * path segments
+      + weights of the URL_PATTERNS the url matches
+      - INLINK_WEIGHT * bit length of its in-link count in the link graph
+
+    and hosts by WASTE_WEIGHT times the share of their processed pages that
+    were duplicates, low-information, skipped or failed. The in-link term
+    changes only when the count doubles, so a url is moved up at most a
+    few times however often it is found again. Subclass and change the
+    weights to tune it.
+    """
+    dynamic = True
+
+    DEPTH_WEIGHT = 1.0
+    PATH_WEIGHT = 0.25
+    INLINK_WEIGHT = 0.5
+    WASTE_WEIGHT = 4.0
+    # depth assumed when the url's parent is unknown
+    UNKNOWN_DEPTH = 3
+    # a host's waste share counts this many useful pages it has not served yet
+    WASTE_PRIOR = 5
+    URL_PATTERNS = (
+        (re.compile(r"\?"), 1.0),                                       # any query
+        (re.compile(r"[?&;](page|p|start|offset|sort|order|filter)=", re.I), 1.0),
+        (re.compile(r"/\d{4}[-/]\d{1,2}([-/]\d{1,2})?(/|$)"), 2.0),     # dated archives
+        (re.compile(r"(calendar|events?/|ical|share=|replytocom|login|action=)", re.I), 2.0),
+    )
+
+    def __init__(self, config, link_graph=None):
+        super().__init__(config, link_graph)
+        self.lock = Lock()
+        # domain -> [processed pages, wasted pages]
+        self.hosts = dict()
+
+    def priority(self, url, depth):
+        parsed = urlparse(url)
+        score = self.DEPTH_WEIGHT * (self.UNKNOWN_DEPTH if depth is None else depth)
+        score += self.PATH_WEIGHT * parsed.path.strip("/").count("/")
+        for pattern, weight in self.URL_PATTERNS:
+            if pattern.search(url):
+                score += weight
+        if self.link_graph is not None:
+            score -= self.INLINK_WEIGHT * self.link_graph.in_link_count(url).bit_length()
+        return score
+
+    def host_priority(self, domain):
+        pages, wasted = self.hosts.get(domain, (0, 0))
+        return self.WASTE_WEIGHT * wasted / (pages + self.WASTE_PRIOR)
+
+    def record(self, url, verdict):
+        if verdict == "retry":
+            return
+        domain = urlparse(url).netloc
+        with self.lock:
+            counts = self.hosts.get(domain)
+            if counts is None:
+                counts = self.hosts[domain] = [0, 0]
+            counts[0] += 1
+            if verdict in WASTED_VERDICTS:
+                counts[1] += 1
+
+
+POLICIES = {"fifo": FifoPolicy, "bestfirst": BestFirstPolicy}
+
+
+def make_policy(name, config, link_graph=None):
+    """ The policy called name in POLICIES, or the class at the dotted path name. """
+    policy = POLICIES.get(name.lower())
+    if policy is None:
+        module, _, cls = name.rpartition(".")
+        if not module:
+            raise ValueError(f"Unknown priority policy {name!r}.")
+        policy = getattr(importlib.import_module(module), cls)
+    return policy(config, link_graph)
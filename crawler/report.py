@@ -0,0 +1,94 @@
+import bisect
+import os
+
+from pathlib import Path
+from threading import Lock
+
+
+class SubdomainIndex(object):
+    """
+    Alphabetical index of the subdomains counted by the frontier shards.
+
+    The counts stay in the shards, where add_url updates them under the
+    shard lock. The index only records, once per subdomain, which shards
+    count it, so the report lists every subdomain with its count in one
+    ordered pass, without merging counters or sorting.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.names = []
+        # subdomain -> shards counting it; a hostname seen with and without
+        # a port can live in two shards
+        self.shards = dict()
+
+    def add(self, name, shard):
+        """ Record that shard counts name. Cheap if it already does. """
+        with self.lock:
+            shards = self.shards.get(name)
+            if shards is None:
+                bisect.insort(self.names, name)
+                self.shards[name] = (shard,)
+            elif shard not in shards:
+                self.shards[name] = shards + (shard,)
+
+    def counts(self):
+        """ (subdomain, discovered urls) pairs in alphabetical order. """
+        with self.lock:
+            entries = [(name, self.shards[name]) for name in self.names]
+        # read without the shard locks, like the other frontier aggregates
+        for name, shards in entries:
+            yield name, sum(shard.subdomains[name] for shard in shards)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class CrawlReport(object):
+    """
+    Writes crawl_stats.txt from state that is kept up to date as the crawl
+    runs: the frontier's counters and SubdomainIndex and the top words
+    summary of scraper.word_stats. A write costs time proportional to the
+    report itself, takes no frontier lock, and is skipped when nothing was
+    discovered or completed since the last one. The file is replaced
+    atomically, so readers never see half a report.
+    """
+    def __init__(self, frontier, word_stats, path="crawl_stats.txt", top_words=50):
+        self.frontier = frontier
+        self.word_stats = word_stats
+        self.path = Path(path)
+        self.top_words = top_words
+        self.version = None
+        self.lock = Lock()
+
+    def lines(self):
+        self.word_stats.flush()
+        longest_url, max_words = self.word_stats.longest_page
+
+        yield f"UNIQUE URLS (count): {self.frontier.discovered}\n"
+        yield "SUBDOMAINS (alphabetical)\n"
+        for sd, count in self.frontier.subdomain_counts():
+            yield f"{sd}, {count}"
+        yield ""
+        yield "LONGEST PAGE:"
+        if longest_url:
+            yield f"URL : {longest_url}"
+            yield f"Word Count : {max_words}"
+        else:
+            yield "N/A"
+        yield ""
+        yield f"TOP-{self.top_words} WORDS:"
+        for w, f in self.word_stats.top(self.top_words):
+            yield f"{w:} {f}"
+        yield ""
+
+    def write(self, force=False):
+        """ Rewrite the report if the crawl moved on; returns whether it did. """
+        with self.lock:
+            version = (self.frontier.discovered, self.frontier.completed)
+            if version == self.version and not force:
+                return False
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text("\n".join(self.lines()), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+            self.version = version
+            return True
@@ -2,20 +2,28 @@ from threading import Thread
 
 from inspect import getsource
 from urllib.parse import urlparse
-from utils.download import download
+from utils.download import download, get_connection_stats, max_body_size
 from utils import get_logger
+from utils.metrics import metrics
+from crawler.politeness import classify, ERROR, TIMEOUT
 import scraper
 import time
 import threading
-from scraper import max_words_page, global_word_counter
 
 
 class Worker(Thread):
-    def __init__(self, worker_id, config, frontier):
+    def __init__(self, worker_id, config, frontier, pipeline=None, history=None, link_graph=None):
         self.worker_id = worker_id
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
+        # optional crawler.pipeline.ParsePipeline; when set, pages are
+        # analyzed in a process pool instead of on this thread
+        self.pipeline = pipeline
+        # optional utils.history.CrawlHistory that gets a row per page
+        self.history = history
+        # optional utils.linkgraph.LinkGraph that gets every page's links
+        self.link_graph = link_graph
         
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
@@ -24,9 +32,7 @@ class Worker(Thread):
         
     def run(self):
         # self.logger.info("Worker started") 
-        retry_delay = 5  # todo: make this configurable
-        max_file_size = 10 * 1024 * 1024  # 10 MB, todo: make this configurable
-        min_file_size = 100  # todo: make this configurable
+        retry_delay = self.config.retry_delay
         pages_crawled = 0
         while True:
             tbd_url, next_access_time = self.frontier.get_tbd_url()
@@ -47,6 +53,11 @@ class Worker(Thread):
                     tbd_url, next_access_time = self.frontier.get_tbd_url()
                     
             if not tbd_url and not next_access_time: # If wait for 3 times and still no url, exit
+                if self.pipeline is not None and self.pipeline.busy():
+                    # pages still being analyzed can add more urls
+                    self.logger.info("Waiting for the parse pipeline to drain.")
+                    time.sleep(retry_delay)
+                    continue
                 self.logger.info("No URLs to download. Exiting.")
                 break # while loop will exit
             
@@ -58,11 +69,12 @@ class Worker(Thread):
                 if not tbd_url and not next_access_time:
                     self.logger.info("No URLs to download. Exiting.")
                     break
+            if not tbd_url:
+                break
                         
             if not scraper.is_valid(tbd_url):
                 self.logger.info(f"Skipping invalid URL {tbd_url}. Marking as complete.")
                 self.frontier.mark_url_complete(tbd_url)
-                self.frontier.sync()
                 continue
 
             # if not scraper.to_crawl(tbd_url):
@@ -75,65 +87,136 @@ class Worker(Thread):
             start = time.perf_counter()
             resp = download(tbd_url, self.config, self.logger)
             latency = time.perf_counter() - start
+            metrics.observe("download", latency)
             self.logger.info(f"Latency {latency:.3f}s | {tbd_url} | status {resp.status}")
-            
-            # Check if the response is valid
-            if resp is None:
-                self.logger.warning(f"Failed to download {tbd_url}. Skipping.")
-                self.frontier.mark_url_complete(tbd_url)
-                self.frontier.sync()
-                continue
-            # Check if response.raw_response is valid
-            if resp.raw_response is None:
-                self.logger.warning(f"Raw response is None for {tbd_url}. Skipping.")
-                self.frontier.sync()
-                self.frontier.mark_url_complete(tbd_url)
-                continue
-            # Skip 404
-            if not (200 <= resp.status < 300):
-                self.logger.warning(f"Skipping {tbd_url} due to HTTP status {resp.status}.")
-                self.frontier.mark_url_complete(tbd_url)
-                self.frontier.sync()
-                continue
-            if resp.status == None:
-                self.logger.warning(f"Skipping {tbd_url} due to timeout.")
-                self.frontier.mark_url_complete(tbd_url)
-                self.frontier.sync()
-                continue
-            # Check if the content length is too large
-            content_length = resp.raw_response.headers.get("Content-Length")
-            if content_length and int(content_length) > max_file_size:
-                self.logger.info(f"Skipping {tbd_url} due to large file size ({content_length} bytes).")
-                self.frontier.mark_url_complete(tbd_url)
-                continue
+            # the frontier spaces out requests per host, so the next url,
+            # usually from another host, is fetched right away
+            self.frontier.record_fetch(tbd_url, latency, resp)
 
-            # Check if the response content is too small
-            if len(resp.raw_response.content) < min_file_size:
-                self.logger.info(f"Skipping {tbd_url} because content is too small ({len(resp.raw_response.content)} bytes).")
-                self.frontier.mark_url_complete(tbd_url)
-                self.frontier.sync()
-                continue
+            if self.handle_response(tbd_url, resp, latency):
+                pages_crawled += 1
+
+    def connection_stats(self):
+        """ Request / new connection / reused connection counts to the cache server. """
+        return get_connection_stats(self.config)
 
-            # Check if the response content is of low information
-            if scraper.is_low_information(scraper.extract_visible_text(resp)):
-                self.logger.info(f"Skipping {tbd_url} because content is of low information.")
+    def handle_response(self, tbd_url, resp, latency=None):
+        """
+        Check a downloaded response, scrape it and feed the links back to the
+        frontier. Returns True when the page was scraped (or handed to the
+        parse pipeline), False when it was skipped. Either way the page's
+        outcome is added to the crawl history.
+        """
+        # what became of the page; the checks below fill it in
+        row = {"verdict": "skipped", "word_count": 0, "outlinks": 0}
+        try:
+            return self._check_and_scrape(tbd_url, resp, latency, row)
+        finally:
+            # pages handed to the pipeline are recorded once analyzed
+            if row["verdict"] is not None:
+                self.frontier.record_verdict(tbd_url, row["verdict"])
+                if self.history is not None:
+                    self.history.record(tbd_url, resp, latency, **row)
+
+    def _check_and_scrape(self, tbd_url, resp, latency, row):
+        # Timeouts, connection failures and server errors are transient:
+        # the frontier schedules another download instead of losing the page.
+        # Refusals by the cache server are skipped below like any non-2xx.
+        outcome = classify(resp)
+        metrics.incr(f"downloads_{outcome}")
+        if outcome in (ERROR, TIMEOUT):
+            status = resp.status if resp is not None else None
+            # in replay mode a missing page will not show up on a retry
+            if not self.config.replay and self.frontier.retry_url(tbd_url):
+                row["verdict"] = "retry"
+                self.logger.warning(
+                    f"Download of {tbd_url} failed ({outcome}, status {status}), retrying later.")
+            else:
+                row["verdict"] = "failed"
+                self.logger.warning(
+                    f"Skipping {tbd_url} after a {outcome} (status {status}).")
                 self.frontier.mark_url_complete(tbd_url)
-                self.frontier.sync()
-                continue
+            return False
+        # Skip 404, and bodies the download refused for their size
+        if not (200 <= resp.status < 300):
+            self.logger.warning(f"Skipping {tbd_url} due to HTTP status {resp.status}.")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+        # Check the size of the still pickled response before unpickling it.
+        # The pickle holds the page plus some overhead, so one smaller than
+        # MINFILESIZE cannot hold a big enough page either.
+        if resp.payload_size > max_body_size(self.config):
+            self.logger.info(f"Skipping {tbd_url} due to large response size ({resp.payload_size} bytes).")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+        if 0 < resp.payload_size < self.config.min_file_size:
+            self.logger.info(f"Skipping {tbd_url} because content is too small ({resp.payload_size} bytes).")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+        # The headers below live in the pickled response, so from here on it
+        # is unpickled; that costs about one copy of the body, less than
+        # scanning the pickle for a header would.
+        if resp.raw_response is None:
+            self.logger.warning(f"Raw response is None for {tbd_url}. Skipping.")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+        # Skip content types that are not parsed, before parsing the body
+        content_type = resp.raw_response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if self.config.content_types and content_type and content_type not in self.config.content_types:
+            self.logger.info(f"Skipping {tbd_url} due to content type {content_type}.")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+        # Check if the content length is too large
+        content_length = resp.raw_response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > self.config.max_file_size:
+            self.logger.info(f"Skipping {tbd_url} due to large file size ({content_length} bytes).")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+        if len(resp.raw_response.content) > self.config.max_file_size:
+            self.logger.info(f"Skipping {tbd_url} due to large file size ({len(resp.raw_response.content)} bytes).")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
+
+        # Check if the page itself is too small
+        if len(resp.raw_response.content) < self.config.min_file_size:
+            self.logger.info(f"Skipping {tbd_url} because content is too small ({len(resp.raw_response.content)} bytes).")
+            self.frontier.mark_url_complete(tbd_url)
+            return False
 
+        if self.pipeline is not None:
+            # the pipeline analyzes, records and marks the url complete
             self.logger.info(
                 f"Downloaded {tbd_url}, status <{resp.status}>, "
                 f"using cache {self.config.cache_server}.")
-            
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
+            row["verdict"] = None
+            self.pipeline.submit(tbd_url, resp, latency)
+            return True
+
+        # Parse the page once; every stage below shares this object
+        page = scraper.ParsedPage.from_response(resp)
+
+        # Check if the response content is of low information
+        if scraper.is_low_information(page):
+            row["verdict"] = "low_information"
+            row["word_count"] = page.tokens.word_count
+            self.logger.info(f"Skipping {tbd_url} because content is of low information.")
             self.frontier.mark_url_complete(tbd_url)
-            pages_crawled += 1
-            if pages_crawled % 10 == 0:
-                self.logger.info("Auto-saving frontier state...")
-                self.frontier.sync()
+            return False
 
-            # sleep for the crawl delay before the next request
-            time.sleep(self.config.time_delay)
+        self.logger.info(
+            f"Downloaded {tbd_url}, status <{resp.status}>, "
+            f"using cache {self.config.cache_server}.")
+        
+        scraped_urls = scraper.scraper(tbd_url, resp, page)
+        if page.analysis is not None:
+            row["verdict"] = page.analysis.get("verdict", "scraped")
+            row["word_count"] = page.analysis["word_count"]
+            row["outlinks"] = len(page.analysis.get("links", ()))
+            if self.link_graph is not None and page.analysis.get("links"):
+                self.link_graph.add_page(tbd_url, page.analysis["links"])
+        for scraped_url in scraped_urls:
+            self.frontier.add_url(scraped_url, parent=tbd_url)
+        self.frontier.mark_url_complete(tbd_url)
+        metrics.incr("pages_scraped")
+        return True
 
@@ -5,7 +5,7 @@ from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
 import atexit
-from scraper import save_dup_state, load_dup_state, save_state_file, load_state_file, max_words_page, global_word_counter
+from scraper import save_dup_state, load_dup_state, save_state_file, load_state_file
 
 def main(config_file, restart):
     # print("[Launch] Starting crawler...")
@@ -13,12 +13,15 @@ def main(config_file, restart):
     cparser.read(config_file)
     config = Config(cparser)
     # print("[Launch] Getting cache server...") 
-    config.cache_server = get_cache_server(config, restart)
+    if not config.replay:
+        # replay mode reads every response from the local cache
+        config.cache_server = get_cache_server(config, restart)
     # print("[Launch] Initializing crawler...")
     crawler = Crawler(config, restart)
     # print("[Launch] Starting crawler execution.")
     atexit.register(save_dup_state)
-    atexit.register(lambda: save_state_file(crawler.frontier))
+    atexit.register(save_state_file)
+    atexit.register(crawler.frontier.close)
     crawler.start()
 
 
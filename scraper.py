@@ -1,107 +1,233 @@
 import re
 import hashlib
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString
 from collections import Counter
 import threading
 import atexit
+from functools import cached_property, lru_cache
+import inspect
 import pickle
 import os
+import time
+import zlib
 
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
+from utils.minhash import MinHasher, LSHIndex
+from utils.fingerprints import FingerprintStore
+from utils.wordstats import WordStats
+from utils.metrics import metrics
 
 # Duplicate detection
+SHINGLE_SIZE = 5
+NEAR_DUPLICATE_THRESHOLD = 0.6
+# "minhash" estimates similarity from MinHash signatures found through an
+# LSH index; "jaccard" compares full shingle sets against every stored page.
+NEAR_DUPLICATE_METHOD = "minhash"
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32
+
+# seen_hashes holds 64-bit content fingerprints; seen_shingles maps urls to
+# shingle hash sets and is only used by the jaccard fallback.
 seen_hashes = set()
 seen_shingles = dict()
-global_word_counter = Counter()
-max_words_page = ("", 0)
+minhasher = MinHasher(MINHASH_PERMUTATIONS)
+seen_signatures = LSHIndex(MINHASH_PERMUTATIONS, LSH_BANDS)
 seen_shingles_lock = threading.Lock()
 
-# Duplicate load and save
-EXACT_DUP_FILE = 'seen_hashes.pkl'
-NEAR_DUP_FILE = 'seen_shingles.pkl'
+# Word statistics
+# Counts are batched per thread, the top words are tracked by a Space-Saving
+# summary of TOP_WORDS_CAPACITY words, and the full vocabulary is spilled to
+# WORD_COUNTS_FILE once more than VOCABULARY_MEMORY_WORDS words are in memory.
+WORD_COUNTS_FILE = "word_counts"
+TOP_WORDS_CAPACITY = 2000
+VOCABULARY_MEMORY_WORDS = 200_000
+word_stats = WordStats(
+    WORD_COUNTS_FILE, top_capacity=TOP_WORDS_CAPACITY,
+    memory_words=VOCABULARY_MEMORY_WORDS)
 
-def load_dup_state(filepath, default):
+# Duplicate load and save
+# Every file is an append-only array of fixed-width records:
+#   EXACT_DUP_FILE       -> one content hash per page
+#   NEAR_DUP_FILE        -> one MinHash signature per page, urls in ".keys"
+#   NEAR_DUP_BANDS_FILE  -> the LSH band keys of each signature
+#   SHINGLE_FILE         -> the jaccard shingle hashes of every page
+#   SHINGLE_PAGES_FILE   -> how many of them belong to each page, urls in ".keys"
+EXACT_DUP_FILE = 'seen_hashes.bin'
+NEAR_DUP_FILE = 'seen_signatures.bin'
+NEAR_DUP_BANDS_FILE = 'seen_signatures.bands'
+SHINGLE_FILE = 'seen_shingles.bin'
+SHINGLE_PAGES_FILE = 'seen_shingles.pages'
+exact_dup_store = FingerprintStore(EXACT_DUP_FILE, 'Q')
+near_dup_store = FingerprintStore(NEAR_DUP_FILE, 'I', MINHASH_PERMUTATIONS, with_keys=True)
+near_dup_band_store = FingerprintStore(NEAR_DUP_BANDS_FILE, 'q', LSH_BANDS)
+shingle_store = FingerprintStore(SHINGLE_FILE, 'I')
+shingle_page_store = FingerprintStore(SHINGLE_PAGES_FILE, 'I', with_keys=True)
+# pickled state of crawls from before the fingerprint files, migrated once
+PICKLED_EXACT_DUP_FILE = 'seen_hashes.pkl'
+PICKLED_NEAR_DUP_FILE = 'seen_shingles.pkl'
+
+def load_dup_state():
     """
-    Load the state of the crawler from a file.
+    Load the state of the crawler from the fingerprint files.
     The state includes:
         • seen_hashes
+        • seen_signatures
         • seen_shingles
     """
-    if os.path.exists(filepath):
-        with open(filepath, 'rb') as f:
-            return pickle.load(f)
-    return default
+    global seen_hashes
+    global seen_signatures
+    global seen_shingles
+
+    migrate_pickled_dup_state()
+    hashes, _ = exact_dup_store.load()
+    seen_hashes = set(hashes)
+    seen_signatures = load_signatures()
+    seen_shingles = load_shingles()
+    print(f"[INFO] Loaded {len(seen_hashes)} page hashes, {len(seen_signatures)} signatures "
+          f"and {len(seen_shingles)} shingle sets.")
+
+def load_signatures():
+    signatures, urls = near_dup_store.load()
+    stored, _ = near_dup_band_store.load()
+    # the band keys are saved after the signatures, so they can be ahead
+    if len(stored) > len(urls) * LSH_BANDS:
+        near_dup_band_store.truncate(len(urls))
+        del stored[len(urls) * LSH_BANDS:]
+    index = LSHIndex(MINHASH_PERMUTATIONS, LSH_BANDS)
+    band_keys = index.load(signatures, urls, stored)
+    if band_keys[:len(stored)] != stored:
+        near_dup_band_store.remove()
+        near_dup_band_store.append(band_keys)
+    else:
+        near_dup_band_store.append(band_keys[len(stored):])
+    near_dup_band_store.flush()
+    return index
+
+def load_shingles():
+    counts, urls = shingle_page_store.load()
+    hashes, _ = shingle_store.load()
+    # a crash between the two appends can leave either file ahead: keep the
+    # pages whose shingles are all on disk
+    shingles = dict()
+    pages = offset = 0
+    for count, url in zip(counts, urls):
+        if offset + count > len(hashes):
+            break
+        shingles[url] = set(hashes[offset:offset + count])
+        pages += 1
+        offset += count
+    shingle_page_store.truncate(pages)
+    shingle_store.truncate(offset)
+    return shingles
+
+def migrate_pickled_dup_state():
+    """
+    Convert the pickled duplicate state of an older crawl into the
+    fingerprint files, once: each pickle is removed after its content is
+    on disk, and is left alone if the file replacing it already exists.
+    """
+    if os.path.exists(PICKLED_EXACT_DUP_FILE) and not os.path.exists(EXACT_DUP_FILE):
+        with open(PICKLED_EXACT_DUP_FILE, 'rb') as f:
+            old_hashes = pickle.load(f)
+        # sha1 hex digests; get_hash keeps their first 64 bits
+        exact_dup_store.append([int(text_hash[:16], 16) for text_hash in old_hashes])
+        exact_dup_store.flush()
+        os.remove(PICKLED_EXACT_DUP_FILE)
+        print(f"[INFO] Migrated {len(old_hashes)} page hashes from {PICKLED_EXACT_DUP_FILE}.")
+
+    if (os.path.exists(PICKLED_NEAR_DUP_FILE) and not os.path.exists(NEAR_DUP_FILE)
+            and not os.path.exists(SHINGLE_PAGES_FILE)):
+        with open(PICKLED_NEAR_DUP_FILE, 'rb') as f:
+            old_shingles = pickle.load(f)
+        print(f"[INFO] Migrating {len(old_shingles)} shingle sets from {PICKLED_NEAR_DUP_FILE}...")
+        for url, shingles in old_shingles.items():
+            # the old shingles were k words split on whitespace; tokenizing
+            # them again gives the new shingles of plain text
+            hashes = set().union(*map(get_shingles, shingles))
+            shingle_store.append(hashes)
+            shingle_page_store.append((len(hashes),), url)
+            signature = minhasher.signature_from_hashes(hashes)
+            if signature is not None:
+                near_dup_store.append(signature, url)
+        # signatures first: their band keys are computed on load
+        near_dup_store.flush()
+        shingle_store.flush()
+        shingle_page_store.flush()
+        os.remove(PICKLED_NEAR_DUP_FILE)
+        print(f"[INFO] Migrated {len(old_shingles)} shingle sets from {PICKLED_NEAR_DUP_FILE}.")
 
 def save_dup_state():
     """
-    Save the state of the crawler to a file.
+    Append the fingerprints recorded since the last save to disk.
     The state includes:
         • seen_hashes
+        • seen_signatures
         • seen_shingles
     """
-    with open(EXACT_DUP_FILE, 'wb') as f:
-        pickle.dump(seen_hashes, f)
-    with open(NEAR_DUP_FILE, 'wb') as f:
-        pickle.dump(seen_shingles, f)
+    exact_dup_store.flush()
+    # records before their companions, which load_dup_state trims to match
+    near_dup_store.flush()
+    near_dup_band_store.flush()
+    shingle_store.flush()
+    shingle_page_store.flush()
     print("[INFO] Saved exact and near duplicate states.")
 
+def remove_dup_state():
+    for store in (exact_dup_store, near_dup_store, near_dup_band_store,
+                  shingle_store, shingle_page_store):
+        store.remove()
+    for path in (PICKLED_EXACT_DUP_FILE, PICKLED_NEAR_DUP_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
 # Store state file
 STATE_FILE = "crawl_stats.pkl"
 
-def save_state_file(frontier):
+def save_state_file():
     """
     Save the state of the crawler from a file.
     The state includes:
-        • max_words_page
-        • global_word_counter
-        • frontier.unique_urls
-        • frontier.subdomains
+        • the longest page
+        • the top words summary
+    The full vocabulary is spilled to WORD_COUNTS_FILE first, and the
+    frontier (including subdomain counts) resumes from its own snapshot.
     """
-    state = {
-        "max_words_page":      max_words_page,
-        "global_word_counter": dict(global_word_counter),
-        "unique_urls":         list(frontier.unique_urls),
-        "subdomains": {
-            sd: list(urls) for sd, urls in frontier.subdomains.items()
-        }
-    }
+    word_stats.spill()
+    state = {"word_stats": word_stats.state()}
     with open(STATE_FILE, "wb") as f:
         pickle.dump(state, f)
     print("[INFO] State saved to", STATE_FILE)
 
 
-def load_state_file(frontier):
+def load_state_file():
     """
     Load the state of the crawler from a file.
     The state includes:
-        • max_words_page
-        • global_word_counter
-        • frontier.unique_urls
-        • frontier.subdomains
+        • the longest page
+        • the top words summary
     """
-    global max_words_page
-    global global_word_counter
-
     if not os.path.exists(STATE_FILE):
         return
 
     with open(STATE_FILE, "rb") as f:
         state = pickle.load(f)
 
-    max_words_page = state.get("max_words_page", ("", 0)) 
-
-    global_word_counter.clear()
-    global_word_counter.update(state["global_word_counter"])
-
-    frontier.unique_urls = set(state["unique_urls"])
-
-    frontier.subdomains = defaultdict(
-        set, {sd: set(urls) for sd, urls in state["subdomains"].items()}
-    )
+    if "word_stats" in state:
+        word_stats.load_state(state["word_stats"])
+    else:
+        # state file from before word_stats: one full Counter
+        url, word_count = state.get("max_words_page", ("", 0))
+        word_stats.record(url, state.get("global_word_counter", {}), word_count)
+        word_stats.flush()
 
     print("[INFO] State loaded from", STATE_FILE)
 
+def remove_state_file():
+    if os.path.exists(STATE_FILE):
+        os.remove(STATE_FILE)
+    word_stats.remove()
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 stopwords_path = os.path.join(current_dir, "stopwords.txt")
@@ -109,47 +235,201 @@ stopwords_path = os.path.join(current_dir, "stopwords.txt")
 with open(stopwords_path, "r", encoding="utf-8") as f:
     STOPWORDS = set(line.strip() for line in f)
 
-SHINGLE_SIZE = 5
-NEAR_DUPLICATE_THRESHOLD = 0.6
+# a page is scanned once, in runs of word characters and apostrophes. A
+# run's \w+ parts are the words that are counted and shingled; its
+# [A-Za-z0-9']+ parts are the case-sensitive tokens the low-information
+# ratios have always counted
+WORD_RUN_RE = re.compile(r"[\w']+")
+NOT_CASED_TOKEN_RE = re.compile(r"[^A-Za-z0-9']+")
+HEX_TOKEN_RE = re.compile(r"[a-f0-9]{7}")
 
-def scraper(url, resp):
-    global global_word_counter
-    global max_words_page
-    
+class PageTokens(object):
+    """
+    Everything the scraper needs from a page's words, gathered in one
+    pass over its text. Memory is proportional to the distinct words and
+    shingles of the page, not to its length.
+        total          -> number of tokens
+        hex_tokens     -> tokens that look like short commit hashes
+        word_counts    -> Counter of the lowercased tokens that are neither
+                          stopwords nor numbers
+        word_count     -> sum of word_counts
+        shingle_hashes -> crc32 of every k consecutive lowercased tokens
+        cased_total    -> number of case-sensitive [A-Za-z0-9']+ tokens
+        cased_distinct -> number of distinct ones
+    """
+    __slots__ = ("total", "hex_tokens", "word_counts", "word_count",
+                 "shingle_hashes", "cased_total", "cased_distinct")
+
+    def __init__(self, text, k=SHINGLE_SIZE):
+        stopwords = STOPWORDS
+        word_counts = Counter()
+        shingle_hashes = set()
+        cased = set()
+        window = deque(maxlen=k)
+        total = hex_tokens = cased_total = 0
+        for match in WORD_RUN_RE.finditer(text):
+            run = match.group()
+            if run.isascii() and run.isalnum():
+                # the common case: a plain ascii word is one token of each kind
+                tokens = cased_tokens = (run,)
+            else:
+                tokens = [t for t in run.split("'") if t]
+                cased_tokens = [t for t in NOT_CASED_TOKEN_RE.split(run) if t]
+            cased_total += len(cased_tokens)
+            cased.update(cased_tokens)
+            for token in tokens:
+                token = token.lower()
+                total += 1
+                if not (token in stopwords or token.isdigit()):
+                    word_counts[token] += 1
+                if len(token) == 7 and HEX_TOKEN_RE.fullmatch(token):
+                    hex_tokens += 1
+                window.append(token)
+                if len(window) == k:
+                    shingle_hashes.add(zlib.crc32(" ".join(window).encode("utf-8")))
+        self.total = total
+        self.hex_tokens = hex_tokens
+        self.word_counts = word_counts
+        self.word_count = sum(word_counts.values())
+        self.shingle_hashes = shingle_hashes
+        self.cased_total = cased_total
+        self.cased_distinct = len(cased)
+
+VISIBLE_STRING_TYPES = (NavigableString, CData)
+INVISIBLE_TAGS = frozenset(("script", "style"))
+
+class ParsedPage(object):
+    """
+    A fetched page parsed once. The soup, visible text, tokens and
+    outgoing links are computed on first use and shared by every stage
+    that needs them (low-information check, duplicate detection, word
+    counting and link extraction).
+    """
+    def __init__(self, url, content):
+        # url: the actual url of the page, used to resolve relative links
+        self.url = url
+        self.content = content
+        # parsing is lazy, so its cost is measured from here to the analysis
+        self.started = time.perf_counter()
+        # set by scraper(), so the caller can see what became of the page
+        self.analysis = None
+
+    @classmethod
+    def from_response(cls, resp):
+        return cls(resp.url, resp.raw_response.content)
+
+    @cached_property
+    def soup(self):
+        return BeautifulSoup(self.content, 'lxml')
+
+    @cached_property
+    def links(self):
+        links = set()
+        for anchor in self.soup.find_all('a', href=True):
+            href = anchor['href']
+            links.add(urljoin(self.url, urlparse(href).path))
+        return links
+
+    @cached_property
+    def text(self):
+        # the strings get_text() would join, minus scripts and styles; they
+        # are skipped rather than removed, so the soup stays whole for links
+        strings = (
+            string.strip() for string in self.soup.descendants
+            if type(string) in VISIBLE_STRING_TYPES
+            and string.parent.name not in INVISIBLE_TAGS)
+        visible_text = " ".join(string for string in strings if string)
+        return re.sub(r'\s+', ' ', visible_text)
+
+    @cached_property
+    def tokens(self):
+        return PageTokens(self.text)
+
+def scraper(url, resp, page=None):
     # handle successful responses
     if resp.status != 200 or not resp.raw_response:
         print(f"Non-200 response ({resp.status}) for: {url}")
         return []
-    text = extract_visible_text(resp)
-    words = [w.lower() for w in re.findall(r'\b\w+\b', text)]
+    if page is None:
+        page = ParsedPage.from_response(resp)
+    page.analysis = analyze_page(url, page)
+    return record_page(url, page.analysis)
+
+def analyze_page(url, page, near_dup_method=None):
+    """
+    CPU-only half of scraper(): compute everything the crawl state needs
+    from a parsed page. Touches no global state, so it can run in another
+    process; the result is a plain picklable dict.
+    """
+    near_dup_method = near_dup_method or NEAR_DUPLICATE_METHOD
+    tokens = page.tokens
+    analysis = {"word_count": tokens.word_count}
 
-    # add counts
-    
-    filtered_words = [w for w in words if w not in STOPWORDS and not w.isdigit()]
-    
     # Detect and avoid dead URLs that return a 200 status but no data
-    if len(filtered_words) < 30:
+    if tokens.word_count < 30:
+        analysis["parse_seconds"] = time.perf_counter() - page.started
+        return analysis
+
+    analysis["word_counts"] = tokens.word_counts
+    analysis["text_hash"] = get_hash(page.text)
+    if near_dup_method == "jaccard":
+        analysis["shingles"] = tokens.shingle_hashes
+    else:
+        analysis["signature"] = minhasher.signature_from_hashes(tokens.shingle_hashes)
+    links = extract_next_links(url, None, page)
+    analysis["links"] = [link for link in links if is_valid(link)]
+    analysis["parse_seconds"] = time.perf_counter() - page.started
+    return analysis
+
+def analyze_content(url, page_url, content, near_dup_method):
+    """
+    Process pool entry point: parse raw page content and analyze it.
+    Returns None for low-information pages.
+    """
+    page = ParsedPage(page_url, content)
+    if is_low_information(page):
+        return None
+    return analyze_page(url, page, near_dup_method)
+
+def record_page(url, analysis):
+    """
+    Stateful half of scraper(): fold a page analysis into the word counts
+    and duplicate indexes, and return the links worth crawling. The
+    outcome is stored as analysis["verdict"].
+    """
+    metrics.observe("parse", analysis["parse_seconds"])
+    word_count = analysis["word_count"]
+    if word_count < 30:
+        analysis["verdict"] = "low_information"
         print(f"Dead or low-information page: {url}")
         return []
-    
-    global_word_counter.update(filtered_words)
-    # check if this page has most words
-    if len(filtered_words) > max_words_page[1]:
-        max_words_page = (url, len(filtered_words))
-    
+
+    # add counts and check if this page has most words
+    word_stats.record(url, analysis["word_counts"], word_count)
+
     # check exact duplicates & near duplicates
-    if is_exact_duplicate(text):
+    with metrics.timer("dedup"):
+        is_exact = is_exact_duplicate_hash(analysis["text_hash"])
+        if not is_exact:
+            if "shingles" in analysis:
+                is_near, other_url, similarity = is_near_duplicate_shingles(url, analysis["shingles"])
+            else:
+                is_near, other_url, similarity = is_near_duplicate_signature(url, analysis["signature"])
+    if is_exact:
+        analysis["verdict"] = "exact_duplicate"
+        metrics.incr("exact_duplicates")
         print(f"Exact Duplicate: {url}")
         return []
-    is_near, other_url, similarity = is_near_duplicate(url, text)
     if is_near:
+        analysis["verdict"] = "near_duplicate"
+        metrics.incr("near_duplicates")
         print(f"Near Duplicate: {url} - {other_url}. Similarity: {similarity:.2f}")
         return []
-    
-    links = extract_next_links(url, resp)
-    return [link for link in links if is_valid(link)]
 
-def extract_next_links(url, resp):
+    analysis["verdict"] = "scraped"
+    return analysis["links"]
+
+def extract_next_links(url, resp, page=None):
     # Implementation required.
     # url: the URL that was used to get the page
     # resp.url: the actual url of the page
@@ -161,342 +441,231 @@ def extract_next_links(url, resp):
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
     links = set()
     try:
-        soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-        
-        for anchor in soup.find_all('a', href=True):
-            href = anchor['href']
-            absolute_url = urljoin(resp.url, urlparse(href).path)
-            links.add(absolute_url)
+        if page is None:
+            page = ParsedPage.from_response(resp)
+        links = page.links
     except Exception as e:
         print(f"Error extracting links from {url}: {e}")
         
     return links
 
+# URL filter rules, compiled once at import and shared by is_valid and to_crawl
+ALLOWED_SCHEMES = frozenset(("http", "https"))
+ALLOWED_DOMAIN_SUFFIXES = frozenset((
+    ".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu"))
+TODAY_DOMAIN = "today.uci.edu"
+TODAY_PATH_PREFIX = "/department/information_computer_sciences"
+BLOCKED_EXTENSIONS = frozenset((
+    "css", "js", "bmp", "gif", "jpg", "jpeg", "ico",
+    "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz"))
+BLOCKED_SCHEMES = frozenset(("tel", "mailto"))
+
+# year/month and year/month/day calendar traps at the end of the path
+CALENDAR_RE = re.compile(r'\d{4}[-/]\d{2}(?:[-/]\d{2})?$')
+# pagination past page 5
+PAGINATION_RE = re.compile(r'(page|start|offset)=(\d+)')
+# session/token and download/action traps, swiki index loops (lowercased query)
+QUERY_TRAP_RE = re.compile(
+    r'(?:^|&)(?:session|sid|token|jsessionid|version|do|rev)='
+    r'|action=download|idx=')
+# path-based traps (lowercased path)
+PATH_TRAP_RE = re.compile(r'diff|media|history')
+# suspicious scripts with id/files parameters
+SCRIPT_PATH_RE = re.compile(r'\.(?:php|aspx|jsp)$')
+SCRIPT_QUERY_RE = re.compile(r'id=|files=')
+# long (commit-like) hashes, phone numbers and e-mail addresses in path + query
+CONTENT_TRAP_RE = re.compile(
+    r'[a-fA-F0-9]{32,}'
+    r'|\(\d{3}\)\s?\d{3}-\d{4}'
+    r'|[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}')
+# GitLab-specific traps
+GITLAB_BAN_PATHS = (
+    '/forks', '/issues', '/starrers', '/merge_requests', '/pipelines',
+    '/jobs', '/blame', '/tags', '/branches', '/commits', '/repository',
+    '/import', '/activity'
+)
+GITLAB_HASH_RE = re.compile(r'/(?:commit|tree|compare)/[a-fA-F0-9]{10,}')
+GITLAB_COMMIT_QUERY_RE = re.compile(r'view=|expanded=')
+
+URL_CACHE_SIZE = 1 << 16
+
 def is_valid(url):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
     # There are already some conditions that return False.
-    try:
-        if isinstance(url, (bytes, bytearray)):
-            try:
-                url = url.decode("utf-8", "ignore")
-            except UnicodeDecodeError:
-                return False
-
-        parsed = urlparse(url)
-        query_parts = parsed.query.lower().split('&')
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        
-        # # Basic sanity checks
-        # if len(query_parts) > 5:
-        #     return False
-        # if len(url) > 300:
-        #     return False
-        # if parsed.path.count('/') > 10:
-        #     return False
-        # if len(parsed.query) > 200:
-        #     return False
-
-        # # Calendar & pagination traps
-        # # year/month/day traps
-        # if re.search(r'\d{4}[-/]\d{2}[-/]\d{2}', url):
-        #     return False
-        # # year/month traps
-        # if re.search(r'\d{4}[-/]\d{2}', url): # year/month
-        #     return False
-        # pagination_patterns = ('page=', 'start=', 'offset=')
-        # if any(part.startswith(p) and re.search(r'\d+', part) for p in pagination_patterns for part in query_parts):
-        #     return False
-
-        # # Session/token traps
-        # trap_params = ('session=', 'sid=', 'token=', 'jsessionid=')
-        # if any(part.startswith(p) for p in trap_params for part in query_parts):
-        #     return False
-
-        # # Download/action traps
-        # if "action=download" in parsed.query.lower():
-        #     return False
-        # if any(part.startswith(('version=', 'do=', 'rev=')) for part in query_parts):
-        #     return False
-
-        # # Path-based traps
-        # if any(trap in parsed.path.lower() for trap in ['diff', 'media', 'history']):
-        #     return False
-
-        # # Suspicious file traps
-        # if re.search(r'\.(php|aspx|jsp)$', parsed.path.lower()):
-        #     if any(key in parsed.query.lower() for key in ('id=', 'files=')):
-        #         return False
-
-        # # Long hash (commit-like) traps
-        # if re.search(r'[a-fA-F0-9]{32,}', parsed.path) or re.search(r'[a-fA-F0-9]{32,}', parsed.query):
-        #     return False
-
-        # # GitLab-specific traps
-        # gitlab_ban_paths = (
-        #     '/forks', '/issues', '/starrers', '/merge_requests', '/pipelines',
-        #     '/jobs', '/blame', '/tags', '/branches', '/commits', '/repository',
-        #     '/import', '/activity'
-        # )
-        # if '/-/' in url:
-        #     if url.rstrip('/').endswith(gitlab_ban_paths):
-        #         return False
-        #     if parsed.path.endswith('/compare'):
-        #         return False
-        #     if re.search(r'/(commit|tree|compare)/[a-fA-F0-9]{10,}', parsed.path):
-        #         return False
-        #     if parsed.path.startswith('/-/commit') and any(p in parsed.query.lower() for p in ['view=', 'expanded=']):
-        #         return False
-
-        # # Swiki traps (index loops)
-        # if 'idx=' in parsed.query.lower():
-        #     return False
-        
-        # # Skip tel and mail links
-        # # path of tel links like (949) xxx-xxxx
-        # # path of mail links like xxx@xxx.uci.edu
-        # if parsed.scheme in ['tel', 'mailto']:
-        #     return False
-        
-        # PHONE_RE = re.compile(r'\(\d{3}\)\s?\d{3}-\d{4}')
-        # EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}')
-        # path_and_query = parsed.path + "?" + parsed.query
-        # if PHONE_RE.search(path_and_query) or EMAIL_RE.search(path_and_query):
-        #     return False
-
-        # ----
-
-        # Basic sanity checks
-        if len(query_parts) > 5:
-            return False
-        if len(url) > 300:
-            return False
-        if parsed.path.count('/') > 10:
-            return False
-        if len(parsed.query) > 200:
-            return False
+    if isinstance(url, (bytes, bytearray)):
+        url = url.decode("utf-8", "ignore")
+    return _is_valid(url)
 
-        # Calendar & pagination traps
-        # year/month/day traps
-        if re.search(r'\d{4}[-/]\d{2}[-/]\d{2}$', parsed.path):
-            return False
-        elif re.search(r'\d{4}[-/]\d{2}$', parsed.path):
-            return False
-        pagination_patterns = ('page=', 'start=', 'offset=')
-        for p in pagination_patterns:
-            m = re.search(rf'{p}(\d+)', parsed.query)
-            if m and int(m.group(1)) > 5:
-                return False
-            
-
-        # Session/token traps
-        trap_params = ('session=', 'sid=', 'token=', 'jsessionid=')
-        if any(part.startswith(p) for p in trap_params for part in query_parts):
-            return False
-
-        # Download/action traps
-        if "action=download" in parsed.query.lower():
-            return False
-        if any(part.startswith(('version=', 'do=', 'rev=')) for part in query_parts):
-            return False
+def to_crawl(url):
+    """
+    Decide whether to crawl this website or not.
+    Skip the trap website.
+    """
+    if isinstance(url, (bytes, bytearray)):
+        url = url.decode("utf-8", "ignore")
+    return _to_crawl(url)
 
-        # Path-based traps
-        if any(trap in parsed.path.lower() for trap in ['diff', 'media', 'history']):
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _is_valid(url):
+    try:
+        parsed = urlparse(url)
+        if parsed.scheme not in ALLOWED_SCHEMES:
             return False
-
-        # Suspicious file traps
-        if re.search(r'\.(php|aspx|jsp)$', parsed.path.lower()):
-            if any(key in parsed.query.lower() for key in ('id=', 'files=')):
-                return False
-
-        # Long hash (commit-like) traps
-        if re.search(r'[a-fA-F0-9]{32,}', parsed.path) or re.search(r'[a-fA-F0-9]{32,}', parsed.query):
+        if _is_trap(url, parsed):
             return False
 
-        # GitLab-specific traps
-        gitlab_ban_paths = (
-            '/forks', '/issues', '/starrers', '/merge_requests', '/pipelines',
-            '/jobs', '/blame', '/tags', '/branches', '/commits', '/repository',
-            '/import', '/activity'
-        )
-        if '/-/' in url:
-            if url.rstrip('/').endswith(gitlab_ban_paths):
-                return False
-            if parsed.path.endswith('/compare'):
-                return False
-            if re.search(r'/(commit|tree|compare)/[a-fA-F0-9]{10,}', parsed.path):
-                return False
-            if parsed.path.startswith('/-/commit') and any(p in parsed.query.lower() for p in ['view=', 'expanded=']):
+        domain = parsed.netloc.lower()
+        if domain == TODAY_DOMAIN:
+            if not parsed.path.startswith(TODAY_PATH_PREFIX):
                 return False
-
-        # Swiki traps (index loops)
-        if 'idx=' in parsed.query.lower():
-            return False
-        
-        # Skip tel and mail links
-        # path of tel links like (949) xxx-xxxx
-        # path of mail links like xxx@xxx.uci.edu
-        if parsed.scheme in ['tel', 'mailto']:
-            return False
-        
-        PHONE_RE = re.compile(r'\(\d{3}\)\s?\d{3}-\d{4}')
-        EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}')
-        path_and_query = parsed.path + "?" + parsed.query
-        if PHONE_RE.search(path_and_query) or EMAIL_RE.search(path_and_query):
+        elif not _has_allowed_suffix(domain):
             return False
 
-
-        # ----
-
-        domain = parsed.netloc.lower()
-        if not (domain.endswith(".ics.uci.edu") or
-                domain.endswith(".cs.uci.edu") or
-                domain.endswith(".informatics.uci.edu") or
-                domain.endswith(".stat.uci.edu") or
-                domain == "today.uci.edu"):
-            return False
-        
-        if domain == "today.uci.edu":
-            if not parsed.path.startswith("/department/information_computer_sciences"):
-                return False
-        
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+        path = parsed.path.lower()
+        return path.rpartition('.')[2] not in BLOCKED_EXTENSIONS or '.' not in path
 
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
 
-def to_crawl(url):
-    """
-    Decide whether to crawl this website or not.
-    Skip the trap website.
-    """
-
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _to_crawl(url):
     try:
-        if isinstance(url, (bytes, bytearray)):
-            try:
-                url = url.decode("utf-8", "ignore")
-            except UnicodeDecodeError:
-                return False
-        parsed = urlparse(url)
-        query_parts = parsed.query.lower().split('&')
+        return not _is_trap(url, urlparse(url))
+    except TypeError:
+        print ("TypeError for ", url)
+        raise
 
-        # Basic sanity checks
-        if len(query_parts) > 5:
-            return False
-        if len(url) > 300:
-            return False
-        if parsed.path.count('/') > 10:
-            return False
-        if len(parsed.query) > 200:
-            return False
+def _has_allowed_suffix(domain):
+    # check every ".label.label..." suffix of the domain with a set lookup
+    dot = domain.find('.')
+    while dot != -1:
+        if domain[dot:] in ALLOWED_DOMAIN_SUFFIXES:
+            return True
+        dot = domain.find('.', dot + 1)
+    return False
 
-        # Calendar & pagination traps
-        # year/month/day traps
-        if re.search(r'\d{4}[-/]\d{2}[-/]\d{2}$', parsed.path):
-            return False
-        elif re.search(r'\d{4}[-/]\d{2}$', parsed.path):
-            return False
-        pagination_patterns = ('page=', 'start=', 'offset=')
-        for p in pagination_patterns:
-            m = re.search(rf'{p}(\d+)', query_lower)
-            if m and int(m.group(1)) > 5:
-                return False
-            
+def _is_trap(url, parsed):
+    """ True if the url matches one of the crawler trap rules. """
+    path = parsed.path
+    query = parsed.query
+    path_lower = path.lower()
+    query_lower = query.lower()
 
-        # Session/token traps
-        trap_params = ('session=', 'sid=', 'token=', 'jsessionid=')
-        if any(part.startswith(p) for p in trap_params for part in query_parts):
-            return False
+    # Basic sanity checks
+    if query_lower.count('&') >= 5:
+        return True
+    if len(url) > 300:
+        return True
+    if path.count('/') > 10:
+        return True
+    if len(query) > 200:
+        return True
 
-        # Download/action traps
-        if "action=download" in parsed.query.lower():
-            return False
-        if any(part.startswith(('version=', 'do=', 'rev=')) for part in query_parts):
-            return False
+    # Calendar & pagination traps
+    if CALENDAR_RE.search(path):
+        return True
+    if query:
+        # only the first occurrence of each parameter counts
+        seen = set()
+        for m in PAGINATION_RE.finditer(query):
+            if m.group(1) in seen:
+                continue
+            seen.add(m.group(1))
+            if int(m.group(2)) > 5:
+                return True
+
+        # Session/token, download/action and swiki traps
+        if QUERY_TRAP_RE.search(query_lower):
+            return True
+
+    # Path-based traps
+    if PATH_TRAP_RE.search(path_lower):
+        return True
 
-        # Path-based traps
-        if any(trap in parsed.path.lower() for trap in ['diff', 'media', 'history']):
-            return False
+    # Suspicious file traps
+    if SCRIPT_PATH_RE.search(path_lower) and SCRIPT_QUERY_RE.search(query_lower):
+        return True
 
-        # Suspicious file traps
-        if re.search(r'\.(php|aspx|jsp)$', parsed.path.lower()):
-            if any(key in parsed.query.lower() for key in ('id=', 'files=')):
-                return False
+    # GitLab-specific traps
+    if '/-/' in url:
+        if url.rstrip('/').endswith(GITLAB_BAN_PATHS):
+            return True
+        if path.endswith('/compare'):
+            return True
+        if GITLAB_HASH_RE.search(path):
+            return True
+        if path.startswith('/-/commit') and GITLAB_COMMIT_QUERY_RE.search(query_lower):
+            return True
+
+    # Skip tel and mail links
+    if parsed.scheme in BLOCKED_SCHEMES:
+        return True
 
-        # Long hash (commit-like) traps
-        if re.search(r'[a-fA-F0-9]{32,}', parsed.path) or re.search(r'[a-fA-F0-9]{32,}', parsed.query):
-            return False
+    # Long hashes, phone numbers and e-mail addresses
+    # path of tel links like (949) xxx-xxxx
+    # path of mail links like xxx@xxx.uci.edu
+    if CONTENT_TRAP_RE.search(path + "?" + query):
+        return True
 
-        # GitLab-specific traps
-        gitlab_ban_paths = (
-            '/forks', '/issues', '/starrers', '/merge_requests', '/pipelines',
-            '/jobs', '/blame', '/tags', '/branches', '/commits', '/repository',
-            '/import', '/activity'
-        )
-        if '/-/' in url:
-            if url.rstrip('/').endswith(gitlab_ban_paths):
-                return False
-            if parsed.path.endswith('/compare'):
-                return False
-            if re.search(r'/(commit|tree|compare)/[a-fA-F0-9]{10,}', parsed.path):
-                return False
-            if parsed.path.startswith('/-/commit') and any(p in parsed.query.lower() for p in ['view=', 'expanded=']):
-                return False
+    return False
 
-        # Swiki traps (index loops)
-        if 'idx=' in parsed.query.lower():
-            return False
-        
-        # Skip tel and mail links
-        # path of tel links like (949) xxx-xxxx
-        # path of mail links like xxx@xxx.uci.edu
-        if parsed.scheme in ['tel', 'mailto']:
-            return False
-        
-        PHONE_RE = re.compile(r'\(\d{3}\)\s?\d{3}-\d{4}')
-        EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}')
-        path_and_query = parsed.path + "?" + parsed.query
-        if PHONE_RE.search(path_and_query) or EMAIL_RE.search(path_and_query):
-            return False
+URL_RULES = (
+    ALLOWED_SCHEMES, ALLOWED_DOMAIN_SUFFIXES, TODAY_DOMAIN, TODAY_PATH_PREFIX,
+    BLOCKED_EXTENSIONS, BLOCKED_SCHEMES, CALENDAR_RE, PAGINATION_RE,
+    QUERY_TRAP_RE, PATH_TRAP_RE, SCRIPT_PATH_RE, SCRIPT_QUERY_RE,
+    CONTENT_TRAP_RE, GITLAB_BAN_PATHS, GITLAB_HASH_RE, GITLAB_COMMIT_QUERY_RE)
 
-        return True
+def url_rules_version():
+    """
+    Checksum of what is_valid decides by: the rule constants and patterns
+    in URL_RULES and the code of the functions that apply them. Changes to
+    the rest of this module leave it alone, so urls the frontier queued
+    under the same rules are not checked again on resume.
+    """
+    parts = []
+    for rule in URL_RULES:
+        if isinstance(rule, re.Pattern):
+            parts.append(f"{rule.pattern!r} {rule.flags}")
+        elif isinstance(rule, frozenset):
+            # set order changes with string hash randomization
+            parts.append(repr(sorted(rule)))
+        else:
+            parts.append(repr(rule))
+    for func in (is_valid, _is_valid, _has_allowed_suffix, _is_trap):
+        parts.append(inspect.getsource(func))
+    return zlib.crc32("\n".join(parts).encode("utf-8"))
 
-    except TypeError:
-        print ("TypeError for ", parsed)
-        raise
-    
 
 # helper functions
 def extract_visible_text(resp):
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-    for script in soup(["script", "style"]):
-        script.decompose()
-    visible_text = soup.get_text(separator=" ", strip=True)
-    return re.sub(r'\s+', ' ', visible_text)
+    return ParsedPage.from_response(resp).text
 
 def get_hash(text):
-    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+    # first 64 bits of the sha1 digest
+    return int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'big')
 
 def is_exact_duplicate(text):
-    text_hash = get_hash(text)
-    if text_hash in seen_hashes:
-        return True
-    seen_hashes.add(text_hash)
+    return is_exact_duplicate_hash(get_hash(text))
+
+def is_exact_duplicate_hash(text_hash):
+    with seen_shingles_lock:
+        if text_hash in seen_hashes:
+            return True
+        seen_hashes.add(text_hash)
+    exact_dup_store.append((text_hash,))
     return False
 
 def get_shingles(text, k=SHINGLE_SIZE):
-    words = text.split()
-    return set(' '.join(words[i:i + k]) for i in range(len(words) - k + 1))
+    # shingles are kept as crc32 hashes of k consecutive tokens
+    return PageTokens(text, k).shingle_hashes
 
 def jaccard_similarity(set1, set2):
     if not set1 or not set2:
@@ -504,25 +673,52 @@ def jaccard_similarity(set1, set2):
     return len(set1 & set2) / len(set1 | set2)
 
 def is_near_duplicate(url, text):
-    new_shingles = get_shingles(text)
+    if NEAR_DUPLICATE_METHOD == "jaccard":
+        return is_near_duplicate_jaccard(url, text)
+    return is_near_duplicate_signature(url, minhasher.signature_from_hashes(get_shingles(text)))
+
+def is_near_duplicate_signature(url, signature):
+    if signature is None:
+        return False, None, 0.0
+    with seen_shingles_lock:
+        for position in seen_signatures.query(signature):
+            similarity = MinHasher.similarity(signature, seen_signatures.signature(position))
+            if similarity >= NEAR_DUPLICATE_THRESHOLD:
+                return True, seen_signatures.keys[position], similarity
+        band_keys = seen_signatures.insert(url, signature)
+        # under the lock, so the two files list the pages in the same order
+        near_dup_store.append(signature, url)
+        near_dup_band_store.append(band_keys)
+
+    return False, None, 0.0
+
+def is_near_duplicate_jaccard(url, text):
+    return is_near_duplicate_shingles(url, get_shingles(text))
+
+def is_near_duplicate_shingles(url, new_shingles):
     with seen_shingles_lock:
         for other_url, shingles in seen_shingles.items():
             similarity = jaccard_similarity(new_shingles, shingles)
             if similarity >= NEAR_DUPLICATE_THRESHOLD:
                 return True, other_url, similarity
         seen_shingles[url] = new_shingles
+        shingle_store.append(new_shingles)
+        shingle_page_store.append((len(new_shingles),), url)
 
     return False, None, 0.0
 
 
-def is_low_information(text):
+def is_low_information(page):
+    text = page.text
     RE_UPDATE = re.compile(r'^update\s*-\s*\d{4}-\d{2}-\d{2}', re.I)
-    RE_SHA7   = re.compile(r'\b[a-f0-9]{7}\b', re.I)
     lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
     if not lines:
         return True
-    tokens = re.findall(r"[A-Za-z0-9']+", text)
-    unique_ratio = len(set(tokens)) / len(tokens) if tokens else 0
+    tokens = page.tokens
+    total = tokens.cased_total
+    unique_ratio = tokens.cased_distinct / total if total else 0
     update_ratio = sum(bool(RE_UPDATE.match(ln)) for ln in lines) / len(lines)
-    sha_density  = len(RE_SHA7.findall(text)) / max(1, len(tokens))
+    # a 7 hex digit word between word boundaries is exactly a 7 character
+    # \w+ token of hex digits, which PageTokens already counts
+    sha_density  = tokens.hex_tokens / max(1, total)
     return (unique_ratio < 0.05) or (update_ratio > 0.6) or (sha_density > 0.10)
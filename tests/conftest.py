@@ -0,0 +1,103 @@
+import sys
+
+from configparser import ConfigParser
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from utils.config import Config
+
+# settings every test frontier starts from: no politeness delay, small
+# filters, and none of the optional files
+DEFAULT_OPTIONS = {
+    "SEEDURL": "https://www.ics.uci.edu/",
+    "POLITENESS": 0,
+    "SAVE": "frontier.shelve",
+    "SAVEINTERVAL": 60,
+    "SEENCAPACITY": 10000,
+    "FRONTIERSHARDS": 16,
+    "LINKGRAPH": "",
+    "HISTORYFILE": "",
+    "METRICSFILE": "",
+}
+
+
+def make_config(**options):
+    """ config.ini with options (option name -> value, in any section) replaced. """
+    cparser = ConfigParser()
+    cparser.read(REPO_ROOT / "config.ini")
+    for option, value in dict(DEFAULT_OPTIONS, **options).items():
+        section = next(s for s in cparser.sections() if option in cparser[s])
+        cparser[section][option] = str(value)
+    return Config(cparser)
+
+
+@pytest.fixture
+def make_frontier(tmp_path, monkeypatch):
+    """
+    Factory of Frontiers whose save files, logs and scraper state live in
+    a fresh directory. make_frontier(restart=True, **options) takes the
+    make_config options; the save files are closed after the test.
+    """
+    from crawler.frontier import Frontier
+
+    monkeypatch.chdir(tmp_path)
+    frontiers = []
+
+    def make(restart=True, **options):
+        frontier = Frontier(make_config(**options), restart)
+        frontiers.append(frontier)
+        return frontier
+
+    yield make
+    for frontier in frontiers:
+        frontier.abandon()
+
+
+def crash(frontier):
+    """ Stop frontier the way a killed crawler does: flushed writes survive, no final snapshot. """
+    frontier.sync()
+    frontier.abandon()
+
+
+def drain(frontier, complete=True):
+    """ Every url get_tbd_url hands out, in order, until none is ready. """
+    urls = []
+    while True:
+        url, _ = frontier.get_tbd_url()
+        if url is None:
+            return urls
+        urls.append(url)
+        if complete:
+            frontier.mark_url_complete(url)
+
+
+@pytest.fixture
+def dup_state(tmp_path, monkeypatch):
+    """
+    Empty duplicate detection state of the scraper, with its fingerprint
+    files in a fresh directory. Returns the scraper module.
+    """
+    import scraper
+    from utils.fingerprints import FingerprintStore
+    from utils.minhash import LSHIndex
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scraper, "seen_hashes", set())
+    monkeypatch.setattr(scraper, "seen_shingles", dict())
+    monkeypatch.setattr(scraper, "seen_signatures",
+                        LSHIndex(scraper.MINHASH_PERMUTATIONS, scraper.LSH_BANDS))
+    monkeypatch.setattr(scraper, "exact_dup_store",
+                        FingerprintStore(scraper.EXACT_DUP_FILE, "Q"))
+    monkeypatch.setattr(scraper, "near_dup_store", FingerprintStore(
+        scraper.NEAR_DUP_FILE, "I", scraper.MINHASH_PERMUTATIONS, with_keys=True))
+    monkeypatch.setattr(scraper, "near_dup_band_store", FingerprintStore(
+        scraper.NEAR_DUP_BANDS_FILE, "q", scraper.LSH_BANDS))
+    monkeypatch.setattr(scraper, "shingle_store", FingerprintStore(scraper.SHINGLE_FILE, "I"))
+    monkeypatch.setattr(scraper, "shingle_page_store", FingerprintStore(
+        scraper.SHINGLE_PAGES_FILE, "I", with_keys=True))
+    return scraper
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from utils.async_download import AsyncCacheClient, BodyTooLarge
+
+
+async def serve(delay, body=b"ok"):
+    """ Keep-alive server answering every request with body after delay seconds. """
+    async def handle(reader, writer):
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            if not request:
+                break
+            await asyncio.sleep(delay)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+
+    async def guarded(reader, writer):
+        try:
+            await handle(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(guarded, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_time_waiting_for_a_slot_is_not_a_timeout():
+    async def run():
+        server, port = await serve(delay=0.1)
+        client = AsyncCacheClient("127.0.0.1", port, max_connections=1)
+        # each request takes 0.1s on the one connection; the last waits 0.4s
+        results = await asyncio.gather(*(
+            client.get([("q", str(i))], connect_timeout=1, read_timeout=0.3)
+            for i in range(5)))
+        await client.close()
+        server.close()
+        return results, client.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [(200, b"ok")] * 5
+    assert stats == {"requests": 5, "new_connections": 1, "reused": 4}
+
+
+def test_slow_response_times_out():
+    async def run():
+        server, port = await serve(delay=0.5)
+        client = AsyncCacheClient("127.0.0.1", port)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.get([("q", "slow")], connect_timeout=1, read_timeout=0.1)
+        finally:
+            await client.close()
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_body_over_the_limit():
+    async def run():
+        server, port = await serve(delay=0, body=b"x" * 100)
+        client = AsyncCacheClient("127.0.0.1", port)
+        try:
+            with pytest.raises(BodyTooLarge):
+                await client.get([("q", "big")], max_body=10)
+            assert await client.get([("q", "big")], max_body=100) == (200, b"x" * 100)
+        finally:
+            await client.close()
+            server.close()
+
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+import pickle
+
+from utils import get_urlfingerprint
+from utils.bloom import BloomFilter, PartitionedBloomFilter
+
+
+def fingerprints(urls):
+    return [get_urlfingerprint(url) for url in urls]
+
+
+def test_no_false_negatives_and_design_error_rate():
+    seen = BloomFilter(5000)
+    added = fingerprints(f"https://www.ics.uci.edu/a{i}" for i in range(5000))
+    for key in added:
+        seen.add(key)
+    assert all(key in seen for key in added)
+    others = fingerprints(f"https://www.ics.uci.edu/b{i}" for i in range(20000))
+    assert sum(key in seen for key in others) / len(others) < 0.02
+
+
+def test_partitions_fill_evenly_for_a_single_host():
+    seen = PartitionedBloomFilter(16000, partitions=16)
+    added = fingerprints(f"https://www.ics.uci.edu/page{i}" for i in range(16000))
+    for key in added:
+        seen.add(key)
+    assert len(seen) == 16000
+    assert all(900 < len(partition) < 1100 for partition in seen.partitions)
+    assert all(key in seen for key in added)
+    others = fingerprints(f"https://www.ics.uci.edu/other{i}" for i in range(20000))
+    assert sum(key in seen for key in others) / len(others) < 0.02
+
+
+def test_partitioned_filter_copies_and_pickles():
+    seen = PartitionedBloomFilter(1000, partitions=4)
+    key = get_urlfingerprint("https://www.ics.uci.edu/")
+    seen.add(key)
+    copy = seen.copy()
+    seen.add(get_urlfingerprint("https://www.ics.uci.edu/later"))
+    assert key in copy and len(copy) == 1
+    restored = pickle.loads(pickle.dumps(copy))
+    assert key in restored and len(restored) == 1
+    restored.add(get_urlfingerprint("https://www.ics.uci.edu/after"))
+    assert len(restored) == 2
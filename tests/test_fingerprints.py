@@ -0,0 +1,150 @@
+import hashlib
+import os
+import pickle
+
+import pytest
+
+from utils.fingerprints import FingerprintStore
+
+
+def test_records_and_keys_round_trip(tmp_path):
+    path = str(tmp_path / "sigs.bin")
+    store = FingerprintStore(path, "I", 4, with_keys=True)
+    store.append((1, 2, 3, 4), "https://www.ics.uci.edu/a")
+    store.flush()
+    store.append((5, 6, 7, 8), "https://www.ics.uci.edu/b\nc")
+    store.flush()
+    assert os.path.getsize(path) == 2 * 4 * 4
+
+    values, keys = FingerprintStore(path, "I", 4, with_keys=True).load()
+    assert list(values) == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert keys == ["https://www.ics.uci.edu/a", "https://www.ics.uci.edu/b c"]
+
+
+def test_torn_records_are_dropped(tmp_path):
+    path = str(tmp_path / "sigs.bin")
+    store = FingerprintStore(path, "I", 2, with_keys=True)
+    for i in range(3):
+        store.append((i, i), f"page{i}")
+    store.flush()
+    # a crash cut the last record short, and the key of the one before
+    with open(path, "r+b") as f:
+        f.truncate(2 * 8 + 3)
+    with open(f"{path}.keys", "r+b") as f:
+        f.truncate(len(b"page0\npag"))
+
+    values, keys = FingerprintStore(path, "I", 2, with_keys=True).load()
+    assert (list(values), keys) == ([0, 0], ["page0"])
+    assert os.path.getsize(path) == 8
+    # appends continue after the last complete record
+    store = FingerprintStore(path, "I", 2, with_keys=True)
+    store.append((9, 9), "page9")
+    store.flush()
+    values, keys = FingerprintStore(path, "I", 2, with_keys=True).load()
+    assert (list(values), keys) == ([0, 0, 9, 9], ["page0", "page9"])
+
+
+def test_remove(tmp_path):
+    path = str(tmp_path / "hashes.bin")
+    store = FingerprintStore(path, "Q")
+    store.append((2 ** 63,))
+    store.flush()
+    assert list(store.load()[0]) == [2 ** 63]
+    store.remove()
+    assert not os.path.exists(path)
+    values, keys = store.load()
+    assert (list(values), keys) == ([], None)
+
+
+def test_truncate(tmp_path):
+    path = str(tmp_path / "sigs.bin")
+    store = FingerprintStore(path, "I", 2, with_keys=True)
+    for i in range(3):
+        store.append((i, i), f"page{i}")
+    store.flush()
+    store.truncate(5)
+    store.truncate(1)
+    values, keys = store.load()
+    assert (list(values), keys) == ([0, 0], ["page0"])
+
+
+PAGE = " ".join(f"word{i}" for i in range(200))
+NEAR = PAGE.replace("word50", "changed")
+
+
+@pytest.mark.parametrize("method", ["minhash", "jaccard"])
+def test_duplicate_state_survives_a_restart(dup_state, monkeypatch, method):
+    monkeypatch.setattr(dup_state, "NEAR_DUPLICATE_METHOD", method)
+    assert not dup_state.is_exact_duplicate(PAGE)
+    assert not dup_state.is_near_duplicate("https://www.ics.uci.edu/a", PAGE)[0]
+    dup_state.save_dup_state()
+    # nothing is rewritten when there is nothing new
+    sizes = [os.path.getsize(path) for path in os.listdir(".")]
+    dup_state.save_dup_state()
+    assert [os.path.getsize(path) for path in os.listdir(".")] == sizes
+
+    dup_state.seen_hashes.clear()
+    dup_state.seen_shingles.clear()
+    dup_state.load_dup_state()
+    assert dup_state.is_exact_duplicate(PAGE)
+    assert dup_state.is_near_duplicate("https://www.ics.uci.edu/b", NEAR)[:2] == (
+        True, "https://www.ics.uci.edu/a")
+
+
+def test_band_keys_are_loaded_not_hashed_again(dup_state, monkeypatch):
+    for i in range(3):
+        text = " ".join(f"page{i}word{j}" for j in range(100))
+        dup_state.is_near_duplicate(f"https://www.ics.uci.edu/{i}", text)
+    dup_state.save_dup_state()
+    stored = list(dup_state.near_dup_band_store.load()[0])
+    assert len(stored) == 3 * dup_state.LSH_BANDS
+
+    hashed = []
+    band_keys = dup_state.LSHIndex.band_keys
+    monkeypatch.setattr(dup_state.LSHIndex, "band_keys",
+                        lambda self, signature: hashed.append(1) or band_keys(self, signature))
+    dup_state.load_dup_state()
+    # only the first signature is hashed, to check the stored keys
+    assert len(hashed) == 1
+    assert len(dup_state.seen_signatures) == 3
+
+
+def test_companion_files_are_trimmed_to_match(dup_state, monkeypatch):
+    monkeypatch.setattr(dup_state, "NEAR_DUPLICATE_METHOD", "jaccard")
+    dup_state.is_near_duplicate("https://www.ics.uci.edu/a", PAGE)
+    dup_state.is_near_duplicate("https://www.ics.uci.edu/b", " ".join(f"other{i}" for i in range(50)))
+    dup_state.save_dup_state()
+    # a crash cut the shingles of the second page short
+    size = os.path.getsize(dup_state.SHINGLE_FILE)
+    with open(dup_state.SHINGLE_FILE, "r+b") as f:
+        f.truncate(size - 8)
+
+    dup_state.load_dup_state()
+    assert list(dup_state.seen_shingles) == ["https://www.ics.uci.edu/a"]
+    assert dup_state.shingle_page_store.load()[1] == ["https://www.ics.uci.edu/a"]
+    assert os.path.getsize(dup_state.SHINGLE_FILE) == 4 * len(dup_state.get_shingles(PAGE))
+
+
+def test_pickled_state_is_migrated_once(dup_state, monkeypatch):
+    words = PAGE.split()
+    with open(dup_state.PICKLED_EXACT_DUP_FILE, "wb") as f:
+        pickle.dump({hashlib.sha1(PAGE.encode("utf-8")).hexdigest()}, f)
+    with open(dup_state.PICKLED_NEAR_DUP_FILE, "wb") as f:
+        # shingles as they were pickled: k whitespace-separated words
+        pickle.dump({"https://www.ics.uci.edu/a": {
+            " ".join(words[i:i + 5]) for i in range(len(words) - 4)}}, f)
+
+    dup_state.load_dup_state()
+    assert not os.path.exists(dup_state.PICKLED_EXACT_DUP_FILE)
+    assert not os.path.exists(dup_state.PICKLED_NEAR_DUP_FILE)
+    assert dup_state.is_exact_duplicate(PAGE)
+    assert dup_state.seen_shingles["https://www.ics.uci.edu/a"] == dup_state.get_shingles(PAGE)
+    for method in ("minhash", "jaccard"):
+        monkeypatch.setattr(dup_state, "NEAR_DUPLICATE_METHOD", method)
+        assert dup_state.is_near_duplicate("https://www.ics.uci.edu/b", NEAR)[:2] == (
+            True, "https://www.ics.uci.edu/a")
+
+    # loading again does not migrate anything twice
+    dup_state.load_dup_state()
+    assert len(dup_state.seen_hashes) == 1
+    assert len(dup_state.seen_signatures) == 1
@@ -0,0 +1,367 @@
+import threading
+import time
+
+from types import SimpleNamespace
+
+import pytest
+
+import crawler.frontier
+import scraper
+from crawler.politeness import HostRate, classify, OK, ERROR, TIMEOUT, REFUSED
+from conftest import crash, drain
+
+SEEDS = [f"https://h{i}.ics.uci.edu" for i in range(4)]
+
+
+class Clock(object):
+    """ Stands in for the time module in crawler.frontier; advance() moves time on. """
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(crawler.frontier, "time", clock)
+    # retry jitter factor of exactly 1
+    monkeypatch.setattr(crawler.frontier, "random", SimpleNamespace(random=lambda: 0.5))
+    return clock
+
+
+def crawl_some(frontier):
+    """
+    Hand out two seeds, complete one and queue links found on both.
+    Returns the urls a resumed frontier must still hand out.
+    """
+    first, _ = frontier.get_tbd_url()
+    second, _ = frontier.get_tbd_url()
+    children = [f"{first}/a", f"{first}/b", f"{second}/c"]
+    for child in children[:2]:
+        frontier.add_url(child, parent=first)
+    frontier.add_url(children[2], parent=second)
+    frontier.mark_url_complete(first)
+    # second is still being downloaded when the crawler stops
+    return set(SEEDS) - {first} | set(children)
+
+
+def test_resume_after_crash_from_log(make_frontier):
+    frontier = make_frontier(SEEDURL=",".join(SEEDS))
+    pending = crawl_some(frontier)
+    crash(frontier)
+
+    resumed = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    assert resumed.tbd_count == len(pending)
+    assert resumed.discovered == len(SEEDS) + 3
+    assert resumed.completed == 1
+    assert set(drain(resumed)) == pending
+
+
+def test_resume_after_crash_from_snapshot_and_log(make_frontier, monkeypatch):
+    frontier = make_frontier(SEEDURL=",".join(SEEDS))
+    in_progress, _ = frontier.get_tbd_url()
+    frontier.snapshot()
+    pending = crawl_some(frontier) | {in_progress}
+    crash(frontier)
+
+    # queued and logged urls passed is_valid when they were added, and
+    # the rules did not change since
+    checked = []
+    monkeypatch.setattr(crawler.frontier, "is_valid", lambda url: checked.append(url) or True)
+    resumed = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    urls = drain(resumed)
+    assert urls[0] == in_progress
+    assert set(urls) == pending
+    assert checked == []
+
+
+def is_free(lock):
+    """ Whether another thread could take lock right now. """
+    free = []
+
+    def take():
+        free.append(lock.acquire(blocking=False))
+        if free[0]:
+            lock.release()
+
+    thread = threading.Thread(target=take)
+    thread.start()
+    thread.join()
+    return free[0]
+
+
+def test_snapshot_copies_one_shard_at_a_time(make_frontier, monkeypatch):
+    hosts = [f"https://h{i}.ics.uci.edu" for i in range(32)]
+    frontier = make_frontier(SEEDURL=",".join(hosts), FRONTIERSHARDS=8)
+    first, _ = frontier.get_tbd_url()
+    middle = frontier.shards[4]
+    copy_state = middle.state
+    by_shard = {frontier._shard(host[8:]): host for host in hosts}
+    late = [f"{by_shard[shard]}/late" for shard in frontier.shards if shard is not middle]
+
+    def state():
+        # other threads keep working while one shard is copied: urls go into
+        # shards copied already and into shards not copied yet
+        assert all(is_free(shard.lock) for shard in frontier.shards if shard is not middle)
+        for url in late:
+            frontier.add_url(url)
+        frontier.mark_url_complete(first)
+        return copy_state()
+
+    monkeypatch.setattr(middle, "state", state)
+    frontier.snapshot()
+    crash(frontier)
+
+    resumed = make_frontier(restart=False, SEEDURL=",".join(hosts), FRONTIERSHARDS=8)
+    assert resumed.discovered == len(hosts) + len(late)
+    assert resumed.completed == 1
+    assert sorted(drain(resumed)) == sorted(set(hosts) - {first} | set(late))
+
+
+def test_rechecks_queued_urls_after_the_rules_change(make_frontier, monkeypatch):
+    frontier = make_frontier(SEEDURL=",".join(SEEDS))
+    frontier.snapshot()
+    pending = crawl_some(frontier)
+    crash(frontier)
+
+    monkeypatch.setattr(scraper, "URL_RULES", scraper.URL_RULES + ("/new-trap",))
+    checked = []
+    monkeypatch.setattr(crawler.frontier, "is_valid", lambda url: checked.append(url) or True)
+    resumed = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    assert set(drain(resumed)) == pending
+    assert set(checked) >= pending
+
+
+def test_rules_version_only_covers_the_url_rules(monkeypatch):
+    version = scraper.url_rules_version()
+    monkeypatch.setattr(scraper, "NEAR_DUPLICATE_THRESHOLD", 0.9)
+    monkeypatch.setattr(scraper, "TOP_WORDS_CAPACITY", 10)
+    assert scraper.url_rules_version() == version
+    monkeypatch.setattr(scraper, "URL_RULES", scraper.URL_RULES[:-1])
+    assert scraper.url_rules_version() != version
+
+
+def test_close_and_resume_round_trip(make_frontier):
+    frontier = make_frontier(SEEDURL=",".join(SEEDS))
+    pending = crawl_some(frontier)
+    frontier.close()
+
+    resumed = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    assert resumed.tbd_count == len(pending)
+    assert set(drain(resumed)) == pending
+    assert resumed.completed == len(SEEDS) + 3
+
+
+def test_retry_backs_off_then_gives_up(make_frontier, clock):
+    frontier = make_frontier(MAXRETRIES=2, RETRYDELAY=10)
+    url, _ = frontier.get_tbd_url()
+    frontier.add_url("https://www.ics.uci.edu/other", parent=url)
+
+    assert frontier.retry_url(url)
+    assert frontier.tbd_count == 2
+    # the other url of the host goes while the retry waits out its 10s
+    assert frontier.get_tbd_url() == ("https://www.ics.uci.edu/other", None)
+    assert frontier.get_tbd_url() == (None, clock.now + 10)
+    clock.advance(10)
+    assert frontier.get_tbd_url() == (url, None)
+
+    assert frontier.retry_url(url)
+    assert frontier.get_tbd_url() == (None, clock.now + 20)
+    clock.advance(20)
+    assert frontier.get_tbd_url() == (url, None)
+
+    assert not frontier.retry_url(url)
+    assert frontier.tbd_count == 0
+
+
+def test_retry_goes_before_queued_urls(make_frontier, clock):
+    frontier = make_frontier(RETRYDELAY=10)
+    url, _ = frontier.get_tbd_url()
+    assert frontier.retry_url(url)
+    for i in range(3):
+        frontier.add_url(f"https://www.ics.uci.edu/page{i}")
+    clock.advance(10)
+    assert frontier.get_tbd_url() == (url, None)
+
+
+def test_retries_from_many_threads(make_frontier):
+    seeds = [f"https://h{i}.ics.uci.edu/p{j}" for i in range(8) for j in range(25)]
+    frontier = make_frontier(SEEDURL=",".join(seeds), MAXRETRIES=3, RETRYDELAY=0)
+    lock = threading.Lock()
+    failures = dict()
+    completed = []
+
+    def work():
+        while len(completed) < len(seeds):
+            url, _ = frontier.get_tbd_url()
+            if url is None:
+                time.sleep(0.001)
+                continue
+            with lock:
+                # every url fails twice before it downloads
+                failures[url] = failures.get(url, 0) + 1
+                failed = failures[url] <= 2
+            if failed and frontier.retry_url(url):
+                continue
+            frontier.mark_url_complete(url)
+            with lock:
+                completed.append(url)
+
+    threads = [threading.Thread(target=work) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert sorted(completed) == sorted(seeds)
+    assert all(count == 3 for count in failures.values())
+    assert frontier.tbd_count == 0
+    assert all(not shard.in_progress and not shard.attempts for shard in frontier.shards)
+
+
+def test_classify_cache_server_statuses():
+    def response(status):
+        return SimpleNamespace(status=status)
+
+    assert classify(None) == TIMEOUT
+    assert classify(response(200)) == OK
+    assert classify(response(404)) == OK
+    assert classify(response(429)) == ERROR
+    assert classify(response(503)) == ERROR
+    assert classify(response(601)) == ERROR
+    assert classify(response(602)) == ERROR
+    assert classify(response(603)) == REFUSED
+    assert classify(response(608)) == REFUSED
+
+
+def test_breaker_trips_doubles_and_resets():
+    config = SimpleNamespace(
+        time_delay=0.5, max_time_delay=60, latency_factor=1,
+        breaker_failures=3, breaker_cooldown=100)
+    host = HostRate(config.time_delay)
+
+    for now in (0, 1):
+        host.record(now, 0.1, ERROR, config)
+    assert host.paused_until == 0
+    host.record(2, 0.1, TIMEOUT, config)
+    assert (host.paused_until, host.trips) == (102, 1)
+    # a failure during the pause does not extend it
+    host.record(50, 0.1, ERROR, config)
+    assert (host.paused_until, host.trips) == (102, 1)
+    # the first fetch after the pause fails: twice the cooldown
+    host.record(102, 0.1, ERROR, config)
+    assert (host.paused_until, host.trips) == (302, 2)
+    # refusals leave the breaker alone
+    host.record(302, 0.1, REFUSED, config)
+    assert (host.failures, host.trips) == (5, 2)
+    host.record(303, 0.1, OK, config)
+    assert (host.failures, host.trips) == (0, 0)
+    assert host.delay <= config.max_time_delay
+
+
+def test_breaker_pauses_host_in_frontier(make_frontier, clock):
+    frontier = make_frontier(BREAKERFAILURES=2, BREAKERCOOLDOWN=300, MAXPOLITENESS=60)
+    url, _ = frontier.get_tbd_url()
+    frontier.add_url("https://www.ics.uci.edu/next", parent=url)
+    for _ in range(2):
+        frontier.record_fetch(url, 0.1, SimpleNamespace(status=503))
+    assert frontier.get_tbd_url() == (None, clock.now + 300)
+    clock.advance(300)
+    assert frontier.get_tbd_url() == ("https://www.ics.uci.edu/next", None)
+
+
+def test_crash_loses_unflushed_writes(make_frontier):
+    frontier = make_frontier(SEEDURL=",".join(SEEDS), SAVEINTERVAL=3600)
+    frontier.sync()
+    frontier.add_url(f"{SEEDS[0]}/late")
+    frontier.abandon()
+
+    resumed = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    assert set(drain(resumed)) == set(SEEDS)
+
+
+def test_shards_hold_separate_state(make_frontier):
+    hosts = [f"https://h{i}.ics.uci.edu" for i in range(32)]
+    frontier = make_frontier(SEEDURL=",".join(hosts), FRONTIERSHARDS=8)
+    assert len({id(shard.lock) for shard in frontier.shards}) == 8
+    used = [shard for shard in frontier.shards if shard.tbd_count]
+    assert len(used) > 1
+    for shard in frontier.shards:
+        # every waiting url lives in the shard its domain hashes to
+        assert all(frontier._shard(domain) is shard for domain in shard.domain_queues)
+        assert shard.discovered == shard.tbd_count == len(shard.queued)
+        assert sum(shard.subdomains.values()) == shard.discovered
+
+
+def test_concurrent_add_and_get_keep_shard_sums(make_frontier):
+    hosts = [f"https://h{i}.ics.uci.edu" for i in range(32)]
+    urls = [f"{host}/p{j}" for host in hosts for j in range(30)]
+    frontier = make_frontier(SEEDURL=",".join(hosts), FRONTIERSHARDS=8)
+    lock = threading.Lock()
+    completed = []
+    adding = threading.Event()
+    adding.set()
+
+    def add(part):
+        # neighbouring threads add overlapping urls
+        for url in urls[part::4] + urls[(part + 1) % 4::4]:
+            frontier.add_url(url)
+
+    def get():
+        while adding.is_set() or frontier.tbd_count:
+            url, _ = frontier.get_tbd_url()
+            if url is None:
+                time.sleep(0.001)
+                continue
+            frontier.mark_url_complete(url)
+            with lock:
+                completed.append(url)
+
+    adders = [threading.Thread(target=add, args=(part,)) for part in range(4)]
+    getters = [threading.Thread(target=get) for _ in range(8)]
+    for thread in adders + getters:
+        thread.start()
+    for thread in adders:
+        thread.join(timeout=30)
+    adding.clear()
+    for thread in getters:
+        thread.join(timeout=30)
+
+    every = set(hosts) | set(urls)
+    assert sorted(completed) == sorted(every)
+    assert frontier.tbd_count == 0
+    assert frontier.discovered == sum(shard.discovered for shard in frontier.shards) == len(every)
+    assert frontier.completed == sum(shard.completed for shard in frontier.shards) == len(every)
+    for shard in frontier.shards:
+        mine = [url for url in every if frontier._shard(url[8:].split("/")[0]) is shard]
+        assert shard.discovered == shard.completed == len(mine)
+        assert not shard.in_progress and not shard.queued
+    assert frontier.subdomains == {host[8:]: 31 for host in hosts}
+
+
+def test_migrates_a_save_file_of_the_shelve_format(make_frontier, tmp_path):
+    import shelve
+    from utils import get_urlhash
+
+    urls = {f"{SEEDS[0]}/done": True, f"{SEEDS[0]}/todo": False, f"{SEEDS[1]}/todo": False}
+    with shelve.open(str(tmp_path / "frontier.shelve")) as old:
+        for url, completed in urls.items():
+            old[get_urlhash(url)] = (url, completed)
+
+    resumed = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    assert (resumed.discovered, resumed.completed) == (3, 1)
+    assert sorted(drain(resumed)) == [f"{SEEDS[0]}/todo", f"{SEEDS[1]}/todo"]
+    # migrated urls count as seen
+    resumed.add_url(f"{SEEDS[0]}/done")
+    assert resumed.discovered == 3
+    crash(resumed)
+    assert not list(tmp_path.glob("*.migrating*"))
+    again = make_frontier(restart=False, SEEDURL=",".join(SEEDS))
+    assert (again.discovered, again.completed) == (3, 3)
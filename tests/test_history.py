@@ -0,0 +1,71 @@
+import pickle
+
+import requests
+
+from utils.history import CrawlHistory, HistoryReader
+from utils.response import Response
+
+SITE = "https://www.ics.uci.edu"
+
+
+def response(content, status=200):
+    raw = requests.Response()
+    raw._content = content
+    raw.status_code = status
+    return Response({"url": SITE, "status": status, "response": pickle.dumps(raw)})
+
+
+def test_rows_read_back_and_aggregate(tmp_path):
+    path = str(tmp_path / "history.bin")
+    history = CrawlHistory(path, batch_size=3, restart=True)
+    for i in range(7):
+        host = f"h{i % 2}.ics.uci.edu"
+        history.append(f"https://{host}/p{i}", host, 200, 0.5 * i, 100 * i, 10 * i,
+                       "near_duplicate" if i % 3 == 0 else "scraped", i)
+    history.append(f"{SITE}/gone", "www.ics.uci.edu", None, None, 0, 0, "failed", 0)
+    history.close()
+
+    reader = HistoryReader(path)
+    assert len(reader) == 8
+    rows = list(reader.rows(["url", "status", "bytes", "verdict"]))
+    assert rows[1] == {"url": "https://h1.ics.uci.edu/p1", "status": 200, "bytes": 100,
+                       "verdict": "scraped"}
+    assert rows[-1]["status"] == -1
+    groups = reader.aggregate("host", "latency")
+    assert groups["h0.ics.uci.edu"]["count"] == 4
+    assert groups["h0.ics.uci.edu"]["max"] == 3.0
+    near = reader.aggregate("host", where=lambda row: row["verdict"] == "near_duplicate",
+                            columns=["verdict"])
+    assert {host: group["count"] for host, group in near.items()} == {
+        "h0.ics.uci.edu": 2, "h1.ics.uci.edu": 1}
+
+
+def test_torn_chunk_is_dropped_on_reopen(tmp_path):
+    path = str(tmp_path / "history.bin")
+    history = CrawlHistory(path, batch_size=2, restart=True)
+    for i in range(4):
+        history.append(f"{SITE}/p{i}", "www.ics.uci.edu", 200, 0.1, 10, 50, "scraped", 1)
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)
+
+    assert len(HistoryReader(path)) == 2
+    history = CrawlHistory(path, batch_size=2)
+    history.append(f"{SITE}/p4", "www.ics.uci.edu", 200, 0.1, 10, 50, "scraped", 1)
+    history.close()
+    assert [row["url"] for row in HistoryReader(path).rows(["url"])] == [
+        f"{SITE}/p0", f"{SITE}/p1", f"{SITE}/p4"]
+
+
+def test_bytes_is_the_pickled_size_before_and_after_unpickling(tmp_path):
+    path = str(tmp_path / "history.bin")
+    history = CrawlHistory(path, restart=True)
+    skipped, scraped = response(b"x" * 10), response(b"y" * 1000)
+    sizes = [skipped.pickled_size, scraped.pickled_size]
+    history.record(f"{SITE}/skipped", skipped, 0.1, "skipped")
+    assert scraped.raw_response.content == b"y" * 1000
+    history.record(f"{SITE}/scraped", scraped, 0.1, "scraped", word_count=1)
+    history.record(f"{SITE}/timeout", None, 5.0, "failed")
+    history.close()
+
+    assert [row["bytes"] for row in HistoryReader(path).rows(["bytes"])] == sizes + [0]
+    assert sizes[1] > 1000
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+import utils.linkgraph
+from utils.linkgraph import LinkGraph
+
+SITE = "https://www.ics.uci.edu"
+
+
+def random_pages(nodes=60, seed=3):
+    """ {url: links} of a random graph, some pages without links. """
+    rng = random.Random(seed)
+    urls = [f"{SITE}/p{i}" for i in range(nodes)]
+    return {url: [] if i % 7 == 0 else rng.sample(urls, rng.randint(1, 6))
+            for i, url in enumerate(urls)}
+
+
+def reference_pagerank(pages, damping=0.85, iterations=200):
+    urls = list(pages)
+    rank = {url: 1.0 / len(urls) for url in urls}
+    for _ in range(iterations):
+        dangling = sum(rank[url] for url in urls if not set(pages[url]) - {url})
+        new_rank = {url: (1.0 - damping + damping * dangling) / len(urls) for url in urls}
+        for url in urls:
+            links = set(pages[url]) - {url}
+            for link in links:
+                new_rank[link] += damping * rank[url] / len(links)
+        rank = new_rank
+    return rank
+
+
+def build(path, pages, **options):
+    graph = LinkGraph(str(path), restart=True, **options)
+    for url, links in pages.items():
+        graph.add_page(url, links)
+    return graph
+
+
+def test_csr_holds_each_edge_once(tmp_path):
+    graph = build(tmp_path / "graph", {
+        f"{SITE}/a": [f"{SITE}/b", f"{SITE}/b#top", f"{SITE}/c", f"{SITE}/a"],
+        f"{SITE}/b": [f"{SITE}/c"],
+    }, compact_edges=2, merge_ids=2)
+    offsets, targets = graph.csr()
+    name = {node: url[len(SITE) + 1:] for node, url in graph.urls(range(3)).items()}
+    edges = {(name[src], name[dst])
+             for src in range(3) for dst in targets[offsets[src]:offsets[src + 1]]}
+    assert len(targets) == 3
+    assert edges == {("a", "b"), ("a", "c"), ("b", "c")}
+    assert {name[node]: d for node, d in enumerate(graph.in_degree())} == {"a": 0, "b": 1, "c": 2}
+    assert graph.in_link_count(f"{SITE}/c#x") == 2
+    assert graph.in_link_count(f"{SITE}/unknown") == 0
+
+
+def test_reload_from_files(tmp_path):
+    pages = random_pages()
+    graph = build(tmp_path / "graph", pages, merge_ids=16)
+    graph.close()
+    before = graph.csr()
+
+    reloaded = LinkGraph(str(tmp_path / "graph"))
+    assert reloaded.csr() == before
+    for url in pages:
+        assert reloaded.in_link_count(url) == graph.in_link_count(url)
+    assert reloaded.urls(range(5)) == graph.urls(range(5))
+    assert reloaded.urls([0]) == {0: f"{SITE}/p0"}
+
+
+@pytest.mark.parametrize("vectorized", [True, False], ids=["numpy", "array"])
+def test_pagerank_matches_reference(tmp_path, monkeypatch, vectorized):
+    if vectorized and utils.linkgraph.numpy is None:
+        pytest.skip("numpy is not installed")
+    if not vectorized:
+        monkeypatch.setattr(utils.linkgraph, "numpy", None)
+    pages = random_pages()
+    graph = build(tmp_path / "graph", pages, compact_edges=50, merge_ids=16)
+    ranks = graph.pagerank(tolerance=1e-12, iterations=200)
+    expected = reference_pagerank(pages)
+    urls = graph.urls(range(len(ranks)))
+    assert sum(ranks) == pytest.approx(1.0)
+    for node, score in enumerate(ranks):
+        assert score == pytest.approx(expected[urls[node]], rel=1e-6)
+    assert graph.top(ranks, 1)[0][0] == max(expected, key=expected.get)
+
+
+def test_pagerank_of_empty_graph(tmp_path):
+    assert len(LinkGraph(str(tmp_path / "graph"), restart=True).pagerank()) == 0
@@ -0,0 +1,109 @@
+import logging
+import time
+
+import pytest
+
+import utils
+from utils import RateLimitFilter, configure_logging, get_logger
+
+
+class Clock(object):
+    """ Stands in for the time module in utils. """
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(utils, "time", clock)
+    return clock
+
+
+def record(level=logging.INFO, msg="fetched %s", args=("url",)):
+    return logging.LogRecord("TEST", level, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_drops_info_and_notes_the_count(clock):
+    log_filter = RateLimitFilter(3)
+    passed = [log_filter.filter(record()) for _ in range(5)]
+    assert passed == [True, True, True, False, False]
+    assert log_filter.filter(record(logging.WARNING))
+    assert log_filter.filter(record(logging.ERROR))
+
+    clock.now += 1
+    late = record()
+    assert log_filter.filter(late)
+    assert late.getMessage() == "fetched url (2 earlier messages suppressed)"
+    assert [log_filter.filter(record()) for _ in range(3)] == [True, True, False]
+    # the bucket refills at rate per second
+    clock.now += 0.4
+    assert [log_filter.filter(record()) for _ in range(2)] == [True, False]
+
+
+def test_rate_zero_is_unlimited(clock):
+    log_filter = RateLimitFilter(0)
+    assert all(log_filter.filter(record()) for _ in range(1000))
+
+
+def wait_for(path, text, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists() and text in path.read_text():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_records_reach_the_log_file_through_the_queue(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logger = get_logger("TESTQUEUE", "TESTQUEUEFILE")
+    assert get_logger("TESTQUEUE", "TESTQUEUEFILE") is logger
+    assert len(logger.handlers) == 1
+    try:
+        # the limit only applies to the console
+        configure_logging(2)
+        for i in range(5):
+            logger.info(f"page {i}")
+        logger.error("boom")
+        path = tmp_path / "Logs" / "TESTQUEUEFILE.log"
+        assert wait_for(path, "boom")
+        lines = path.read_text().splitlines()
+        assert [line.split(" - ")[-1] for line in lines] == [
+            "page 0", "page 1", "page 2", "page 3", "page 4", "boom"]
+    finally:
+        configure_logging(100)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_only_the_console_is_rate_limited(clock, monkeypatch):
+    log_file = ListHandler()
+    monkeypatch.setitem(utils._log_files, "TESTFILE", log_file)
+    monkeypatch.setitem(utils._log_filters, "TEST", RateLimitFilter(2))
+    router = utils._LogRouter(logging.Formatter("%(message)s"))
+    router.console = ListHandler()
+
+    def emit(msg, level=logging.INFO):
+        entry = record(level, msg, None)
+        entry.log_file = "TESTFILE"
+        router.emit(entry)
+
+    for i in range(4):
+        emit(f"page {i}")
+    emit("boom", logging.ERROR)
+    clock.now += 1
+    emit("after")
+    assert log_file.messages == ["page 0", "page 1", "page 2", "page 3", "boom", "after"]
+    assert router.console.messages == [
+        "page 0", "page 1", "boom", "after (2 earlier messages suppressed)"]
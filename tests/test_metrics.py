@@ -0,0 +1,25 @@
+import threading
+
+from utils.metrics import Metrics, TimedLock
+
+
+def test_part_histograms_are_reported_merged():
+    registry = Metrics()
+    locks = [TimedLock(threading.Lock(), f"lock_wait.{i}", registry) for i in range(3)]
+    assert len({id(lock.histogram) for lock in locks}) == 3
+    for i, lock in enumerate(locks):
+        for _ in range(i + 1):
+            with lock:
+                pass
+    registry.observe("lock_wait.extra", 5.0)
+
+    histograms = registry.snapshot()["histograms"]
+    assert [histograms[f"lock_wait.{i}"]["count"] for i in range(3)] == [1, 2, 3]
+    # only numbered parts are merged
+    assert histograms["lock_wait"]["count"] == 6
+    assert histograms["lock_wait"]["max_ms"] < 5000
+
+
+def test_shards_time_their_locks_separately(make_frontier):
+    frontier = make_frontier(FRONTIERSHARDS=4)
+    assert len({id(shard.lock.histogram) for shard in frontier.shards}) == 4
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from utils.minhash import MinHasher, LSHIndex
+
+
+def text_of(words=300, seed=0):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(2000)}" for _ in range(words))
+
+
+def edited(text, changes, seed=0):
+    """ text with `changes` words replaced. """
+    rng = random.Random(seed)
+    words = text.split()
+    for i in rng.sample(range(len(words)), changes):
+        words[i] = f"new{i}"
+    return " ".join(words)
+
+
+def test_signature_estimates_jaccard(dup_state):
+    minhasher = MinHasher(256)
+    base = text_of()
+    for changes in (5, 20, 60):
+        other = edited(base, changes)
+        a, b = dup_state.get_shingles(base), dup_state.get_shingles(other)
+        estimate = minhasher.similarity(
+            minhasher.signature_from_hashes(a), minhasher.signature_from_hashes(b))
+        assert estimate == pytest.approx(dup_state.jaccard_similarity(a, b), abs=0.1)
+    assert minhasher.signature_from_hashes(set()) is None
+
+
+def test_signatures_are_stable_across_instances():
+    shingles = {"a b c", "b c d"}
+    assert MinHasher(64).signature(shingles) == MinHasher(64).signature(shingles)
+
+
+def test_lsh_finds_near_duplicates_only():
+    minhasher = MinHasher(128)
+    index = LSHIndex(128, 32)
+    texts = [text_of(seed=seed) for seed in range(20)]
+    for i, text in enumerate(texts):
+        index.insert(f"page{i}", minhasher.signature(text.split()))
+    assert len(index) == 20
+
+    near = minhasher.signature(edited(texts[7], 3).split())
+    assert 7 in index.query(near)
+    assert list(index.signature(7)) == list(minhasher.signature(texts[7].split()))
+    unrelated = minhasher.signature(text_of(seed=99).split())
+    assert all(minhasher.similarity(unrelated, index.signature(p)) < 0.6
+               for p in index.query(unrelated))
+
+
+@pytest.mark.parametrize("method", ["minhash", "jaccard"])
+def test_is_near_duplicate(dup_state, monkeypatch, method):
+    monkeypatch.setattr(dup_state, "NEAR_DUPLICATE_METHOD", method)
+    base = text_of()
+    assert dup_state.is_near_duplicate("https://www.ics.uci.edu/a", base) == (False, None, 0.0)
+
+    found, url, similarity = dup_state.is_near_duplicate(
+        "https://www.ics.uci.edu/b", edited(base, 5))
+    assert (found, url) == (True, "https://www.ics.uci.edu/a")
+    assert similarity >= dup_state.NEAR_DUPLICATE_THRESHOLD
+
+    found, _, _ = dup_state.is_near_duplicate("https://www.ics.uci.edu/c", text_of(seed=5))
+    assert not found
@@ -0,0 +1,37 @@
+import threading
+import time
+
+from crawler.persistence import WriteBehindStore
+
+
+class SlowDb(dict):
+    """ A dbm stand-in whose writes take a while. """
+    def __setitem__(self, key, value):
+        time.sleep(0.001)
+        super().__setitem__(key, value)
+
+    def close(self):
+        pass
+
+
+def test_reads_do_not_wait_for_a_whole_flush(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = WriteBehindStore(str(tmp_path / "save"), batch_size=10 ** 6, flush_interval=3600)
+    store.db.close()
+    store.db = SlowDb({b"old": b"1"})
+    for i in range(300):
+        store[b"%d" % i] = b"0"
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    time.sleep(0.05)
+
+    waits = []
+    while flusher.is_alive():
+        start = time.perf_counter()
+        # an entry being flushed, one already on disk and a missing one
+        assert b"299" in store and b"old" in store and b"new" not in store
+        waits.append(time.perf_counter() - start)
+    flusher.join()
+    assert len(waits) > 10 and max(waits) < 0.25
+    assert len(store) == 301
+    store.close()
@@ -0,0 +1,53 @@
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import drain, make_config
+from crawler.pipeline import ParsePipeline
+
+SITE = "https://www.ics.uci.edu"
+
+
+def page(url, words=60):
+    body = " ".join(f"word{i}" for i in range(words))
+    content = f"<html><body><p>{body}</p><a href='{SITE}/next'>next</a></body></html>"
+    return SimpleNamespace(url=url, status=200, pickled_size=len(content),
+                           raw_response=SimpleNamespace(content=content.encode()))
+
+
+@pytest.fixture
+def broken_pipeline(make_frontier, dup_state, monkeypatch):
+    """ A frontier and a pipeline whose process pool refuses every page. """
+    frontier = make_frontier()
+    pipeline = ParsePipeline(make_config(PARSEPROCESSES=1), frontier)
+
+    def refuse(*args, **kwargs):
+        raise BrokenProcessPool("a parse process died")
+
+    monkeypatch.setattr(pipeline.executor, "submit", refuse)
+    yield frontier, pipeline
+    pipeline.shutdown()
+
+
+def test_pages_are_analyzed_in_process_once_the_pool_is_broken(broken_pipeline):
+    frontier, pipeline = broken_pipeline
+    url, _ = frontier.get_tbd_url()
+    pipeline.submit(url, page(url))
+    pipeline.shutdown()
+
+    assert not pipeline.busy()
+    assert pipeline.slots.acquire(blocking=False)
+    assert frontier.completed == 1
+    assert drain(frontier) == [f"{SITE}/next"]
+
+
+def test_failed_submit_gives_its_slot_back(broken_pipeline, monkeypatch):
+    frontier, pipeline = broken_pipeline
+    url, _ = frontier.get_tbd_url()
+    unreadable = page(url)
+    unreadable.raw_response = None
+    for _ in range(pipeline.config.parse_queue_size + 1):
+        with pytest.raises(AttributeError):
+            pipeline.submit(url, unreadable)
+    assert not pipeline.busy()
@@ -0,0 +1,78 @@
+import pytest
+
+from crawler.priority import make_policy, BestFirstPolicy, FifoPolicy
+from conftest import drain
+
+HOSTS = [f"https://h{i}.ics.uci.edu" for i in range(8)]
+
+
+def test_seeds_go_before_links_of_every_shard(make_frontier):
+    frontier = make_frontier(SEEDURL=",".join(HOSTS))
+    assert len({id(frontier._shard(host[8:])) for host in HOSTS}) > 1
+    first, _ = frontier.get_tbd_url()
+    links = [f"{host}/page" for host in HOSTS]
+    for link in links:
+        frontier.add_url(link, parent=first)
+
+    urls = drain(frontier)
+    assert set(urls[:len(HOSTS) - 1]) == set(HOSTS) - {first}
+    assert set(urls[len(HOSTS) - 1:]) == set(links)
+
+
+def test_fifo_keeps_discovery_order_across_shards(make_frontier):
+    seeds = [f"{host}/a/b/c?page=2" for host in HOSTS] + HOSTS
+    frontier = make_frontier(SEEDURL=",".join(seeds), PRIORITYPOLICY="fifo")
+    assert isinstance(frontier.policy, FifoPolicy)
+    assert drain(frontier) == seeds
+
+
+def test_bestfirst_puts_likely_content_first(make_frontier):
+    frontier = make_frontier(SEEDURL=HOSTS[0])
+    seed, _ = frontier.get_tbd_url()
+    links = [
+        f"{seed}/people/list?sort=name",
+        f"{seed}/login",
+        f"{seed}/research/areas",
+        f"{seed}/about",
+    ]
+    for link in links:
+        frontier.add_url(link, parent=seed)
+    assert drain(frontier) == links[::-1]
+
+
+def test_url_found_closer_to_a_seed_moves_up(make_frontier):
+    frontier = make_frontier(SEEDURL=HOSTS[0])
+    seed, _ = frontier.get_tbd_url()
+    frontier.add_url(f"{seed}/hub", parent=seed)
+    hub, _ = frontier.get_tbd_url()
+    deep, moved = f"{seed}/deep", f"{seed}/moved"
+    frontier.add_url(deep, parent=hub)
+    frontier.add_url(moved, parent=hub)
+    shard = frontier._shard(seed[8:])
+    assert shard.queued[moved][1] == 2
+
+    # found on the seed too: depth 1 now, and it goes first
+    frontier.add_url(moved, parent=seed)
+    assert shard.queued[moved][1] == 1
+    # found deeper again: keeps depth 1
+    frontier.add_url(moved, parent=hub)
+    assert shard.queued[moved][1] == 1
+    assert frontier.tbd_count == 2
+    assert drain(frontier) == [moved, deep]
+
+
+def test_wasteful_hosts_go_last(make_frontier):
+    frontier = make_frontier(SEEDURL=",".join(HOSTS[:2]))
+    for i in range(10):
+        frontier.record_verdict(f"{HOSTS[0]}/dup{i}", "exact_duplicate")
+    frontier.record_verdict(f"{HOSTS[0]}/retried", "retry")
+    frontier.record_verdict(f"{HOSTS[1]}/page", "ok")
+    assert frontier.policy.hosts[HOSTS[0][8:]] == [10, 10]
+    assert drain(frontier) == [HOSTS[1], HOSTS[0]]
+
+
+def test_make_policy():
+    assert isinstance(make_policy("BestFirst", None), BestFirstPolicy)
+    assert isinstance(make_policy("crawler.priority.FifoPolicy", None), FifoPolicy)
+    with pytest.raises(ValueError):
+        make_policy("shortest", None)
@@ -0,0 +1,52 @@
+from collections import Counter
+
+from crawler.report import CrawlReport, SubdomainIndex
+from utils.wordstats import WordStats
+
+HOSTS = ["https://b.ics.uci.edu", "https://a.ics.uci.edu", "https://c.stat.uci.edu"]
+
+
+def test_subdomain_index_sums_shards_in_order():
+    class Shard(object):
+        def __init__(self, **counts):
+            self.subdomains = Counter(counts)
+
+    first, second = Shard(b=2, a=1), Shard(b=3)
+    index = SubdomainIndex()
+    index.add("b", first)
+    index.add("a", first)
+    index.add("b", second)
+    index.add("b", first)
+    assert list(index.counts()) == [("a", 1), ("b", 5)]
+    assert len(index) == 2
+    # counts are read when listed, not when added
+    first.subdomains["a"] += 4
+    assert list(index.counts())[0] == ("a", 5)
+
+
+def test_report_follows_the_crawl(make_frontier, tmp_path):
+    frontier = make_frontier(SEEDURL=",".join(HOSTS))
+    words = WordStats(str(tmp_path / "words"), merge_pages=10)
+    report = CrawlReport(frontier, words, path=tmp_path / "crawl_stats.txt", top_words=2)
+
+    assert report.write()
+    text = report.path.read_text()
+    assert "UNIQUE URLS (count): 3\n" in text
+    assert "a.ics.uci.edu, 1\nb.ics.uci.edu, 1\nc.stat.uci.edu, 1" in text
+    assert "LONGEST PAGE:\nN/A" in text
+    # nothing discovered or completed since: not rewritten
+    assert not report.write()
+
+    url, _ = frontier.get_tbd_url()
+    frontier.add_url(f"{HOSTS[0]}/page", parent=url)
+    words.record(url, Counter(crawler=3, uci=2, ics=1), 6)
+    frontier.mark_url_complete(url)
+    assert report.write()
+    text = report.path.read_text()
+    assert "UNIQUE URLS (count): 4\n" in text
+    assert "b.ics.uci.edu, 2" in text
+    assert f"URL : {url}\nWord Count : 6" in text
+    assert "TOP-2 WORDS:\ncrawler 3\nuci 2\n" in text
+    assert not list(tmp_path.glob("*.tmp"))
+    assert report.write(force=True)
+    words.close()
@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+import utils.download
+from benchmarks.fake_cache_server import FakeCacheServer, SyntheticWeb
+from conftest import make_config
+from utils.download import download, cache_response
+from utils.response_cache import ResponseCache
+
+SITE = "https://www.ics.uci.edu"
+
+
+def test_put_get_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    assert cache.get(f"{SITE}/a") is None
+    cache.put(f"{SITE}/a", b"body" * 100)
+    assert cache.get(f"{SITE}/a") == b"body" * 100
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    assert 0 < stats["bytes"] < 400
+
+
+def test_least_recently_used_go_first_across_restarts(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = ResponseCache(directory)
+    for name in "abc":
+        cache.put(f"{SITE}/{name}", os.urandom(1000))
+        # modification times order the entries after a restart
+        time.sleep(0.01)
+    cache.get(f"{SITE}/a")
+    size = cache.stats()["bytes"]
+
+    reopened = ResponseCache(directory, max_bytes=size - 1)
+    assert reopened.get(f"{SITE}/b") is None
+    assert reopened.get(f"{SITE}/a") is not None
+    assert reopened.get(f"{SITE}/c") is not None
+    assert reopened.stats()["entries"] == 2
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    cache.put(f"{SITE}/a", b"body")
+    path = cache._path(next(iter(cache.entries)))
+    with open(path, "wb") as f:
+        f.write(b"not zlib")
+    assert cache.get(f"{SITE}/a") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def server():
+    server = FakeCacheServer(SyntheticWeb(pages=20)).start()
+    yield server
+    server.stop()
+
+
+def cache_config(tmp_path, server, **options):
+    config = make_config(RESPONSECACHE=tmp_path / "responses", **options)
+    config.cache_server = server.address
+    return config
+
+
+def test_download_then_replay(tmp_path, monkeypatch, server):
+    monkeypatch.setattr(utils.download, "_response_cache", None)
+    monkeypatch.setattr(utils.download, "_session", None)
+    url = server.web.seed_urls[0]
+    config = cache_config(tmp_path, server)
+    first = download(url, config)
+    assert first.status == 200
+    assert download(url, config).raw_response.content == first.raw_response.content
+    assert server.requests == 1
+
+    monkeypatch.setattr(utils.download, "_response_cache", None)
+    replay = cache_config(tmp_path, server, REPLAY=True)
+    assert download(url, replay).raw_response.content == first.raw_response.content
+    missing = download(f"{SITE}/not-cached", replay)
+    assert missing.status is None and "replay mode" in missing.error
+    assert server.requests == 1
+
+
+def test_cache_server_errors_are_not_cached(tmp_path, monkeypatch, server):
+    monkeypatch.setattr(utils.download, "_response_cache", None)
+    config = cache_config(tmp_path, server)
+    cache_response(f"{SITE}/refused", config, b"body", {"status": 603})
+    cache_response(f"{SITE}/missing", config, b"body", {"status": 404})
+    cache = utils.download.get_response_cache(config)
+    assert cache.get(f"{SITE}/refused") is None
+    assert cache.get(f"{SITE}/missing") == b"body"
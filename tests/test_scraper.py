@@ -0,0 +1,188 @@
+import itertools
+import random
+import re
+
+from urllib.parse import urlparse
+
+import pytest
+
+import scraper
+from scraper import ParsedPage, is_low_information, is_valid, to_crawl
+
+
+def page_of(text):
+    return ParsedPage("https://www.ics.uci.edu/page", f"<html><body><p>{text}</p></body></html>".encode())
+
+
+def reference_is_low_information(text):
+    """ The check as it read before pages were tokenized in one pass. """
+    RE_UPDATE = re.compile(r'^update\s*-\s*\d{4}-\d{2}-\d{2}', re.I)
+    RE_SHA7   = re.compile(r'\b[a-f0-9]{7}\b', re.I)
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    if not lines:
+        return True
+    tokens = re.findall(r"[A-Za-z0-9']+", text)
+    unique_ratio = len(set(tokens)) / len(tokens) if tokens else 0
+    update_ratio = sum(bool(RE_UPDATE.match(ln)) for ln in lines) / len(lines)
+    sha_density  = len(RE_SHA7.findall(text)) / max(1, len(tokens))
+    return (unique_ratio < 0.05) or (update_ratio > 0.6) or (sha_density > 0.10)
+
+
+@pytest.mark.parametrize("text, low", [
+    ("", True),
+    # 5 distinct of 100 tokens is not below 5%; 4 of 100 is
+    (" ".join(["alpha", "beta", "gamma", "delta", "epsilon"] * 20), False),
+    (" ".join(["alpha", "beta", "gamma", "delta"] * 25), True),
+    # case and apostrophes make tokens distinct
+    (" ".join(["Data", "data", "DATA", "don't", "dont"] * 20), False),
+    # 10 hashes in 100 tokens is not above 10%; 11 are
+    (" ".join(["ab12cd3"] * 10 + [f"word{i}" for i in range(90)]), False),
+    (" ".join(["AB12CD3"] * 11 + [f"word{i}" for i in range(89)]), True),
+    # an underscore joins a hash to its neighbour
+    (" ".join(["ab12cd3_x"] * 11 + [f"word{i}" for i in range(89)]), False),
+    ("update - 2024-01-02 fixed the build " + " ".join(f"w{i}" for i in range(50)), True),
+], ids=["empty", "five-words", "four-words", "case", "ten-hashes", "eleven-hashes",
+        "underscore", "update-line"])
+def test_low_information_thresholds(text, low):
+    assert is_low_information(page_of(text)) == low
+    assert reference_is_low_information(page_of(text).text) == low
+
+
+def test_low_information_matches_reference():
+    rng = random.Random(7)
+    vocabulary = ["Data", "data", "don't", "can't", "ab12cd3", "DEADBEE", "dead_beef",
+                  "café", "naïve", "x1", "1234567", "update", "-", "2024-01-02"]
+    for _ in range(300):
+        size = rng.randint(1, 60)
+        distinct = rng.randint(1, len(vocabulary))
+        words = [rng.choice(vocabulary[:distinct]) for _ in range(size)]
+        page = page_of(" ".join(words))
+        assert is_low_information(page) == reference_is_low_information(page.text)
+
+
+def test_page_tokens_match_both_tokenizers():
+    rng = random.Random(11)
+    pieces = ["Data", "data", "don't", "'", "''", "o'_x", "_", "dead_beef", "café",
+              "naïve", "x1", "1234567", "AB12CD3", "it's'", "-", ".", "ü'n"]
+    for _ in range(300):
+        text = rng.choice(["", " "]).join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+        tokens = scraper.PageTokens(text)
+        words = [w.lower() for w in re.findall(r"\w+", text)]
+        cased = re.findall(r"[A-Za-z0-9']+", text)
+        assert tokens.total == len(words), text
+        assert (tokens.cased_total, tokens.cased_distinct) == (len(cased), len(set(cased))), text
+        assert tokens.hex_tokens == sum(bool(re.fullmatch(r"[a-f0-9]{7}", w)) for w in words)
+
+
+def test_page_text_and_links_do_not_depend_on_each_other():
+    content = (b"<html><head><style>p {color: red}</style></head><body><p>Visible <b>words</b></p>"
+               b"<script>var hidden = 1;</script><a href='/next'>next</a></body></html>")
+    url = "https://www.ics.uci.edu/page"
+    links_first = ParsedPage(url, content)
+    links_first.links
+    text_first = ParsedPage(url, content)
+    assert text_first.text == links_first.text == "Visible words next"
+    assert "links" not in vars(text_first)
+    assert text_first.links == links_first.links == {"https://www.ics.uci.edu/next"}
+
+
+def reference_is_trap(url, parsed):
+    """ The trap rules as is_valid applied them, one regex at a time, before they were compiled. """
+    query_parts = parsed.query.lower().split('&')
+    if len(query_parts) > 5 or len(url) > 300:
+        return True
+    if parsed.path.count('/') > 10 or len(parsed.query) > 200:
+        return True
+    if re.search(r'\d{4}[-/]\d{2}[-/]\d{2}$', parsed.path) or re.search(r'\d{4}[-/]\d{2}$', parsed.path):
+        return True
+    for p in ('page=', 'start=', 'offset='):
+        m = re.search(rf'{p}(\d+)', parsed.query)
+        if m and int(m.group(1)) > 5:
+            return True
+    if any(part.startswith(p) for p in ('session=', 'sid=', 'token=', 'jsessionid=')
+           for part in query_parts):
+        return True
+    if "action=download" in parsed.query.lower():
+        return True
+    if any(part.startswith(('version=', 'do=', 'rev=')) for part in query_parts):
+        return True
+    if any(trap in parsed.path.lower() for trap in ['diff', 'media', 'history']):
+        return True
+    if re.search(r'\.(php|aspx|jsp)$', parsed.path.lower()):
+        if any(key in parsed.query.lower() for key in ('id=', 'files=')):
+            return True
+    if re.search(r'[a-fA-F0-9]{32,}', parsed.path) or re.search(r'[a-fA-F0-9]{32,}', parsed.query):
+        return True
+    if '/-/' in url:
+        if url.rstrip('/').endswith(scraper.GITLAB_BAN_PATHS):
+            return True
+        if parsed.path.endswith('/compare'):
+            return True
+        if re.search(r'/(commit|tree|compare)/[a-fA-F0-9]{10,}', parsed.path):
+            return True
+        if parsed.path.startswith('/-/commit') and any(
+                p in parsed.query.lower() for p in ['view=', 'expanded=']):
+            return True
+    if 'idx=' in parsed.query.lower():
+        return True
+    if parsed.scheme in ['tel', 'mailto']:
+        return True
+    path_and_query = parsed.path + "?" + parsed.query
+    return bool(re.search(r'\(\d{3}\)\s?\d{3}-\d{4}', path_and_query)
+                or re.search(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}', path_and_query))
+
+
+def reference_is_valid(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or reference_is_trap(url, parsed):
+        return False
+    domain = parsed.netloc.lower()
+    if not (domain.endswith((".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu",
+                             ".stat.uci.edu")) or domain == "today.uci.edu"):
+        return False
+    if domain == "today.uci.edu" and not parsed.path.startswith(
+            "/department/information_computer_sciences"):
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico|png|tiff?|mid|mp2|mp3|mp4"
+        r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso|epub|dll|cnf|tgz|sha1"
+        r"|thmx|mso|arff|rtf|jar|csv|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+def candidate_urls():
+    """ Combinations of the parts every rule looks at. """
+    hosts = ["www.ics.uci.edu", "vision.ICS.uci.edu", "ics.uci.edu", "www.cs.uci.edu",
+             "www.informatics.uci.edu", "www.stat.uci.edu", "today.uci.edu",
+             "www.uci.edu", "evil-ics.uci.edu.com", "gitlab.ics.uci.edu"]
+    paths = ["", "/", "/about", "/a/b/c/d/e/f/g/h/i/j/k", "/events/2024-01",
+             "/events/2024/01/02", "/events/2024-01/x", "/paper.PDF", "/file.tar.gz",
+             "/x.html", "/wiki/media/x", "/History", "/view.php", "/page.jsp",
+             "/department/information_computer_sciences/news",
+             "/-/commit/0123456789abcdef", "/group/project/-/issues", "/-/compare",
+             "/" + "a" * 32, "/call-(949)555-1234", "/people/jane@ics.uci.edu",
+             "/data", "/archive.csv/", "/js"]
+    queries = ["", "page=3", "page=9", "subpage=12", "page=x&page=7", "start=2&offset=8",
+               "sessionid=1", "session=1", "a=1&sid=2", "SID=2", "action=download",
+               "version=2", "do=edit", "rev=1", "idx=3", "id=4", "files=5", "view=inline",
+               "a&b&c&d&e", "a&b&c&d&e&f", "q=" + "x" * 201, "token=abc"]
+    for scheme, host, path, query in itertools.product(
+            ["http", "https", "ftp", "mailto"], hosts, paths, queries):
+        yield f"{scheme}://{host}{path}" + (f"?{query}" if query else "")
+
+
+def test_is_valid_matches_the_original_rules():
+    checked = 0
+    for url in candidate_urls():
+        assert is_valid(url) == reference_is_valid(url), url
+        assert to_crawl(url) == (not reference_is_trap(url, urlparse(url))), url
+        checked += 1
+    assert checked > 20000
+
+
+def test_is_valid_caches_results():
+    url = "https://www.ics.uci.edu/cached-page"
+    scraper._is_valid.cache_clear()
+    assert is_valid(url) and is_valid(url.encode("utf-8"))
+    info = scraper._is_valid.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
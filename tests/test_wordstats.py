@@ -0,0 +1,106 @@
+import random
+import threading
+
+from collections import Counter
+
+from utils.wordstats import SpaceSaving, WordStats
+
+
+def skewed_pages(pages=200, seed=1):
+    """
+    Pages of a few heavy words buried in a long tail of rare ones. The
+    heavy words only show up after the tail has filled small summaries,
+    so they enter them with an error.
+    """
+    rng = random.Random(seed)
+    heavy = [f"heavy{i}" for i in range(5)]
+    for page in range(pages):
+        words = Counter()
+        for i, word in enumerate(heavy):
+            if page >= 20:
+                words[word] += rng.randint(1, 10 - i)
+        for _ in range(20):
+            words[f"rare{rng.randrange(5000)}"] += 1
+        yield f"https://www.ics.uci.edu/p{page}", words
+
+
+def test_space_saving_bounds_and_candidates():
+    truth = Counter()
+    summary = SpaceSaving(capacity=20)
+    for _, words in skewed_pages():
+        for word, count in words.items():
+            truth[word] += count
+            summary.update(word, count)
+
+    assert len(summary) == 20
+    for word, count in summary.counts.items():
+        # count - error <= true count <= count
+        assert count - summary.errors[word] <= truth[word] <= count
+    assert set(w for w, _ in truth.most_common(5)) <= set(summary.candidates(5))
+
+
+def test_top_words_are_exact_after_evictions_and_spills(tmp_path):
+    truth = Counter()
+    stats = WordStats(str(tmp_path / "words"), top_capacity=20, merge_pages=3,
+                      memory_words=50)
+    for url, words in skewed_pages():
+        truth.update(words)
+        stats.record(url, words, sum(words.values()))
+    stats.flush()
+
+    assert stats.top(5) == truth.most_common(5)
+    assert stats.spill_db is not None
+    assert stats.count("rare17") == truth["rare17"]
+    stats.close()
+
+
+def test_counts_from_many_threads(tmp_path):
+    stats = WordStats(str(tmp_path / "words"), merge_pages=7, memory_words=10)
+    pages = list(skewed_pages(pages=400))
+    truth = Counter()
+    for _, words in pages:
+        truth.update(words)
+
+    def work(part):
+        for url, words in part:
+            stats.record(url, words, sum(words.values()))
+
+    threads = [threading.Thread(target=work, args=(pages[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.flush()
+
+    assert stats.top(5) == truth.most_common(5)
+    assert all(stats.count(word) == truth[word] for word in ("heavy0", "rare3", "rare4999"))
+    longest = max(pages, key=lambda page: sum(page[1].values()))
+    assert stats.longest_page[1] == sum(longest[1].values())
+    stats.close()
+
+
+def test_count_waits_for_counts_being_spilled(tmp_path, monkeypatch):
+    stats = WordStats(str(tmp_path / "words"), merge_pages=1, memory_words=1)
+    spilling, resume = threading.Event(), threading.Event()
+    spill = stats._spill
+
+    def slow_spill(counts):
+        spilling.set()
+        resume.wait(5)
+        spill(counts)
+
+    monkeypatch.setattr(stats, "_spill", slow_spill)
+    writer = threading.Thread(target=stats.record, args=("page", {"data": 3, "web": 1}, 4))
+    writer.start()
+    assert spilling.wait(5)
+    counts = []
+    reader = threading.Thread(target=lambda: counts.append(stats.count("data")))
+    reader.start()
+    # the counts are in neither place yet, so the reader waits for the spill
+    reader.join(0.2)
+    assert reader.is_alive()
+    resume.set()
+    writer.join()
+    reader.join()
+    assert counts == [3]
+    stats.close()
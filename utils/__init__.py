@@ -1,24 +1,126 @@
+import atexit
 import os
 import logging
+import queue
+import threading
+import time
 from hashlib import sha256
+from logging.handlers import QueueHandler, QueueListener
 from urllib.parse import urlparse
 
+# Loggers only put their records on _log_queue; one listener thread formats
+# them and does the console and file writes, so a log call on a hot path
+# costs a queue put instead of two synchronous writes.
+_log_queue = queue.SimpleQueue()
+_log_listener = None
+_log_files = dict()  # file name -> FileHandler
+_log_filters = dict()  # logger name -> RateLimitFilter of its console output
+_log_lock = threading.Lock()
+# INFO records per second each logger may write to the console, 0 for no
+# limit; see LOGRATE. The log files always get every record.
+_log_rate = 100
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket over INFO and lower records: on average at most `rate`
+    records per second pass, in bursts of up to `rate`. Warnings and errors
+    always pass. The number of records dropped is noted on the next record
+    that passes.
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} earlier messages suppressed)"
+            record.args = None
+        return True
+
+
+class _LogQueueHandler(QueueHandler):
+    """ Tags each record with its log file and queues it unformatted. """
+    def __init__(self, log_file):
+        super().__init__(_log_queue)
+        self.log_file = log_file
+
+    def prepare(self, record):
+        # the listener runs in this process, so formatting can wait for it
+        record.log_file = self.log_file
+        return record
+
+
+class _LogRouter(logging.Handler):
+    """
+    Listener side: writes a record to its log file and, within the rate
+    limit of its logger, to the console.
+    """
+    def __init__(self, formatter):
+        super().__init__()
+        self.console = logging.StreamHandler()
+        self.console.setLevel(logging.INFO)
+        self.console.setFormatter(formatter)
+
+    def emit(self, record):
+        # the file first: the filter adds its suppressed count to the message
+        _log_files[record.log_file].handle(record)
+        if record.levelno >= self.console.level:
+            log_filter = _log_filters.get(record.name)
+            if log_filter is None or log_filter.filter(record):
+                self.console.handle(record)
+
+
+def configure_logging(rate):
+    """ Set the per-logger rate limit (LOGRATE) of existing and future loggers. """
+    global _log_rate
+    with _log_lock:
+        _log_rate = rate
+        for log_filter in _log_filters.values():
+            log_filter.rate = rate
+            log_filter.tokens = min(log_filter.tokens, rate)
+
+
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    if not os.path.exists("Logs"):
-        os.makedirs("Logs")
-    fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
-    fh.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-       "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(formatter)
-    ch.setFormatter(formatter)
-    # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+    with _log_lock:
+        # a logger is set up once, however often it is asked for
+        if any(isinstance(h, _LogQueueHandler) for h in logger.handlers):
+            return logger
+        global _log_listener
+        logger.setLevel(logging.INFO)
+        formatter = logging.Formatter(
+           "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        log_file = filename if filename else name
+        if log_file not in _log_files:
+            if not os.path.exists("Logs"):
+                os.makedirs("Logs")
+            fh = logging.FileHandler(f"Logs/{log_file}.log")
+            fh.setLevel(logging.DEBUG)
+            fh.setFormatter(formatter)
+            _log_files[log_file] = fh
+        if _log_listener is None:
+            _log_listener = QueueListener(_log_queue, _LogRouter(formatter))
+            _log_listener.start()
+            # drain the queue before the interpreter closes the handlers
+            atexit.register(_log_listener.stop)
+        _log_filters[name] = RateLimitFilter(_log_rate)
+        logger.addHandler(_LogQueueHandler(log_file))
     return logger
 
 
@@ -29,6 +131,13 @@ def get_urlhash(url):
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
         f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
 
+def get_urlfingerprint(url):
+    """ 64-bit fingerprint of the same url fields as get_urlhash, as 8 bytes. """
+    parsed = urlparse(url)
+    return sha256(
+        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
+        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).digest()[:8]
+
 def normalize(url):
     if url.endswith("/"):
         return url.rstrip("/")
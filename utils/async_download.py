@@ -0,0 +1,171 @@
+import asyncio
+import cbor
+
+from urllib.parse import urlencode
+
+from utils.download import (
+    cached_response, cache_response, max_body_size, too_large_response, READ_CHUNK_SIZE)
+from utils.response import Response
+
+
+class BodyTooLarge(Exception):
+    """ The cache server's body exceeds the limit passed to AsyncCacheClient.get. """
+
+
+class AsyncCacheClient(object):
+    """
+    Minimal keep-alive HTTP/1.1 client for the cache server, built on
+    asyncio streams. At most `max_connections` requests are on the wire at
+    once; finished connections are parked and reused by later requests.
+    """
+    def __init__(self, host, port, max_connections=100):
+        self.host = host
+        self.port = port
+        self.idle = []
+        self.slots = asyncio.Semaphore(max_connections)
+        self.requests = 0
+        self.new_connections = 0
+
+    async def get(self, params, max_body=None, connect_timeout=None, read_timeout=None):
+        """
+        Send GET /?params and return (status, body bytes). Raises
+        BodyTooLarge, without reading the rest, once the body is known to
+        be longer than max_body bytes, and asyncio.TimeoutError if opening
+        a connection takes longer than connect_timeout or the request and
+        its response longer than read_timeout seconds. The timeouts start
+        once the request has a connection slot, so time spent queued
+        behind other requests does not count.
+        """
+        async with self.slots:
+            self.requests += 1
+            if self.idle:
+                try:
+                    return await asyncio.wait_for(
+                        self._request(self.idle.pop(), params, max_body), read_timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # the server closed the parked connection; use a new one
+                    pass
+            self.new_connections += 1
+            connection = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), connect_timeout)
+            return await asyncio.wait_for(
+                self._request(connection, params, max_body), read_timeout)
+
+    def stats(self):
+        """ Same shape as utils.download.get_connection_stats. """
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused": max(0, self.requests - self.new_connections),
+        }
+
+    async def _request(self, connection, params, max_body):
+        reader, writer = connection
+        try:
+            writer.write(
+                f"GET /?{urlencode(params)} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                f"Connection: keep-alive\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("Connection closed by the cache server.")
+            status = int(status_line.split()[1])
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                chunks = []
+                total = 0
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if size == 0:
+                        await reader.readline()
+                        break
+                    total += size
+                    _check_size(total, max_body)
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readline()
+                body = b"".join(chunks)
+                keep_alive = headers.get("connection", "").lower() != "close"
+            elif "content-length" in headers:
+                length = int(headers["content-length"])
+                _check_size(length, max_body)
+                body = await reader.readexactly(length)
+                keep_alive = headers.get("connection", "").lower() != "close"
+            else:
+                chunks = []
+                total = 0
+                while True:
+                    chunk = await reader.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    _check_size(total, max_body)
+                    chunks.append(chunk)
+                body = b"".join(chunks)
+                keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self.idle.append(connection)
+        else:
+            writer.close()
+        return status, body
+
+    async def close(self):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+
+def _check_size(size, max_body):
+    if max_body is not None and size > max_body:
+        raise BodyTooLarge(f"Body of {size} bytes or more exceeds {max_body} bytes.")
+
+
+async def download_async(url, config, client, logger=None):
+    """ asyncio counterpart of utils.download.download. """
+    resp = await asyncio.to_thread(cached_response, url, config)
+    if resp is not None:
+        return resp
+    try:
+        status, content = await client.get(
+            [("q", f"{url}"), ("u", f"{config.user_agent}")], max_body_size(config),
+            config.connect_timeout, config.read_timeout)
+    except BodyTooLarge:
+        return too_large_response(url, config)
+    except asyncio.TimeoutError:
+        return Response({
+            "error": f"Request Timeout (>{config.read_timeout}s)",
+            "status": None,
+            "url": url
+        })
+    except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+        if logger:
+            logger.error(f"Spacetime connection error {e} with url {url}.")
+        return Response({
+            "error": f"Spacetime connection error {e} with url {url}.",
+            "status": None,
+            "url": url})
+    try:
+        if 200 <= status < 400 and content:
+            resp_dict = cbor.loads(content)
+            await asyncio.to_thread(cache_response, url, config, content, resp_dict)
+            return Response(resp_dict)
+    except (EOFError, ValueError) as e:
+        pass
+    if logger:
+        logger.error(f"Spacetime Response error {status} with url {url}.")
+    return Response({
+        "error": f"Spacetime Response error {status} with url {url}.",
+        "status": status,
+        "url": url})
@@ -0,0 +1,98 @@
+import math
+
+from threading import Lock
+
+
+class BloomFilter(object):
+    """
+    Bloom filter over 64-bit fingerprints given as 8-byte keys.
+
+    Sized for `capacity` items at a false positive rate of `error_rate`
+    (about 9.6 bits per item at 1%). The k bit positions are derived from
+    the fingerprint itself by double hashing, so no extra hashing is done.
+    A negative answer is always right; a positive one must be confirmed.
+    """
+    def __init__(self, capacity=10_000_000, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        fingerprint = int.from_bytes(key, "big")
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def copy(self):
+        other = BloomFilter.__new__(BloomFilter)
+        other.__dict__.update(self.__dict__)
+        other.bits = bytearray(self.bits)
+        return other
+
+
+class PartitionedBloomFilter(object):
+    """
+    Bloom filter split into `partitions` BloomFilters, each sized for an
+    equal share of `capacity` and guarded by its own lock.
+
+    A key's partition comes from the top bits of its fingerprint, which
+    are uniform, so the partitions fill evenly however the keys cluster
+    elsewhere (e.g. a few hosts holding most of the urls). Adds to
+    different partitions never wait on each other; lookups take no lock,
+    since an add only ever sets bits.
+    """
+    def __init__(self, capacity=10_000_000, partitions=16, error_rate=0.01):
+        self.partitions = [
+            BloomFilter(max(1, capacity // partitions), error_rate)
+            for _ in range(partitions)]
+        self.locks = [Lock() for _ in range(partitions)]
+
+    def _index(self, key):
+        return int.from_bytes(key, "big") * len(self.partitions) >> 64
+
+    def add(self, key):
+        index = self._index(key)
+        with self.locks[index]:
+            self.partitions[index].add(key)
+
+    def __contains__(self, key):
+        return key in self.partitions[self._index(key)]
+
+    def __len__(self):
+        return sum(len(partition) for partition in self.partitions)
+
+    def copy(self):
+        other = PartitionedBloomFilter.__new__(PartitionedBloomFilter)
+        other.partitions = []
+        for lock, partition in zip(self.locks, self.partitions):
+            with lock:
+                other.partitions.append(partition.copy())
+        other.locks = [Lock() for _ in other.partitions]
+        return other
+
+    def __getstate__(self):
+        return {"partitions": self.partitions}
+
+    def __setstate__(self, state):
+        self.partitions = state["partitions"]
+        self.locks = [Lock() for _ in self.partitions]
@@ -9,11 +9,52 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.save_batch_size = int(config["LOCAL PROPERTIES"].get("SAVEBATCH", 500))
+        self.save_interval = float(config["LOCAL PROPERTIES"].get("SAVEINTERVAL", 5))
+        self.seen_capacity = int(config["LOCAL PROPERTIES"].get("SEENCAPACITY", 10_000_000))
+        self.frontier_shards = max(1, int(config["LOCAL PROPERTIES"].get("FRONTIERSHARDS", 16)))
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSEPROCESSES", 0))
+        self.parse_queue_size = int(config["LOCAL PROPERTIES"].get("PARSEQUEUE", 64))
+        self.fetch_engine = config["LOCAL PROPERTIES"].get("ENGINE", "threaded").strip().lower()
+        assert self.fetch_engine in ("threaded", "async"), "ENGINE should be threaded or async"
+        self.async_concurrency = int(config["LOCAL PROPERTIES"].get("ASYNCCONCURRENCY", 100))
+        self.response_cache_dir = config["LOCAL PROPERTIES"].get("RESPONSECACHE", "").strip()
+        self.response_cache_size = int(float(config["LOCAL PROPERTIES"].get("RESPONSECACHESIZE", 1024)) * 1024 * 1024)
+        self.replay = config["LOCAL PROPERTIES"].getboolean("REPLAY", False)
+        assert not self.replay or self.response_cache_dir, "REPLAY needs a RESPONSECACHE directory"
+        metrics_port = config["LOCAL PROPERTIES"].get("METRICSPORT", "").strip()
+        self.metrics_port = int(metrics_port) if metrics_port else None
+        self.metrics_file = config["LOCAL PROPERTIES"].get("METRICSFILE", "metrics").strip()
+        self.metrics_interval = float(config["LOCAL PROPERTIES"].get("METRICSINTERVAL", 30))
+        self.history_file = config["LOCAL PROPERTIES"].get("HISTORYFILE", "crawl_history.bin").strip()
+        self.history_batch_size = int(config["LOCAL PROPERTIES"].get("HISTORYBATCH", 4096))
+        self.link_graph = config["LOCAL PROPERTIES"].get("LINKGRAPH", "linkgraph").strip()
+        self.report_interval = float(config["LOCAL PROPERTIES"].get("REPORTINTERVAL", 120))
+        self.log_rate = float(config["LOCAL PROPERTIES"].get("LOGRATE", 100))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.connect_timeout = float(config["CONNECTION"].get("CONNECTTIMEOUT", 3))
+        self.read_timeout = float(config["CONNECTION"].get("READTIMEOUT", 3))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.max_time_delay = max(self.time_delay, float(config["CRAWLER"].get("MAXPOLITENESS", 60)))
+        self.latency_factor = float(config["CRAWLER"].get("LATENCYFACTOR", 1))
+        self.max_retries = int(config["CRAWLER"].get("MAXRETRIES", 3))
+        self.retry_delay = float(config["CRAWLER"].get("RETRYDELAY", 10))
+        self.breaker_failures = max(1, int(config["CRAWLER"].get("BREAKERFAILURES", 5)))
+        self.breaker_cooldown = float(config["CRAWLER"].get("BREAKERCOOLDOWN", 300))
+        self.max_file_size = int(config["CRAWLER"].get("MAXFILESIZE", 10 * 1024 * 1024))
+        self.min_file_size = int(config["CRAWLER"].get("MINFILESIZE", 100))
+        self.content_types = frozenset(
+            t.strip().lower()
+            for t in config["CRAWLER"].get("CONTENTTYPES", "text/html,application/xhtml+xml,text/plain").split(",")
+            if t.strip())
+        self.near_dup_method = config["CRAWLER"].get("NEARDUPMETHOD", "minhash").strip().lower()
+        assert self.near_dup_method in ("minhash", "jaccard"), "NEARDUPMETHOD should be minhash or jaccard"
+        self.priority_policy = config["CRAWLER"].get("PRIORITYPOLICY", "bestfirst").strip()
+        assert self.priority_policy.lower() in ("fifo", "bestfirst") or "." in self.priority_policy, \
+            "PRIORITYPOLICY should be fifo, bestfirst or a module.Class path"
 
         self.cache_server = None
\ No newline at end of file
@@ -2,24 +2,161 @@ import requests
 import cbor
 import time
 
+from threading import Lock
+from requests.adapters import HTTPAdapter
+
 from utils.response import Response
+from utils.response_cache import ResponseCache
+
+# One keep-alive session shared by every worker thread, so repeated fetches
+# reuse pooled connections to the cache server instead of reconnecting.
+_session = None
+_session_lock = Lock()
+
+def get_session(config):
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=max(1, config.threads_count))
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+# Bytes the cache server's CBOR envelope and the pickled headers may add on
+# top of a page; a body larger than MAXFILESIZE plus this is never read.
+RESPONSE_OVERHEAD = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+def max_body_size(config):
+    """ Largest cache server body that can hold a page of config.max_file_size. """
+    return config.max_file_size + RESPONSE_OVERHEAD
+
+def too_large_response(url, config):
+    """ Stand-in Response for a body that was refused before it was read in full. """
+    return Response({
+        "error": f"Response of {url} is larger than {max_body_size(config)} bytes.",
+        "status": 413,
+        "url": url})
+
+# Optional on-disk cache of cache server responses, shared by every worker.
+_response_cache = None
+
+def get_response_cache(config):
+    """ The ResponseCache configured by RESPONSECACHE, or None if disabled. """
+    global _response_cache
+    if not config.response_cache_dir:
+        return None
+    if _response_cache is None:
+        with _session_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    config.response_cache_dir, config.response_cache_size)
+    return _response_cache
+
+def cached_response(url, config):
+    """
+    Look url up in the response cache. Returns a Response, or None when
+    the network should be tried; in replay mode a miss is an error.
+    """
+    cache = get_response_cache(config)
+    if cache is not None:
+        body = cache.get(url)
+        if body is not None:
+            try:
+                return Response(cbor.loads(body))
+            except (EOFError, ValueError):
+                pass
+    if config.replay:
+        return Response({
+            "error": f"{url} is not in the response cache (replay mode).",
+            "status": None,
+            "url": url})
+    return None
+
+def cache_response(url, config, body, resp_dict):
+    """ Store a decoded cache server body, unless it is a cache server error. """
+    cache = get_response_cache(config)
+    status = resp_dict.get("status")
+    # statuses of 600 and up are the cache server's own errors; retry those
+    if cache is not None and isinstance(status, int) and status < 600:
+        cache.put(url, body)
+
+def get_connection_stats(config):
+    """
+    Return request and connection counts for the cache server pool.
+    reused = requests that did not need a new TCP connection.
+    """
+    stats = {"requests": 0, "new_connections": 0, "reused": 0}
+    if _session is None or config.cache_server is None:
+        return stats
+    host, port = config.cache_server
+    pools = _session.get_adapter(f"http://{host}:{port}/").poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None or (pool.host, pool.port) != (host, port):
+            continue
+        stats["requests"] += pool.num_requests
+        stats["new_connections"] += pool.num_connections
+    stats["reused"] = max(0, stats["requests"] - stats["new_connections"])
+    return stats
+
+def read_body(resp, limit):
+    """
+    Read a streamed requests response of at most limit bytes. Returns None,
+    and drops the connection, as soon as the body is known to be larger.
+    """
+    try:
+        content_length = int(resp.headers.get("Content-Length", 0))
+    except ValueError:
+        content_length = 0
+    if content_length > limit:
+        resp.close()
+        return None
+    chunks = []
+    size = 0
+    for chunk in resp.iter_content(READ_CHUNK_SIZE):
+        size += len(chunk)
+        if size > limit:
+            resp.close()
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 def download(url, config, logger=None):
+    resp = cached_response(url, config)
+    if resp is not None:
+        return resp
     host, port = config.cache_server
     try:
-        resp = requests.get(
+        resp = get_session(config).get(
             f"http://{host}:{port}/",
             params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
-            timeout=3)
+            timeout=(config.connect_timeout, config.read_timeout),
+            stream=True)
+        content = read_body(resp, max_body_size(config))
     except requests.exceptions.Timeout:
         return Response({
-            "error": "Request Timeout (>3s)",
+            "error": f"Request Timeout (>{config.read_timeout}s)",
             "status": None,
             "url": url
         })
+    except requests.exceptions.RequestException as e:
+        if logger:
+            logger.error(f"Spacetime connection error {e} with url {url}.")
+        return Response({
+            "error": f"Spacetime connection error {e} with url {url}.",
+            "status": None,
+            "url": url})
+    if content is None:
+        return too_large_response(url, config)
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        if resp and content:
+            resp_dict = cbor.loads(content)
+            cache_response(url, config, content, resp_dict)
+            return Response(resp_dict)
     except (EOFError, ValueError) as e:
         pass
     logger.error(f"Spacetime Response error {resp} with url {url}.")
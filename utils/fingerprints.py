@@ -0,0 +1,97 @@
+import os
+
+from array import array
+from threading import Lock
+
+
+class FingerprintStore(object):
+    """
+    Append-only on-disk store of fixed-width integer records.
+
+    Every record is `width` values of array typecode `typecode`, written
+    back to back in `path`. When `with_keys` is set, a string key per
+    record (e.g. the page url) is appended to `path + ".keys"`, one per
+    line. Records are buffered in memory and appended by flush(), so
+    saving never rewrites what is already on disk, and loading is a
+    single read into an array.
+    """
+    def __init__(self, path, typecode, width=1, with_keys=False):
+        self.path = path
+        self.key_path = f"{path}.keys" if with_keys else None
+        self.typecode = typecode
+        self.width = width
+        self.record_size = array(typecode).itemsize * width
+        self.pending = array(typecode)
+        self.pending_keys = []
+        self.lock = Lock()
+
+    def load(self):
+        """
+        Read every complete record from disk.
+        Returns (values, keys): a flat array of width values per record and
+        the list of keys (None when the store has no keys). A torn record or
+        key from a crash mid-append is dropped.
+        """
+        values = array(self.typecode)
+        keys = None
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        count = size // self.record_size
+        if self.key_path:
+            raw = ""
+            if os.path.exists(self.key_path):
+                with open(self.key_path, "r", encoding="utf-8") as f:
+                    raw = f.read()
+            keys = raw.split("\n")[:-1]
+            count = min(count, len(keys))
+            if len(keys) != count or (raw and not raw.endswith("\n")):
+                keys = keys[:count]
+                with open(self.key_path, "w", encoding="utf-8") as f:
+                    f.write("".join(f"{key}\n" for key in keys))
+        if size != count * self.record_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(count * self.record_size)
+        if count:
+            with open(self.path, "rb") as f:
+                values.fromfile(f, count * self.width)
+        return values, keys
+
+    def append(self, values, key=None):
+        with self.lock:
+            self.pending.extend(values)
+            if self.key_path:
+                self.pending_keys.append(key.replace("\n", " "))
+
+    def flush(self):
+        """ Append buffered records to disk. """
+        with self.lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, array(self.typecode)
+            pending_keys, self.pending_keys = self.pending_keys, []
+            # values first: load() only trusts records that also have a key
+            with open(self.path, "ab") as f:
+                pending.tofile(f)
+            if self.key_path:
+                with open(self.key_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{key}\n" for key in pending_keys))
+
+    def truncate(self, count):
+        """
+        Drop every record on disk after the first `count`, e.g. the part of
+        a save that a companion store did not get to write before a crash.
+        """
+        with self.lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > count * self.record_size:
+                with open(self.path, "r+b") as f:
+                    f.truncate(count * self.record_size)
+            if self.key_path and os.path.exists(self.key_path):
+                with open(self.key_path, "r", encoding="utf-8") as f:
+                    keys = f.read().split("\n")[:-1]
+                if len(keys) > count:
+                    with open(self.key_path, "w", encoding="utf-8") as f:
+                        f.write("".join(f"{key}\n" for key in keys[:count]))
+
+    def remove(self):
+        for path in (self.path, self.key_path):
+            if path and os.path.exists(path):
+                os.remove(path)
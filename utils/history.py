@@ -0,0 +1,285 @@
+"""
+Columnar history of every processed page.
+
+    python -m utils.history crawl_history.bin --by host --value latency
+    python -m utils.history crawl_history.bin --by host --verdict near_duplicate
+
+The file starts with MAGIC and holds a sequence of chunks, each written
+in one batch:
+
+    b"CHNK" | rows (uint32) | for each column in COLUMNS:
+                               compressed size (uint32) | zlib(column data)
+
+Numeric columns are little-endian arrays; string columns are an array of
+uint32 byte lengths followed by the utf-8 bytes. Because every column is
+compressed on its own, a query only reads and decompresses the columns
+it uses and seeks past the rest.
+"""
+import os
+import struct
+import sys
+import time
+import zlib
+
+from array import array
+from argparse import ArgumentParser
+from threading import Lock
+from urllib.parse import urlparse
+
+MAGIC = b"CRH1"
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sI")
+COLUMN_HEADER = struct.Struct("<I")
+
+# (name, array typecode or "s" for strings)
+COLUMNS = (
+    ("time", "d"),        # unix time the page was recorded
+    ("url", "s"),
+    ("host", "s"),
+    ("status", "i"),      # -1 when there was no answer
+    ("latency", "f"),     # download seconds
+    ("bytes", "q"),       # size of the pickled cache server payload
+    ("word_count", "i"),
+    ("verdict", "B"),     # index into VERDICTS
+    ("outlinks", "i"),    # valid links found on the page
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+
+VERDICTS = ("scraped", "exact_duplicate", "near_duplicate", "low_information",
+            "skipped", "retry", "failed")
+VERDICT_CODES = {verdict: code for code, verdict in enumerate(VERDICTS)}
+
+
+def _encode(typecode, values):
+    if typecode == "s":
+        data = [value.encode("utf-8") for value in values]
+        lengths = array("I", (len(d) for d in data))
+        if sys.byteorder == "big":
+            lengths.byteswap()
+        return lengths.tobytes() + b"".join(data)
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _decode(typecode, data, rows):
+    if typecode == "s":
+        lengths = array("I")
+        lengths.frombytes(data[:rows * lengths.itemsize])
+        if sys.byteorder == "big":
+            lengths.byteswap()
+        values = []
+        offset = rows * lengths.itemsize
+        for length in lengths:
+            values.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        return values
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _valid_length(f):
+    """ Bytes of f up to the end of the last complete chunk. """
+    size = f.seek(0, os.SEEK_END)
+    offset = len(MAGIC)
+    while offset + CHUNK_HEADER.size <= size:
+        f.seek(offset)
+        tag, _ = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        if tag != CHUNK_MAGIC:
+            break
+        end = offset + CHUNK_HEADER.size
+        for _ in COLUMNS:
+            if end + COLUMN_HEADER.size > size:
+                return offset
+            f.seek(end)
+            (length,) = COLUMN_HEADER.unpack(f.read(COLUMN_HEADER.size))
+            end += COLUMN_HEADER.size + length
+        if end > size:
+            break
+        offset = end
+    return offset
+
+
+class CrawlHistory(object):
+    """
+    Appends one row per processed page to a columnar file, safe to use from
+    many threads. Rows are buffered per column and written as one
+    compressed chunk every `batch_size` rows, and by flush() and close().
+    A chunk cut short by a crash is dropped when the file is reopened.
+    """
+    def __init__(self, path, batch_size=4096, restart=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = Lock()
+        self.write_lock = Lock()
+        self.columns = {name: [] for name in COLUMN_NAMES}
+        self.rows = 0
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path) and os.path.getsize(path) >= len(MAGIC):
+            with open(path, "r+b") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a crawl history file.")
+                f.truncate(_valid_length(f))
+        else:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+
+    def append(self, url, host, status, latency, size, word_count, verdict, outlinks):
+        row = (time.time(), url, host or "", -1 if status is None else status,
+               latency or 0.0, size, word_count, VERDICT_CODES[verdict], outlinks)
+        with self.lock:
+            for name, value in zip(COLUMN_NAMES, row):
+                self.columns[name].append(value)
+            self.rows += 1
+            full = self.rows >= self.batch_size
+        if full:
+            self.flush()
+
+    def record(self, url, resp, latency, verdict, word_count=0, outlinks=0):
+        """ append() with the host, status and pickled size taken from url and resp. """
+        self.append(
+            url, urlparse(url).hostname, resp.status if resp is not None else None,
+            latency, resp.pickled_size if resp is not None else 0,
+            word_count, verdict, outlinks)
+
+    def flush(self):
+        """ Write the buffered rows as one chunk. """
+        with self.write_lock:
+            with self.lock:
+                if not self.rows:
+                    return
+                columns, rows = self.columns, self.rows
+                self.columns = {name: [] for name in COLUMN_NAMES}
+                self.rows = 0
+            parts = [CHUNK_HEADER.pack(CHUNK_MAGIC, rows)]
+            for name, typecode in COLUMNS:
+                data = zlib.compress(_encode(typecode, columns[name]))
+                parts.append(COLUMN_HEADER.pack(len(data)))
+                parts.append(data)
+            with open(self.path, "ab") as f:
+                f.write(b"".join(parts))
+
+    def close(self):
+        self.flush()
+
+
+class HistoryReader(object):
+    """
+    Query API over a CrawlHistory file. Only the requested columns are
+    decompressed; rows are streamed chunk by chunk, so memory stays
+    bounded by one chunk.
+
+        reader = HistoryReader("crawl_history.bin")
+        reader.aggregate("host", "latency")                # slowest hosts
+        reader.aggregate("status", "bytes")                # bytes per status
+        reader.aggregate("host", where=lambda r: r["verdict"] == "near_duplicate",
+                         columns=["verdict"])             # near dups per host
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def chunks(self, columns=COLUMN_NAMES):
+        """ Yield (rows, {column: values}) for every chunk, with only `columns` decoded. """
+        wanted = set(columns)
+        unknown = wanted - set(COLUMN_NAMES)
+        if unknown:
+            raise KeyError(f"Unknown history columns {sorted(unknown)}.")
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a crawl history file.")
+            end = _valid_length(f)
+            offset = len(MAGIC)
+            while offset < end:
+                f.seek(offset)
+                _, rows = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                offset += CHUNK_HEADER.size
+                values = dict()
+                for name, typecode in COLUMNS:
+                    f.seek(offset)
+                    (length,) = COLUMN_HEADER.unpack(f.read(COLUMN_HEADER.size))
+                    offset += COLUMN_HEADER.size
+                    if name in wanted:
+                        f.seek(offset)
+                        data = zlib.decompress(f.read(length))
+                        column = _decode(typecode, data, rows)
+                        if name == "verdict":
+                            column = [VERDICTS[code] for code in column]
+                        values[name] = column
+                    offset += length
+                yield rows, values
+
+    def rows(self, columns=COLUMN_NAMES, where=None):
+        """ Yield each row as a dict of `columns`, if where(row) holds. """
+        columns = tuple(columns)
+        for rows, values in self.chunks(columns):
+            lists = [values[name] for name in columns]
+            for i in range(rows):
+                row = {name: column[i] for name, column in zip(columns, lists)}
+                if where is None or where(row):
+                    yield row
+
+    def aggregate(self, by, value=None, where=None, columns=()):
+        """
+        Group the rows passing where() by the column `by` and return
+        {key: {"count", "sum", "mean", "max"}} of the column `value` (only
+        counts if value is None). `columns` names any further columns
+        where() looks at.
+        """
+        needed = {by} | set(columns) | ({value} if value else set())
+        groups = dict()
+        for row in self.rows(needed, where):
+            group = groups.get(row[by])
+            if group is None:
+                group = groups[row[by]] = {"count": 0, "sum": 0, "max": None}
+            group["count"] += 1
+            if value:
+                x = row[value]
+                group["sum"] += x
+                if group["max"] is None or x > group["max"]:
+                    group["max"] = x
+        for group in groups.values():
+            group["mean"] = group["sum"] / group["count"]
+        return groups
+
+    def __len__(self):
+        return sum(rows for rows, _ in self.chunks(()))
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Aggregate a crawl history file.")
+    parser.add_argument("path")
+    parser.add_argument("--by", default="host", choices=COLUMN_NAMES)
+    parser.add_argument("--value", choices=COLUMN_NAMES,
+                        help="numeric column to sum, average and max; counts only if omitted")
+    parser.add_argument("--verdict", choices=VERDICTS, help="only rows with this verdict")
+    parser.add_argument("--status", type=int, help="only rows with this status")
+    parser.add_argument("--sort", default="count", choices=("count", "sum", "mean", "max"))
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    filters = []
+    if args.verdict:
+        filters.append(("verdict", args.verdict))
+    if args.status is not None:
+        filters.append(("status", args.status))
+    where = None
+    if filters:
+        where = lambda row: all(row[name] == wanted for name, wanted in filters)
+
+    groups = HistoryReader(args.path).aggregate(
+        args.by, args.value, where, [name for name, _ in filters])
+    ranked = sorted(groups.items(), key=lambda item: item[1][args.sort] or 0, reverse=True)
+    print(f"{args.by:<40} {'count':>8} {'sum':>14} {'mean':>12} {'max':>12}")
+    for key, group in ranked[:args.top]:
+        maximum = group["max"] if group["max"] is not None else 0
+        print(f"{str(key):<40} {group['count']:>8} {group['sum']:>14.6g} "
+              f"{group['mean']:>12.6g} {maximum:>12.6g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Link graph of the crawl.
+
+    python -m utils.linkgraph linkgraph --top 20
+
+Urls get dense integer ids in the order they are first seen. The graph
+lives in two append-only files next to the crawl:
+
+    <path>.urls  -> one url per line; line i is the url of id i
+    <path>.edges -> (source id, target id) pairs as little-endian uint32
+
+In memory it is CSR (compressed sparse row) arrays plus the edges added
+since the last compaction, so an edge costs about 4 bytes once compacted
+and 8 before. The url -> id map is a sorted array of 64-bit url
+fingerprints with a parallel array of ids, searched with bisect, so a url
+costs about 20 bytes: 8 + 4 in the map, 4 in in_links and 4 in offsets.
+Urls added since the last merge wait in a small dict.
+"""
+import bisect
+import heapq
+import itertools
+import operator
+import os
+import sys
+
+from argparse import ArgumentParser
+from array import array
+from collections import Counter, defaultdict
+from threading import Lock
+from urllib.parse import urldefrag
+
+from utils import get_urlfingerprint, normalize
+
+try:
+    import numpy
+except ImportError:
+    # pagerank falls back to the array module
+    numpy = None
+
+
+def _canonical(url):
+    """ The form the frontier stores urls in. """
+    return urldefrag(normalize(url))[0]
+
+
+def _key(url):
+    return int.from_bytes(get_urlfingerprint(url), "big")
+
+
+class LinkGraph(object):
+    """
+    Directed url graph, safe to update from many threads.
+
+        id_keys     -> sorted url fingerprints of the merged ids
+        id_values   -> the id of each fingerprint in id_keys
+        new_ids     -> fingerprint -> id of the urls added since the last
+                       merge, merged once there are `merge_ids` of them
+        offsets     -> CSR row offsets of the compacted edges, one per id + 1
+        targets     -> CSR target ids, sorted and unique within each row
+        pending_src -> edges added since the last compaction, compacted
+        pending_dst    once there are `compact_edges` of them
+        in_links    -> in-links of each id as added, duplicates included
+
+    Writes to the two files are buffered and appended by flush().
+    """
+    def __init__(self, path, restart=False, compact_edges=1 << 20, merge_ids=1 << 16):
+        self.urls_path = f"{path}.urls"
+        self.edges_path = f"{path}.edges"
+        self.compact_edges = compact_edges
+        self.merge_ids = merge_ids
+        self.lock = Lock()
+        self.write_lock = Lock()
+        # (id_keys, id_values), replaced together so lock-free readers never
+        # see one without the other
+        self.id_arrays = (array("Q"), array("I"))
+        self.new_ids = dict()
+        self.offsets = array("I", [0])
+        self.targets = array("I")
+        self.pending_src = array("I")
+        self.pending_dst = array("I")
+        self.in_links = array("I")
+        self.new_urls = []
+        self.new_edges = array("I")
+        if restart:
+            for path in (self.urls_path, self.edges_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._load()
+
+    def _load(self):
+        nodes = 0
+        if os.path.exists(self.urls_path):
+            with open(self.urls_path, "r+b") as f:
+                data = f.read()
+                # drop a last line cut short by a crash
+                f.truncate(data.rfind(b"\n") + 1)
+            keys = array("Q", (_key(line) for line in data.decode("utf-8", "replace").split("\n")[:-1]))
+            nodes = len(keys)
+            order = sorted(range(nodes), key=keys.__getitem__)
+            self.id_arrays = (array("Q", (keys[i] for i in order)), array("I", order))
+        self.in_links = array("I", bytes(4 * nodes))
+        self.offsets = array("I", bytes(4 * (nodes + 1)))
+        if os.path.exists(self.edges_path):
+            edges = array("I")
+            with open(self.edges_path, "rb") as f:
+                data = f.read()
+            edges.frombytes(data[:len(data) // 8 * 8])
+            if sys.byteorder == "big":
+                edges.byteswap()
+            for src, dst in zip(edges[0::2], edges[1::2]):
+                # edges whose urls were not flushed before a crash are dropped
+                if src < nodes and dst < nodes:
+                    self.pending_src.append(src)
+                    self.pending_dst.append(dst)
+                    self.in_links[dst] += 1
+        self._compact()
+
+    def _lookup(self, key):
+        """ Id of a url fingerprint, or None. Safe without self.lock. """
+        node = self.new_ids.get(key)
+        if node is None:
+            keys, values = self.id_arrays
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                node = values[i]
+        return node
+
+    def _id(self, url):
+        """ Id of url, assigning the next one if it is new. Caller holds self.lock. """
+        key = _key(url)
+        node = self._lookup(key)
+        if node is None:
+            node = len(self.in_links)
+            # in_links first, so in_link_count never sees an id without a count
+            self.in_links.append(0)
+            self.new_urls.append(url)
+            self.new_ids[key] = node
+            if len(self.new_ids) >= self.merge_ids:
+                self._merge_ids()
+        return node
+
+    def _merge_ids(self):
+        """
+        Merge new_ids into the sorted arrays. Runs between the new keys
+        are copied as array slices, so a merge costs one copy of the
+        arrays plus a bisect per new key. Caller holds self.lock.
+        """
+        old_keys, old_values = self.id_arrays
+        keys, values = array("Q"), array("I")
+        pos = 0
+        for key, node in sorted(self.new_ids.items()):
+            i = bisect.bisect_left(old_keys, key, pos)
+            keys.extend(old_keys[pos:i])
+            values.extend(old_values[pos:i])
+            keys.append(key)
+            values.append(node)
+            pos = i
+        keys.extend(old_keys[pos:])
+        values.extend(old_values[pos:])
+        # arrays first: a reader that misses the key in the new dict finds it there
+        self.id_arrays = (keys, values)
+        self.new_ids = dict()
+
+    def add_page(self, url, links):
+        """ Record the links found on url. """
+        url = _canonical(url)
+        links = {_canonical(link) for link in links}
+        with self.lock:
+            src = self._id(url)
+            for link in links:
+                dst = self._id(link)
+                if dst == src:
+                    continue
+                self.pending_src.append(src)
+                self.pending_dst.append(dst)
+                self.new_edges.append(src)
+                self.new_edges.append(dst)
+                self.in_links[dst] += 1
+            if len(self.pending_src) >= self.compact_edges:
+                self._compact()
+
+    def in_link_count(self, url):
+        """ Links to url recorded so far, without assigning it an id. """
+        node = self._lookup(_key(_canonical(url)))
+        return 0 if node is None else self.in_links[node]
+
+    def _compact(self):
+        """ Merge the pending edges into the CSR arrays. Caller holds self.lock. """
+        nodes = len(self.in_links)
+        if not self.pending_src and len(self.offsets) == nodes + 1:
+            return
+        added = defaultdict(set)
+        for src, dst in zip(self.pending_src, self.pending_dst):
+            added[src].add(dst)
+        old_offsets, old_targets = self.offsets, self.targets
+        old_nodes = len(old_offsets) - 1
+        offsets = array("I", [0])
+        targets = array("I")
+        for node in range(nodes):
+            row = old_targets[old_offsets[node]:old_offsets[node + 1]] if node < old_nodes else ()
+            extra = added.get(node)
+            if extra:
+                extra.update(row)
+                targets.extend(sorted(extra))
+            else:
+                targets.extend(row)
+            offsets.append(len(targets))
+        # replaced, not updated, so readers holding the old arrays are safe
+        self.offsets, self.targets = offsets, targets
+        self.pending_src = array("I")
+        self.pending_dst = array("I")
+
+    def csr(self):
+        """ (offsets, targets) of the whole graph, compacting it first. """
+        with self.lock:
+            self._compact()
+            return self.offsets, self.targets
+
+    def in_degree(self):
+        """ Distinct in-links of every id, as an array indexed by id. """
+        offsets, targets = self.csr()
+        degree = array("I", bytes(4 * (len(offsets) - 1)))
+        for node, count in Counter(targets).items():
+            degree[node] = count
+        return degree
+
+    def pagerank(self, damping=0.85, iterations=50, tolerance=1e-6):
+        """
+        PageRank of every id, as an array indexed by id, by power
+        iteration. The rank of pages without out-links is spread evenly
+        over all pages. The working vectors are preallocated arrays of
+        doubles updated in place, so memory stays at a few machine words
+        per page and edge; with numpy each iteration is vectorized.
+        """
+        offsets, targets = self.csr()
+        nodes = len(offsets) - 1
+        if not nodes:
+            return array("d")
+        if numpy is not None:
+            return _pagerank_numpy(offsets, targets, nodes, damping, iterations, tolerance)
+        return _pagerank_array(offsets, targets, nodes, damping, iterations, tolerance)
+
+    def top(self, scores, n=20):
+        """ The n highest scoring urls as (url, score), highest first. """
+        best = heapq.nlargest(n, range(len(scores)), key=scores.__getitem__)
+        urls = self.urls(best)
+        return [(urls[node], scores[node]) for node in best]
+
+    def urls(self, nodes):
+        """ {id: url} for the given ids, read from the urls file. """
+        self.flush()
+        wanted = set(nodes)
+        found = dict()
+        with open(self.urls_path, "r", encoding="utf-8") as f:
+            for node, line in enumerate(f):
+                if node in wanted:
+                    found[node] = line.rstrip("\n")
+                    if len(found) == len(wanted):
+                        break
+        return found
+
+    def stats(self):
+        with self.lock:
+            return {"nodes": len(self.in_links),
+                    "id_map_bytes": sum(a.itemsize * len(a) for a in self.id_arrays),
+                    "edges": len(self.targets) + len(self.pending_src),
+                    "pending_edges": len(self.pending_src)}
+
+    def flush(self):
+        """ Append the urls and edges added since the last flush to the files. """
+        with self.write_lock:
+            with self.lock:
+                urls, self.new_urls = self.new_urls, []
+                edges, self.new_edges = self.new_edges, array("I")
+            # urls first, so every edge on disk refers to a known url
+            if urls:
+                with open(self.urls_path, "a", encoding="utf-8") as f:
+                    f.write("".join(url + "\n" for url in urls))
+            if edges:
+                if sys.byteorder == "big":
+                    edges.byteswap()
+                with open(self.edges_path, "ab") as f:
+                    f.write(edges.tobytes())
+
+    def close(self):
+        self.flush()
+
+
+def _transpose(offsets, targets, nodes):
+    """ CSR of the reversed edges: (in_offsets, sources). """
+    counts = Counter(targets)
+    in_offsets = array("I", itertools.accumulate(
+        (counts.get(node, 0) for node in range(nodes)), initial=0))
+    fill = array("I", in_offsets[:-1])
+    sources = array("I", bytes(4 * len(targets)))
+    for src in range(nodes):
+        for dst in targets[offsets[src]:offsets[src + 1]]:
+            sources[fill[dst]] = src
+            fill[dst] += 1
+    return in_offsets, sources
+
+
+def _pagerank_array(offsets, targets, nodes, damping, iterations, tolerance):
+    """
+    pagerank() with the array module: each iteration computes every page's
+    contribution once, then sums them per target with map() over that
+    target's in-link slice of the transposed graph.
+    """
+    in_offsets, sources = _transpose(offsets, targets, nodes)
+    inv_degree = array("d", bytes(8 * nodes))
+    dangling_nodes = array("I")
+    for node in range(nodes):
+        degree = offsets[node + 1] - offsets[node]
+        if degree:
+            inv_degree[node] = 1.0 / degree
+        else:
+            dangling_nodes.append(node)
+    rank = array("d", [1.0 / nodes]) * nodes
+    new_rank = array("d", bytes(8 * nodes))
+    contrib = array("d", bytes(8 * nodes))
+    for _ in range(iterations):
+        contrib[:] = array("d", map(operator.mul, rank, inv_degree))
+        dangling = sum(map(rank.__getitem__, dangling_nodes))
+        base = (1.0 - damping) / nodes + damping * dangling / nodes
+        for node in range(nodes):
+            new_rank[node] = base + damping * sum(map(
+                contrib.__getitem__, sources[in_offsets[node]:in_offsets[node + 1]]))
+        delta = sum(map(abs, map(operator.sub, new_rank, rank)))
+        rank, new_rank = new_rank, rank
+        if delta < tolerance:
+            break
+    return rank
+
+
+def _pagerank_numpy(offsets, targets, nodes, damping, iterations, tolerance):
+    """ pagerank() with numpy: contributions are summed per target by bincount. """
+    offsets = numpy.frombuffer(offsets, dtype=numpy.uint32)
+    dst = numpy.frombuffer(targets, dtype=numpy.uint32)
+    out_degree = numpy.diff(offsets)
+    src = numpy.repeat(numpy.arange(nodes, dtype=numpy.uint32), out_degree)
+    dangling_nodes = numpy.flatnonzero(out_degree == 0)
+    inv_degree = numpy.zeros(nodes)
+    numpy.divide(1.0, out_degree, out=inv_degree, where=out_degree > 0)
+    rank = numpy.full(nodes, 1.0 / nodes)
+    contrib = numpy.empty(nodes)
+    edge_contrib = numpy.empty(len(dst))
+    for _ in range(iterations):
+        numpy.multiply(rank, inv_degree, out=contrib)
+        numpy.take(contrib, src, out=edge_contrib)
+        dangling = rank[dangling_nodes].sum()
+        base = (1.0 - damping) / nodes + damping * dangling / nodes
+        new_rank = numpy.bincount(dst, weights=edge_contrib, minlength=nodes)
+        new_rank *= damping
+        new_rank += base
+        delta = numpy.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < tolerance:
+            break
+    result = array("d")
+    result.frombytes(rank.tobytes())
+    return result
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Rank the urls of a crawl's link graph.")
+    parser.add_argument("path", help="LINKGRAPH path prefix, without .urls / .edges")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--by", choices=("pagerank", "in-degree"), default="pagerank")
+    args = parser.parse_args(argv)
+
+    graph = LinkGraph(args.path)
+    stats = graph.stats()
+    print(f"{stats['nodes']} urls, {stats['edges']} links")
+    scores = graph.pagerank() if args.by == "pagerank" else graph.in_degree()
+    for url, score in graph.top(scores, args.top):
+        print(f"{score:>12.6g}  {url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds: ten per decade from 1us to 100s,
+# so a percentile read from the buckets is within about 26% of the truth.
+BUCKET_BOUNDS = tuple(10 ** (k / 10) for k in range(-60, 21))
+
+
+class Histogram(object):
+    """ Latency histogram over BUCKET_BOUNDS, safe to update from many threads. """
+    __slots__ = ("lock", "buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # one extra bucket for samples above the last bound
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self.lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    @classmethod
+    def merged(cls, histograms):
+        """ A new Histogram holding the samples of every histogram given. """
+        merged = cls()
+        for histogram in histograms:
+            with histogram.lock:
+                for index, n in enumerate(histogram.buckets):
+                    merged.buckets[index] += n
+                merged.count += histogram.count
+                merged.total += histogram.total
+                merged.max = max(merged.max, histogram.max)
+        return merged
+
+    def summary(self):
+        with self.lock:
+            buckets = list(self.buckets)
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "total_s": total,
+            "mean_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": _percentile(buckets, count, maximum, 50) * 1000,
+            "p90_ms": _percentile(buckets, count, maximum, 90) * 1000,
+            "p99_ms": _percentile(buckets, count, maximum, 99) * 1000,
+            "max_ms": maximum * 1000,
+        }
+
+
+def _percentile(buckets, count, maximum, pct):
+    """ Upper bound of the bucket holding the pct-th percentile, capped at the max. """
+    if not count:
+        return 0.0
+    rank = pct / 100 * count
+    seen = 0
+    for index, n in enumerate(buckets):
+        seen += n
+        if seen >= rank and n:
+            if index < len(BUCKET_BOUNDS):
+                return min(BUCKET_BOUNDS[index], maximum)
+            break
+    return maximum
+
+
+class _Timer(object):
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class TimedLock(object):
+    """
+    Wraps a Lock or RLock and records how long every acquisition waited in
+    the histogram `name`. Usable wherever the wrapped lock was, including
+    `with` statements and contextlib.ExitStack.
+    """
+    __slots__ = ("lock", "histogram")
+
+    def __init__(self, lock, name, registry=None):
+        self.lock = lock
+        self.histogram = (registry or metrics).histogram(name)
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        self.histogram.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+
+class Metrics(object):
+    """
+    Process-wide counters, latency histograms and gauges.
+
+        counters   -> monotonically increasing event counts, kept per thread
+                      and summed at snapshot time
+        histograms -> durations in seconds, see Histogram. Histograms named
+                      <name>.<part>, e.g. one per frontier shard, are also
+                      reported merged as <name>
+        gauges     -> callables read at snapshot time, e.g. the queue size
+
+    Incrementing a counter takes no lock at all and observing a duration
+    only the histogram's own; everything else happens when a snapshot is
+    taken.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.local = threading.local()
+        # the counter dict of every thread that ever counted something
+        self.thread_counters = []
+        self.histograms = dict()
+        self.gauges = dict()
+
+    def _counters(self):
+        """ This thread's counters, registered on first use. """
+        try:
+            return self.local.counters
+        except AttributeError:
+            counters = self.local.counters = dict()
+            with self.lock:
+                self.thread_counters.append(counters)
+            return counters
+
+    def incr(self, name, n=1):
+        counters = self._counters()
+        counters[name] = counters.get(name, 0) + n
+
+    @property
+    def counters(self):
+        """ Every counter summed over the threads. """
+        with self.lock:
+            thread_counters = list(self.thread_counters)
+        totals = dict()
+        for counters in thread_counters:
+            # copying a dict is atomic under the GIL, even while its thread counts
+            for name, value in counters.copy().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def timer(self, name):
+        """ Context manager that observes the duration of its block in `name`. """
+        return _Timer(self.histogram(name))
+
+    def gauge(self, name, func):
+        """ Register func() to be reported as `name` in every snapshot. """
+        with self.lock:
+            self.gauges[name] = func
+
+    def snapshot(self):
+        counters = self.counters
+        with self.lock:
+            histograms = dict(self.histograms)
+            gauges = dict(self.gauges)
+        parts = dict()
+        for name, histogram in histograms.items():
+            group, _, part = name.rpartition(".")
+            if group and part.isdigit():
+                parts.setdefault(group, []).append(histogram)
+        for group, members in parts.items():
+            if group not in histograms:
+                histograms[group] = Histogram.merged(members)
+        gauge_values = dict()
+        for name, func in gauges.items():
+            try:
+                gauge_values[name] = func()
+            except Exception:
+                gauge_values[name] = None
+        return {
+            "time": time.time(),
+            "uptime_s": time.time() - self.started,
+            "counters": dict(sorted(counters.items())),
+            "gauges": dict(sorted(gauge_values.items())),
+            "histograms": {
+                name: histograms[name].summary() for name in sorted(histograms)},
+        }
+
+
+# Shared by every module of the crawler.
+metrics = Metrics()
+
+
+# <path>.csv is moved to <path>.csv.1, replacing the older one, once it
+# grows past this many bytes, so a long crawl keeps at most twice as much.
+CSV_MAX_BYTES = 50 * 1024 * 1024
+
+CSV_FIELDS = ("time", "kind", "name", "value", "count", "mean_ms", "p50_ms",
+              "p90_ms", "p99_ms", "max_ms")
+
+def csv_rows(snapshot):
+    """ One row per counter, gauge and histogram of a snapshot. """
+    t = round(snapshot["time"], 3)
+    for name, value in snapshot["counters"].items():
+        yield {"time": t, "kind": "counter", "name": name, "value": value}
+    for name, value in snapshot["gauges"].items():
+        yield {"time": t, "kind": "gauge", "name": name, "value": value}
+    for name, summary in snapshot["histograms"].items():
+        row = {"time": t, "kind": "histogram", "name": name}
+        row.update({field: summary[field] for field in CSV_FIELDS if field in summary})
+        yield row
+
+def dump(path, registry=None, csv_max_bytes=CSV_MAX_BYTES):
+    """
+    Write the current snapshot to <path>.json, replacing the last one, and
+    append it to <path>.csv, so the CSV keeps the history of the crawl. A
+    CSV larger than csv_max_bytes is rotated to <path>.csv.1 first.
+    """
+    snapshot = (registry or metrics).snapshot()
+    tmp_path = f"{path}.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, f"{path}.json")
+    csv_path = f"{path}.csv"
+    if os.path.exists(csv_path) and os.path.getsize(csv_path) > csv_max_bytes:
+        os.replace(csv_path, f"{csv_path}.1")
+    new_file = not os.path.exists(csv_path)
+    with open(csv_path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, CSV_FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(csv_rows(snapshot))
+    return snapshot
+
+
+class MetricsServer(object):
+    """
+    Serves the metrics on http://<host>:<port>/metrics as JSON and
+    /metrics.csv as CSV, from a daemon thread. Port 0 picks a free port.
+    """
+    def __init__(self, port, host="127.0.0.1", registry=None):
+        registry = registry or metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if path in ("", "/metrics"):
+                    body = json.dumps(registry.snapshot(), indent=2).encode("utf-8")
+                    content_type = "application/json"
+                elif path == "/metrics.csv":
+                    lines = [",".join(CSV_FIELDS)]
+                    for row in csv_rows(registry.snapshot()):
+                        lines.append(",".join(str(row.get(field, "")) for field in CSV_FIELDS))
+                    body = ("\n".join(lines) + "\n").encode("utf-8")
+                    content_type = "text/csv"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="MetricsServer", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,141 @@
+import random
+import zlib
+
+from array import array
+from collections import Counter
+
+# Universal hashing h(x) = (a * x + b) mod p, truncated to 32 bits.
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+class MinHasher(object):
+    """
+    Builds fixed-length MinHash signatures from sets of shingles.
+    The permutations are drawn from a seeded generator so signatures stay
+    comparable across runs and can be persisted.
+    """
+    def __init__(self, num_perm=128, seed=1):
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randint(1, MERSENNE_PRIME - 1), rng.randint(0, MERSENNE_PRIME - 1))
+            for _ in range(num_perm)]
+
+    def signature(self, shingles):
+        """
+        Return the MinHash signature of an iterable of string shingles as a
+        tuple of num_perm ints, or None if there are no shingles.
+        """
+        return self.signature_from_hashes({zlib.crc32(s.encode("utf-8")) for s in shingles})
+
+    def signature_from_hashes(self, hashes):
+        """ Same as signature(), for shingles already hashed to 32-bit ints. """
+        if not hashes:
+            return None
+        return tuple(
+            min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+            for a, b in self.permutations)
+
+    @staticmethod
+    def similarity(sig1, sig2):
+        """ Estimate the Jaccard similarity of two signatures. """
+        return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+class LSHIndex(object):
+    """
+    Banded locality-sensitive hashing index over MinHash signatures.
+    Each signature is split into `bands` bands of num_perm // bands rows;
+    two pages become candidates if any band matches exactly.
+    Signatures are kept back to back in one flat uint32 array and pages are
+    referred to by their insertion position. A bucket maps a band key to the
+    position of its page, or to a list of positions once pages share it.
+    """
+    def __init__(self, num_perm=128, bands=32):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [dict() for _ in range(bands)]
+        self.signatures = array("I")
+        self.keys = []
+
+    def band_keys(self, signature):
+        """ The key of each band of signature, as stored in the buckets. """
+        rows = self.rows
+        return [hash(tuple(signature[i * rows:(i + 1) * rows])) for i in range(self.bands)]
+
+    def insert(self, key, signature):
+        """ Add a signature; returns its band keys. """
+        position = len(self.keys)
+        band_keys = self.band_keys(signature)
+        self.keys.append(key)
+        self.signatures.extend(signature)
+        for bucket, band_key in zip(self.buckets, band_keys):
+            self._add(bucket, band_key, position)
+        return band_keys
+
+    @staticmethod
+    def _add(bucket, band_key, position):
+        found = bucket.setdefault(band_key, position)
+        if type(found) is list:
+            found.append(position)
+        elif found != position:
+            bucket[band_key] = [found, position]
+
+    def load(self, signatures, keys, band_keys=None):
+        """
+        Bulk-load a flat signature array and its keys, e.g. from disk.
+        band_keys holds the band keys of the first signatures back to back,
+        as insert() returned them; only the signatures past its end are
+        hashed again. Returns the band keys of every loaded signature.
+        """
+        n = self.num_perm
+        start = len(self.keys)
+        self.signatures.extend(signatures)
+        self.keys.extend(keys)
+        band_keys = array("q", band_keys if band_keys is not None else ())
+        del band_keys[len(keys) * self.bands:]
+        # tuple hashes may differ between Python versions: check the first
+        if band_keys and list(band_keys[:self.bands]) != self.band_keys(signatures[:n]):
+            band_keys = array("q")
+        for position in range(start + len(band_keys) // self.bands, len(self.keys)):
+            offset = position * n
+            band_keys.extend(self.band_keys(self.signatures[offset:offset + n]))
+        positions = range(start, len(self.keys))
+        for band, bucket in enumerate(self.buckets):
+            column = band_keys[band::self.bands]
+            if bucket:
+                for position, band_key in zip(positions, column):
+                    self._add(bucket, band_key, position)
+                continue
+            # an empty bucket is filled in one call; only the keys that
+            # several pages share are then added one page at a time
+            bucket.update(zip(column, positions))
+            if len(bucket) < len(column):
+                shared = {band_key for band_key, count in Counter(column).items() if count > 1}
+                for band_key in shared:
+                    del bucket[band_key]
+                for position, band_key in zip(positions, column):
+                    if band_key in shared:
+                        self._add(bucket, band_key, position)
+        return band_keys
+
+    def signature(self, position):
+        offset = position * self.num_perm
+        return self.signatures[offset:offset + self.num_perm]
+
+    def query(self, signature):
+        """ Return the positions that share at least one band with signature. """
+        candidates = set()
+        for bucket, band_key in zip(self.buckets, self.band_keys(signature)):
+            found = bucket.get(band_key)
+            if type(found) is list:
+                candidates.update(found)
+            elif found is not None:
+                candidates.add(found)
+        return candidates
+
+    def __len__(self):
+        return len(self.keys)
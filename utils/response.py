@@ -5,10 +5,37 @@ class Response(object):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
+        # The pickled requests.Response is only unpickled when raw_response
+        # is first used, so checks on status and size cost no deserialization.
+        self._pickled = resp_dict["response"] if "response" in resp_dict else None
+        self._raw_response = None
+        # Size of the pickled payload as the cache server sent it, 0 if
+        # there is none. Unlike payload_size it stays the same after the
+        # payload is unpickled.
         try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
+            self.pickled_size = 0 if self._pickled is None else len(self._pickled)
         except TypeError:
-            self.raw_response = None
+            self.pickled_size = 0
+
+    @property
+    def payload_size(self):
+        """
+        Size of the response in bytes, 0 if there is none: the pickled
+        payload until it is unpickled, the page content afterwards.
+        """
+        if self._pickled is not None:
+            try:
+                return len(self._pickled)
+            except TypeError:
+                return 0
+        return 0 if self._raw_response is None else len(self._raw_response.content)
+
+    @property
+    def raw_response(self):
+        if self._pickled is not None:
+            try:
+                self._raw_response = pickle.loads(self._pickled)
+            except TypeError:
+                self._raw_response = None
+            self._pickled = None
+        return self._raw_response
@@ -0,0 +1,101 @@
+import os
+import time
+import zlib
+
+from collections import OrderedDict
+from threading import Lock
+
+from utils import get_urlhash
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of the raw CBOR bodies returned by the cache server.
+
+    Each body is zlib-compressed into <directory>/<h[:2]>/<h>.cbor.z,
+    where h is get_urlhash(url), so a url always maps to the same file.
+    The total compressed size is kept under max_bytes by evicting the
+    least recently used entries. Recency survives restarts through the
+    files' modification times, which are bumped on every hit.
+    """
+    SUFFIX = ".cbor.z"
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        # url hash -> compressed size, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.SUFFIX)
+
+    def _load(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.SUFFIX):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                found.append((stat.st_mtime, name[:-len(self.SUFFIX)], stat.st_size))
+        found.sort()
+        for _, key, size in found:
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def get(self, url):
+        """ Return the cached CBOR body of url, or None. """
+        key = get_urlhash(url)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+            os.utime(path)
+        except (OSError, zlib.error):
+            with self.lock:
+                if key in self.entries:
+                    self.total_bytes -= self.entries.pop(key)
+            return None
+        return data
+
+    def put(self, url, body):
+        """ Store the CBOR body returned for url. """
+        key = get_urlhash(url)
+        data = zlib.compress(body)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        """ Drop least recently used entries until under max_bytes. Caller holds the lock. """
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes,
+                    "hits": self.hits, "misses": self.misses}
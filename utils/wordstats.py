@@ -0,0 +1,252 @@
+import dbm
+import heapq
+import os
+import threading
+
+from collections import Counter
+
+
+class SpaceSaving(object):
+    """
+    Space-Saving summary of the heaviest words in a stream (Metwally et
+    al.). At most `capacity` words are tracked; a new word evicts the
+    smallest one and inherits its count, recorded as that word's error.
+    Any word whose true count exceeds total / capacity is guaranteed to be
+    tracked, so with a capacity well above the report size the top of the
+    summary matches the exact top words.
+    """
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = dict()
+        self.errors = dict()
+        # lazy min-heap of (count, word); entries whose count no longer
+        # matches self.counts are stale and skipped
+        self.heap = []
+
+    def update(self, word, count=1):
+        counts = self.counts
+        if word in counts:
+            counts[word] += count
+        elif len(counts) < self.capacity:
+            counts[word] = count
+            self.errors[word] = 0
+        else:
+            min_word, min_count = self._pop_min()
+            del counts[min_word]
+            del self.errors[min_word]
+            counts[word] = min_count + count
+            self.errors[word] = min_count
+        heapq.heappush(self.heap, (counts[word], word))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(c, w) for w, c in counts.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_min(self):
+        while True:
+            count, word = heapq.heappop(self.heap)
+            if self.counts.get(word) == count:
+                return word, count
+
+    def top(self, n):
+        """
+        The n heaviest words as (word, count), heaviest first. A count
+        includes the word's error, so it may overestimate the true count.
+        """
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+    def candidates(self, n):
+        """
+        Every tracked word that may be among the n heaviest: those whose
+        count reaches the n-th largest guaranteed count (count - error).
+        """
+        counts, errors = self.counts, self.errors
+        if len(counts) <= n:
+            return list(counts)
+        floor = heapq.nlargest(n, (c - errors[w] for w, c in counts.items()))[-1]
+        return [w for w, c in counts.items() if c >= floor]
+
+    def __len__(self):
+        return len(self.counts)
+
+    def state(self):
+        return {"capacity": self.capacity, "counts": dict(self.counts),
+                "errors": dict(self.errors)}
+
+    @classmethod
+    def from_state(cls, state):
+        summary = cls(state["capacity"])
+        summary.counts = dict(state["counts"])
+        summary.errors = dict(state["errors"])
+        summary.heap = [(c, w) for w, c in summary.counts.items()]
+        heapq.heapify(summary.heap)
+        return summary
+
+
+class _LocalStats(object):
+    def __init__(self):
+        # only contended while WordStats.flush() merges this thread's batch
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.pages = 0
+        self.longest = ("", 0)
+
+
+class WordStats(object):
+    """
+    Word statistics of the crawl, safe to update from many threads.
+
+    Each thread counts into a local batch that is merged into the shared
+    state every `merge_pages` pages (and by flush()), so the shared lock
+    is taken once per batch instead of once per page. Merged counts feed
+    a SpaceSaving summary, which picks the candidates for top(n) without
+    touching the full vocabulary, and an in-memory Counter that is spilled into the dbm at
+    `spill_path` whenever it holds more than `memory_words` words.
+    """
+    def __init__(self, spill_path, top_capacity=1000, merge_pages=50,
+                 memory_words=200_000):
+        self.spill_path = spill_path
+        self.merge_pages = merge_pages
+        self.memory_words = memory_words
+        self.top_words = SpaceSaving(top_capacity)
+        self.counts = Counter()
+        self.longest_page = ("", 0)
+        self.lock = threading.Lock()
+        self.spill_lock = threading.Lock()
+        self.spill_db = None
+        self.local = threading.local()
+        self.locals = []
+        self.locals_lock = threading.Lock()
+
+    def _local(self):
+        local = getattr(self.local, "stats", None)
+        if local is None:
+            local = self.local.stats = _LocalStats()
+            with self.locals_lock:
+                self.locals.append(local)
+        return local
+
+    def record(self, url, word_counts, word_count):
+        """ Count one page's words; word_counts maps word -> count. """
+        local = self._local()
+        with local.lock:
+            local.counts.update(word_counts)
+            local.pages += 1
+            if word_count > local.longest[1]:
+                local.longest = (url, word_count)
+            if local.pages >= self.merge_pages:
+                self._merge(local)
+
+    def _merge(self, local):
+        """ Fold a thread's batch into the shared state. Caller holds local.lock. """
+        counts, local.counts = local.counts, Counter()
+        longest, local.longest = local.longest, ("", 0)
+        local.pages = 0
+        with self.lock:
+            self.counts.update(counts)
+            top_words = self.top_words
+            for word, count in counts.items():
+                top_words.update(word, count)
+            if longest[1] > self.longest_page[1]:
+                self.longest_page = longest
+            spill = None
+            if len(self.counts) > self.memory_words:
+                spill, self.counts = self.counts, Counter()
+                # taken before self.lock is let go, so count() never finds
+                # the swapped counts gone from memory but not yet on disk
+                self.spill_lock.acquire()
+        if spill:
+            try:
+                self._spill(spill)
+            finally:
+                self.spill_lock.release()
+
+    def flush(self):
+        """ Merge every thread's pending batch into the shared state. """
+        with self.locals_lock:
+            locals_ = list(self.locals)
+        for local in locals_:
+            with local.lock:
+                if local.pages:
+                    self._merge(local)
+
+    def _spill(self, counts):
+        """ Add counts to the spill file. Caller holds spill_lock. """
+        if self.spill_db is None:
+            self.spill_db = dbm.open(self.spill_path, "c")
+        db = self.spill_db
+        for word, count in counts.items():
+            key = word.encode("utf-8")
+            db[key] = str(int(db.get(key, b"0")) + count).encode("ascii")
+
+    def spill(self):
+        """ Move every merged count to disk, e.g. before saving state. """
+        self.flush()
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.spill_lock.acquire()
+        try:
+            if counts:
+                self._spill(counts)
+            if self.spill_db is not None and hasattr(self.spill_db, "sync"):
+                self.spill_db.sync()
+        finally:
+            self.spill_lock.release()
+
+    def top(self, n):
+        """
+        The n most frequent words as (word, count), heaviest first. The
+        summary only picks the candidates; their counts are the exact ones
+        from count(), not the summary's overestimates.
+        """
+        with self.lock:
+            candidates = self.top_words.candidates(n)
+        exact = [(word, self.count(word)) for word in candidates]
+        return heapq.nlargest(n, exact, key=lambda item: item[1])
+
+    def count(self, word):
+        """ Exact count of one word, from memory plus the spill file. """
+        with self.lock:
+            count = self.counts.get(word, 0)
+            # handed over like in _merge(): a spill either finished before
+            # the count above or starts after the file is read below
+            self.spill_lock.acquire()
+        try:
+            if self.spill_db is None and self._spill_files():
+                self.spill_db = dbm.open(self.spill_path, "c")
+            if self.spill_db is None:
+                return count
+            return count + int(self.spill_db.get(word.encode("utf-8"), b"0"))
+        finally:
+            self.spill_lock.release()
+
+    def state(self):
+        """ Picklable summary; the full vocabulary stays in the spill file. """
+        with self.lock:
+            return {"top_words": self.top_words.state(),
+                    "longest_page": self.longest_page}
+
+    def load_state(self, state):
+        with self.lock:
+            self.top_words = SpaceSaving.from_state(state["top_words"])
+            self.longest_page = state["longest_page"]
+
+    def close(self):
+        with self.spill_lock:
+            if self.spill_db is not None:
+                self.spill_db.close()
+                self.spill_db = None
+
+    def remove(self):
+        """ Forget all counts and delete the spill file. """
+        self.close()
+        with self.lock:
+            self.top_words = SpaceSaving(self.top_words.capacity)
+            self.counts = Counter()
+            self.longest_page = ("", 0)
+        for path in self._spill_files():
+            os.remove(path)
+
+    def _spill_files(self):
+        """ Files of the spill dbm; the suffixes depend on the dbm backend. """
+        paths = (self.spill_path + suffix for suffix in ("", ".db", ".dat", ".dir", ".bak", ".pag"))
+        return [path for path in paths if os.path.exists(path)]